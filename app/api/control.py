@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import crud, schemas
+from .. import crud, models, schemas
 from ..database import get_db
 from ..controllers.factory import get_controller, UnsupportedModelError
+from ..controllers.ipmi import PRIORITY_CONTROL, ipmi_priority
 from ..services import per_server_scheduler
 
 router = APIRouter(redirect_slashes=False)
@@ -48,8 +49,10 @@ async def set_manual_fan_mode(server_id: int, speed_setting: schemas.ServerUpdat
 
     try:
         controller = get_controller(db_server)
-        await controller.take_over_fan_control()
-        await controller.set_fan_speed(speed_setting.manual_fan_speed)
+        # 风扇写入与控制循环同级，不排在仪表盘查询之后
+        with ipmi_priority(PRIORITY_CONTROL):
+            await controller.take_over_fan_control()
+            await controller.set_fan_speed(speed_setting.manual_fan_speed)
         
         # 更新数据库状态
         updated_server = await crud.update_server(db, server_id, schemas.ServerUpdate(
@@ -77,7 +80,8 @@ async def set_auto_fan_mode(server_id: int, curve: schemas.FanCurveCreate, db: A
         
         # 接管服务器风扇控制权，以便我们的应用可以动态设置转速
         controller = get_controller(db_server)
-        await controller.take_over_fan_control()
+        with ipmi_priority(PRIORITY_CONTROL):
+            await controller.take_over_fan_control()
 
         # 更新数据库状态
         updated_server = await crud.update_server(db, server_id, schemas.ServerUpdate(control_mode="auto", manual_fan_speed=None))
@@ -104,4 +108,73 @@ async def get_fan_config(server_id: int, db: AsyncSession = Depends(get_db)):
         if curve:
             response["curve"] = {"points": curve.points}
             
-    return response
\ No newline at end of file
+    return response
+
+@router.get("/{server_id}/ticks", response_model=schemas.ServerTickStats)
+async def get_tick_stats(server_id: int, db: AsyncSession = Depends(get_db)):
+    """获取服务器控制和指标任务的执行统计，用于确认控制周期是否按时执行"""
+    db_server = await crud.get_server(db, server_id=server_id)
+    if db_server is None:
+        raise HTTPException(status_code=404, detail="Server not found")
+    return per_server_scheduler.get_tick_stats(server_id)
+
+@router.get("/{server_id}/polling", response_model=schemas.PollingStatus)
+async def get_polling(server_id: int, db: AsyncSession = Depends(get_db)):
+    """获取服务器的采样间隔配置和当前实际采样间隔"""
+    db_server = await crud.get_server(db, server_id=server_id)
+    if db_server is None:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    config = await crud.get_polling_config(db, server_id)
+    response = schemas.PollingConfig().dict() if config is None else {
+        "adaptive": config.adaptive, "min_interval": config.min_interval, "max_interval": config.max_interval,
+    }
+    response.update(per_server_scheduler.get_polling_status(server_id), server_id=server_id)
+    return response
+
+@router.put("/{server_id}/polling", response_model=schemas.PollingStatus)
+async def set_polling(server_id: int, config: schemas.PollingConfig, db: AsyncSession = Depends(get_db)):
+    """
+    设置服务器的采样间隔。adaptive 为 true 时，温度快速上升或正在升向曲线拐点时缩短采样间隔，
+    温度稳定时逐步放大，始终保持在 [min_interval, max_interval] 范围内。
+    """
+    if config.min_interval < 1 or config.max_interval < config.min_interval:
+        raise HTTPException(status_code=400, detail="Require 1 <= min_interval <= max_interval.")
+
+    db_server = await crud.get_server(db, server_id=server_id)
+    if db_server is None:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    db_config = await crud.set_polling_config(db, server_id, config)
+    per_server_scheduler.configure_polling(server_id, db_config)
+
+    response = config.dict()
+    response.update(per_server_scheduler.get_polling_status(server_id), server_id=server_id)
+    return response
+
+@router.get("/{server_id}/failsafe", response_model=schemas.FailSafeStatus)
+async def get_fail_safe_status(server_id: int, limit: int = Query(20, ge=1, le=1000, description="返回的最近记录数量"), db: AsyncSession = Depends(get_db)):
+    """
+    获取服务器的故障安全状态：当前是否处于故障安全模式、连续读取失败次数、
+    进入故障安全模式的总次数和累计时长，以及最近的进入/退出记录。
+    """
+    db_server = await crud.get_server(db, server_id=server_id)
+    if db_server is None:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    events = await crud.get_fail_safe_events(db, server_id, limit)
+    entries, total_seconds = await crud.get_fail_safe_totals(db, server_id)
+    # 未结束的记录按当前时间计入累计时长
+    now = models.get_local_time().replace(tzinfo=None)
+    total_seconds += sum((now - event.entered_at).total_seconds() for event in events if event.exited_at is None)
+
+    state = per_server_scheduler.get_fail_safe_state(server_id)
+    # 仅提供 API 的进程没有采样状态，以数据库中未结束的记录为准
+    state["active"] = state["active"] or any(event.exited_at is None for event in events)
+    return {
+        "server_id": server_id,
+        **state,
+        "entries": entries,
+        "total_seconds": round(total_seconds, 1),
+        "events": events,
+    }
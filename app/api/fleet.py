@@ -0,0 +1,53 @@
+import datetime
+from typing import List
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import crud, models, schemas
+from ..controllers import ipmi
+from ..database import get_db
+from ..services import sharding
+from ..services.fleet_stats import FLEET
+from ..services.per_server_scheduler import SCHEDULER
+
+router = APIRouter(redirect_slashes=False)
+
+@router.get("/summary", response_model=schemas.FleetSummary)
+async def read_fleet_summary(top_n: int = Query(5, ge=1, le=100, description="返回当前温度最高的服务器数量")):
+    """
+    获取机群汇总：最热的 N 台服务器、温度与转速分位数、风扇负载分布、按型号的平均值，
+    以及各熔断状态 (closed/open/half_open) 的 BMC 数量。
+    数据由指标记录循环增量维护，不查询数据库。
+    """
+    return {**FLEET.summary(top_n), "circuits": ipmi.circuit_counts()}
+
+@router.get("/scheduler", response_model=schemas.SchedulerStatus)
+async def read_scheduler_status(limit: int = Query(50, ge=1, le=1000, description="最多返回的迟到任务数量")):
+    """
+    获取调度器状态：任务总数、排队和执行中的任务数，以及当前迟到最多的任务。
+    """
+    return SCHEDULER.snapshot(limit)
+
+@router.get("/ipmi", response_model=schemas.IpmiStatus)
+async def read_ipmi_status():
+    """
+    获取 IPMI 命令队列状态：各优先级 (control/metrics/api) 的排队时间分布，
+    以及当前有命令排队或执行中的 BMC。
+    """
+    return ipmi.snapshot()
+
+@router.get("/collectors", response_model=List[schemas.CollectorMemberStatus])
+async def read_collectors(db: AsyncSession = Depends(get_db)):
+    """
+    获取分片部署中登记的采集进程：心跳时间、是否存活（心跳未超过租约时长）以及持有的服务器租约数量。
+    """
+    since = models.get_local_time().replace(tzinfo=None) - datetime.timedelta(seconds=sharding.SHARD_LEASE_TTL)
+    return [
+        {
+            "member_id": member_id, "hostname": hostname, "pid": pid,
+            "started_at": started_at, "heartbeat_at": heartbeat_at,
+            "alive": heartbeat_at >= since, "servers": servers,
+        }
+        for member_id, hostname, pid, started_at, heartbeat_at, servers in await crud.get_collector_members(db)
+    ]
@@ -1,61 +1,220 @@
-from typing import List
+from typing import List, Optional
 import datetime
-from fastapi import APIRouter, Depends, Query
+import math
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import crud, schemas
+from .. import crud, models, schemas
 from ..database import get_db
+from ..fastjson import FastJSONResponse, rows_response
+from ..services import sensor_history
 
 router = APIRouter(redirect_slashes=False)
 
+# 单页最多返回的记录数（与每台服务器保留的历史记录上限一致）
+HISTORY_PAGE_SIZE_MAX = 3600
+
+# 下一页游标通过响应头返回，响应体结构保持为记录数组
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# 对齐指标接口的默认参数：最近3小时，按指标记录间隔（30秒）分桶
+METRICS_DEFAULT_WINDOW_SECONDS = 3 * 60 * 60
+METRICS_DEFAULT_BUCKET_SECONDS = 30
+
+# 聚合接口的默认参数：最近7天，按小时分桶
+AGGREGATE_DEFAULT_WINDOW_SECONDS = 7 * 24 * 60 * 60
+AGGREGATE_DEFAULT_BUCKET_SECONDS = 60 * 60
+AGGREGATE_MAX_SERVERS = 100
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _encode_cursor(row) -> str:
+    """游标格式: "<ISO 时间戳>,<id>"，对应 (timestamp, id) 键集位置"""
+    return f"{row[3].isoformat()},{row[0]}"
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if cursor is None:
+        return None
+    try:
+        timestamp, row_id = cursor.rsplit(",", 1)
+        return datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+def _resolve_window(start_date, end_date, default_window_seconds: int):
+    """补全缺省的时间范围。历史表中的时间戳按本地时间的朴素 datetime 存储"""
+    end_date = (end_date or models.get_local_time()).replace(tzinfo=None)
+    if start_date is None:
+        start_date = end_date - datetime.timedelta(seconds=default_window_seconds)
+    start_date = start_date.replace(tzinfo=None)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    return start_date, end_date
+
+def _fit_bucket(start_date, end_date, bucket_seconds: int, max_points: int) -> int:
+    """加宽时间桶，保证时间桶数量不超过 max_points"""
+    span_seconds = (end_date - start_date).total_seconds()
+    return max(bucket_seconds, math.ceil(span_seconds / max_points))
+
+def _bucket_start(bucket: int, bucket_seconds: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(seconds=bucket * bucket_seconds)
+
+def _page_response(columns, rows, page_size: int):
+    """多查询一行以判断是否还有下一页，有则在响应头中返回游标"""
+    headers = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        headers = {NEXT_CURSOR_HEADER: _encode_cursor(rows[-1])}
+    return rows_response(columns, rows, headers=headers)
+
+
+@router.get("/aggregate", response_model=schemas.AggregateHistory)
+async def read_aggregate_history(
+    server_ids: List[int] = Query(..., description="服务器ID，可重复传入以同时查询多台服务器"),
+    metric: str = Query("temperature", description="聚合的指标: temperature 或 fan_speed"),
+    start_date: Optional[datetime.datetime] = Query(None, description="查询起始时间 (ISO 8601 格式)，默认为结束时间前7天"),
+    end_date: Optional[datetime.datetime] = Query(None, description="查询结束时间 (ISO 8601 格式)，默认为当前时间"),
+    bucket_seconds: int = Query(AGGREGATE_DEFAULT_BUCKET_SECONDS, ge=1, description="时间桶宽度（秒），默认1小时"),
+    max_points: int = Query(HISTORY_PAGE_SIZE_MAX, ge=1, le=HISTORY_PAGE_SIZE_MAX, description="每台服务器最多返回的时间桶数，超出时自动加宽时间桶"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    按时间桶聚合历史数据（min/max/avg/count/p95），聚合在 SQLite 内完成。
+    例如：最近一周每小时的最高温度。
+    """
+    if metric not in crud.HISTORY_METRICS:
+        raise HTTPException(status_code=400, detail=f"Unsupported metric '{metric}'. Choose from: {', '.join(crud.HISTORY_METRICS)}")
+    if len(server_ids) > AGGREGATE_MAX_SERVERS:
+        raise HTTPException(status_code=400, detail=f"At most {AGGREGATE_MAX_SERVERS} servers can be aggregated in one request")
+
+    start_date, end_date = _resolve_window(start_date, end_date, AGGREGATE_DEFAULT_WINDOW_SECONDS)
+    bucket_seconds = _fit_bucket(start_date, end_date, bucket_seconds, max_points)
+
+    rows = await crud.get_bucketed_aggregates(
+        db, metric=metric, server_ids=server_ids, start_date=start_date, end_date=end_date, bucket_seconds=bucket_seconds
+    )
+
+    series = {}
+    for server_id, bucket, min_value, max_value, avg_value, count, p95 in rows:
+        item = series.get(server_id)
+        if item is None:
+            item = series[server_id] = {
+                "server_id": server_id, "timestamps": [], "min": [], "max": [], "avg": [], "count": [], "p95": []
+            }
+        item["timestamps"].append(_bucket_start(bucket, bucket_seconds))
+        item["min"].append(min_value)
+        item["max"].append(max_value)
+        item["avg"].append(round(avg_value, 2))
+        item["count"].append(count)
+        item["p95"].append(p95)
+
+    return FastJSONResponse({"metric": metric, "bucket_seconds": bucket_seconds, "series": list(series.values())})
+
 @router.get("/{server_id}/temperature", response_model=List[schemas.TemperatureHistory])
 async def read_temperature_history(
     server_id: int,
     start_date: datetime.datetime = Query(..., description="查询起始时间 (ISO 8601 格式)"),
     end_date: datetime.datetime = Query(..., description="查询结束时间 (ISO 8601 格式)"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    page_size: int = Query(HISTORY_PAGE_SIZE_MAX, ge=1, le=HISTORY_PAGE_SIZE_MAX, description="每页最多返回的记录数"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    获取指定服务器在时间范围内的温度历史记录。
+    获取指定服务器在时间范围内的温度历史记录（按时间升序）。
+    若还有更多数据，响应头 X-Next-Cursor 中返回下一页游标。
     """
-    history = await crud.get_temperature_history(db, server_id=server_id, start_date=start_date, end_date=end_date)
-    return history
+    rows = await crud.get_temperature_history_rows(
+        db, server_id=server_id, start_date=start_date, end_date=end_date,
+        after=_decode_cursor(cursor), limit=page_size + 1
+    )
+    return _page_response(crud.TEMPERATURE_HISTORY_COLUMNS, rows, page_size)
 
 @router.get("/{server_id}/fan-speed", response_model=List[schemas.FanSpeedHistory])
 async def read_fan_speed_history(
     server_id: int,
     start_date: datetime.datetime = Query(..., description="查询起始时间 (ISO 8601 格式)"),
     end_date: datetime.datetime = Query(..., description="查询结束时间 (ISO 8601 格式)"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    page_size: int = Query(HISTORY_PAGE_SIZE_MAX, ge=1, le=HISTORY_PAGE_SIZE_MAX, description="每页最多返回的记录数"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    获取指定服务器在时间范围内的风扇转速历史记录。
+    获取指定服务器在时间范围内的风扇转速历史记录（按时间升序）。
+    若还有更多数据，响应头 X-Next-Cursor 中返回下一页游标。
     """
-    history = await crud.get_fan_speed_history(db, server_id=server_id, start_date=start_date, end_date=end_date)
-    return history
+    rows = await crud.get_fan_speed_history_rows(
+        db, server_id=server_id, start_date=start_date, end_date=end_date,
+        after=_decode_cursor(cursor), limit=page_size + 1
+    )
+    return _page_response(crud.FAN_SPEED_HISTORY_COLUMNS, rows, page_size)
 
 @router.get("/{server_id}/temperature/recent", response_model=List[schemas.TemperatureHistory])
 async def read_recent_temperature_history(
     server_id: int,
-    limit: int = Query(540, description="获取最近多少条温度记录，默认540条（约3小时，每30秒一条）"),
+    limit: int = Query(540, ge=1, le=HISTORY_PAGE_SIZE_MAX, description="获取最近多少条温度记录，默认540条（约3小时，每30秒一条）"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标，用于继续获取更早的记录"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    获取指定服务器最近的温度历史记录，用于实时曲线显示。
+    获取指定服务器最近的温度历史记录（按时间降序），用于实时曲线显示。
     默认获取最近540条记录（约3小时，按每30秒一条计算）。
     """
-    history = await crud.get_recent_temperature_history(db, server_id=server_id, limit=limit)
-    return history
+    rows = await crud.get_recent_temperature_history_rows(db, server_id=server_id, limit=limit + 1, before=_decode_cursor(cursor))
+    return _page_response(crud.TEMPERATURE_HISTORY_COLUMNS, rows, limit)
 
 @router.get("/{server_id}/fan-speed/recent", response_model=List[schemas.FanSpeedHistory])
 async def read_recent_fan_speed_history(
     server_id: int,
-    limit: int = Query(540, description="获取最近多少条风扇转速记录，默认540条（约3小时，每30秒一条）"),
+    limit: int = Query(540, ge=1, le=HISTORY_PAGE_SIZE_MAX, description="获取最近多少条风扇转速记录，默认540条（约3小时，每30秒一条）"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标，用于继续获取更早的记录"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    获取指定服务器最近的风扇转速历史记录，用于实时曲线显示。
+    获取指定服务器最近的风扇转速历史记录（按时间降序），用于实时曲线显示。
     默认获取最近540条记录（约3小时，按每30秒一条计算）。
     """
-    history = await crud.get_recent_fan_speed_history(db, server_id=server_id, limit=limit)
-    return history
\ No newline at end of file
+    rows = await crud.get_recent_fan_speed_history_rows(db, server_id=server_id, limit=limit + 1, before=_decode_cursor(cursor))
+    return _page_response(crud.FAN_SPEED_HISTORY_COLUMNS, rows, limit)
+
+@router.get("/{server_id}/metrics", response_model=schemas.MetricsHistory)
+async def read_metrics_history(
+    server_id: int,
+    start_date: Optional[datetime.datetime] = Query(None, description="查询起始时间 (ISO 8601 格式)，默认为结束时间前3小时"),
+    end_date: Optional[datetime.datetime] = Query(None, description="查询结束时间 (ISO 8601 格式)，默认为当前时间"),
+    bucket_seconds: int = Query(METRICS_DEFAULT_BUCKET_SECONDS, ge=1, description="时间桶宽度（秒），同一桶内的样本取平均值"),
+    max_points: int = Query(540, ge=1, le=HISTORY_PAGE_SIZE_MAX, description="最多返回的时间点数，超出时自动加宽时间桶"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取指定服务器按共享时间轴对齐的温度与风扇转速历史。
+    一次查询、一个响应同时返回两条序列，用于详情页曲线显示。
+    """
+    start_date, end_date = _resolve_window(start_date, end_date, METRICS_DEFAULT_WINDOW_SECONDS)
+    bucket_seconds = _fit_bucket(start_date, end_date, bucket_seconds, max_points)
+
+    rows = await crud.get_aligned_metrics_rows(
+        db, server_id=server_id, start_date=start_date, end_date=end_date, bucket_seconds=bucket_seconds
+    )
+    return FastJSONResponse({
+        "server_id": server_id,
+        "bucket_seconds": bucket_seconds,
+        "timestamps": [_bucket_start(bucket, bucket_seconds) for bucket, _, _ in rows],
+        "temperature": [round(temp, 2) if temp is not None else None for _, temp, _ in rows],
+        "average_speed_rpm": [int(speed) if speed is not None else None for _, _, speed in rows],
+    })
+
+
+@router.get("/{server_id}/sensors", response_model=schemas.SensorHistory)
+async def read_sensor_history(
+    server_id: int,
+    start_date: Optional[datetime.datetime] = Query(None, description="查询起始时间 (ISO 8601 格式)，默认为结束时间前3小时"),
+    end_date: Optional[datetime.datetime] = Query(None, description="查询结束时间 (ISO 8601 格式)，默认为当前时间"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取指定服务器逐个温度、风扇和功率传感器的历史读数（按共享时间轴列式返回），
+    用于发现被平均转速掩盖的单个故障风扇等问题。
+    """
+    start_date, end_date = _resolve_window(start_date, end_date, METRICS_DEFAULT_WINDOW_SECONDS)
+    return FastJSONResponse(await sensor_history.get_history(db, server_id, start_date, end_date))
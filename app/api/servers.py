@@ -1,31 +1,82 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import crud, models, schemas
 from ..database import get_db
-from ..services import per_server_scheduler
+from ..services import model_detection, per_server_scheduler
+from ..services.fleet_stats import FLEET
 
 router = APIRouter(redirect_slashes=False)
 
+async def _start_loops(server: models.Server):
+    """启动新服务器的后台任务"""
+    await per_server_scheduler.start_server_metrics_loop(server)
+    if server.control_mode == "auto":
+        await per_server_scheduler.start_server_control_loop(server)
+
 @router.post("/", response_model=schemas.Server)
-async def create_server(server: schemas.ServerCreate, db: AsyncSession = Depends(get_db)):
+async def create_server(server: schemas.ServerCreate, refresh: bool = False, db: AsyncSession = Depends(get_db)):
     """
     添加一台新服务器。
+    省略 model 时通过 BMC 的 mc info / fru 自动识别型号（探测结果按 BMC 地址缓存，refresh=true 时重新探测）。
     """
     db_server = await crud.get_server_by_name(db, name=server.name)
     if db_server:
         raise HTTPException(status_code=400, detail="Server with this name already registered")
-    
+
+    if server.model is None:
+        model, error = (await model_detection.detect_models(db, [server], refresh=refresh))[0]
+        if model is None:
+            raise HTTPException(status_code=400, detail=f"Could not detect server model: {error}")
+        server = server.copy(update={"model": model})
+
     new_server = await crud.create_server(db=db, server=server)
-    
-    # 启动新服务器的后台任务
-    await per_server_scheduler.start_server_metrics_loop(new_server)
-    if new_server.control_mode == "auto":
-        await per_server_scheduler.start_server_control_loop(new_server)
-        
+    await _start_loops(new_server)
     return new_server
 
+@router.post("/bulk", response_model=List[schemas.ServerCreateResult])
+async def create_servers(servers: List[schemas.ServerCreate], refresh: bool = False,
+                         db: AsyncSession = Depends(get_db)):
+    """
+    批量添加服务器，逐台返回结果，单台失败（名称重复、无法识别型号）不影响其他服务器。
+    省略 model 的服务器并发探测 BMC 识别型号（同时探测数有上限）。
+    """
+    results = [schemas.ServerCreateResult(name=server.name) for server in servers]
+    existing = await crud.get_existing_server_names(db, [server.name for server in servers])
+    seen = set()
+    accepted = []
+    for i, server in enumerate(servers):
+        if server.name in existing:
+            results[i].error = "Server with this name already registered"
+        elif server.name in seen:
+            results[i].error = "Duplicate server name in request"
+        else:
+            accepted.append(i)
+        seen.add(server.name)
+
+    undetected = [i for i in accepted if servers[i].model is None]
+    detected = await model_detection.detect_models(db, [servers[i] for i in undetected], refresh=refresh)
+    for i, (model, error) in zip(undetected, detected):
+        if model is None:
+            results[i].error = f"Could not detect server model: {error}"
+        else:
+            servers[i] = servers[i].copy(update={"model": model})
+
+    for i in accepted:
+        if results[i].error is None:
+            try:
+                new_server = await crud.create_server(db=db, server=servers[i])
+            except IntegrityError:
+                # 名称检查之后被其他请求抢先添加
+                await db.rollback()
+                results[i].error = "Server with this name already registered"
+                continue
+            await _start_loops(new_server)
+            results[i].server = new_server
+    return results
+
 @router.get("/", response_model=List[schemas.Server])
 async def read_servers(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     """
@@ -74,4 +125,5 @@ async def delete_server(server_id: int, db: AsyncSession = Depends(get_db)):
     db_server = await crud.delete_server(db, server_id=server_id)
     if db_server is None:
         raise HTTPException(status_code=404, detail="Server not found")
+    FLEET.remove(server_id)
     return db_server
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+独立的采集进程：负责 BMC 的采样和风扇控制，与 API 进程分离运行。
+
+    python -m app.collector                          # 单采集进程
+    COLLECTOR_MODE=sharded python -m app.collector   # 分片部署，可在多台主机上各运行一个
+
+单采集进程模式下与 API 进程共用数据目录。启动后等待获取采集锁（已有采集进程时一直等待，可作为热备），
+读数写入共享内存表供 API 进程读取；API 进程应设置 COLLECTOR_MODE=external，
+这样重启 API 不会影响风扇控制。
+分片模式下各采集进程通过共享数据库按一致性哈希分担服务器（见 services/sharding.py），
+读数只写入数据库，API 进程应设置 COLLECTOR_MODE=sharded。
+收到 SIGTERM/SIGINT 后交还风扇控制权再退出。
+"""
+import asyncio
+import logging
+import signal
+
+from .database import create_tables
+from .services import leader, per_server_scheduler
+from .services.sharding import ShardCoordinator
+
+logger = logging.getLogger(__name__)
+
+
+async def run():
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await create_tables()
+    if leader.COLLECTOR_MODE == "sharded":
+        report = await _run_sharded(stopping)
+    else:
+        report = await _run_single(stopping)
+    for item in report["failed"]:
+        logger.error(f"Fan control NOT returned for {item['name']} (ID: {item['server_id']})")
+
+
+async def _run_single(stopping: asyncio.Event) -> dict:
+    role = leader.ROLE
+    while not role.lock.try_acquire():
+        logger.info(f"Another collector holds {role.lock.path}, waiting...")
+        try:
+            await asyncio.wait_for(stopping.wait(), leader.ELECTION_INTERVAL)
+            return {"restored": 0, "failed": []}
+        except asyncio.TimeoutError:
+            pass
+
+    await per_server_scheduler.start_all_loops()
+    await stopping.wait()
+    return await role.stop()
+
+
+async def _run_sharded(stopping: asyncio.Event) -> dict:
+    coordinator = ShardCoordinator()
+    logger.info(f"Starting sharded collector {coordinator.member_id}.")
+    await per_server_scheduler.start_all_loops(owns=coordinator.owns, shared_memory=False)
+    coordinator.start()
+    await stopping.wait()
+    # 先停止分配，交还风扇控制权后再释放租约，其他进程才能接手
+    await coordinator.stop()
+    report = await per_server_scheduler.stop_all_loops()
+    await coordinator.leave()
+    return report
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
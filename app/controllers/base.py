@@ -1,10 +1,17 @@
 import asyncio
+import contextvars
 import logging
+import os
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Callable, List, Optional
 from .. import models, crud
 from ..database import AsyncSessionLocal
 from .. import crud_cache
+from . import ipmi
+from . import sensor_catalog
+from .sensor_catalog import SensorCatalog
+from .sensor_parser import parse_sdr_list, parse_sensor_get
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +29,152 @@ class BaseServerController(ABC):
         self.server = server
         self._temp_cache_age = 30  # 温度缓存有效期（秒）
         self._fan_cache_age = 60   # 风扇速度缓存有效期（秒）
+        self._catalog: Optional[SensorCatalog] = None
+        self._catalog_loaded = False
+        self._catalog_retry_at = 0.0  # 单调时钟时间，此前不重新扫描
+        self._catalog_lock = asyncio.Lock()
+        self._catalog_task: Optional[asyncio.Task] = None  # 后台扫描任务
+
+    def close(self):
+        """
+        释放控制器持有的按服务器保存的状态（会话、传感器缓存等）。
+        控制器被重建或服务器被删除时由工厂调用；子类覆盖时应调用 super().close()。
+        """
+        if self._catalog_task is not None and not self._catalog_task.done():
+            self._catalog_task.cancel()
+
+    async def _run_ipmi_command(self, *args) -> Optional[str]:
+        """
+        通过该服务器 BMC 的优先级命令队列执行 ipmitool 命令。
+        :return: 命令的标准输出，命令失败时返回 None。
+        """
+        return await ipmi.run_ipmi_command(self.server, *args)
+
+    async def get_sensor_catalog(self) -> Optional[SensorCatalog]:
+        """
+        获取该 BMC 的传感器目录。首次调用时从数据库加载；不存在、过期、被标记失效或本地缺少 SDR 缓存时
+        在后台重新扫描，本次调用不等待扫描完成。两次扫描至少间隔 CATALOG_RETRY_DELAY 秒，期间继续使用旧目录。
+        :return: 传感器目录，尚无可用目录（首次扫描未完成或 BMC 不可达）时返回 None，调用方应退回完整扫描。
+        """
+        if not self._catalog_loaded:
+            async with self._catalog_lock:
+                if not self._catalog_loaded:
+                    self._catalog = await self._load_sensor_catalog()
+                    self._catalog_loaded = True
+        if self._catalog_needs_refresh() and time.monotonic() >= self._catalog_retry_at \
+                and (self._catalog_task is None or self._catalog_task.done()):
+            self._catalog_retry_at = time.monotonic() + sensor_catalog.CATALOG_RETRY_DELAY
+            # 使用空白上下文创建任务，扫描不继承调用方（如风扇控制采样）的优先级和截止时间
+            self._catalog_task = asyncio.get_running_loop().create_task(
+                self._refresh_sensor_catalog(), context=contextvars.Context())
+        return self._catalog
+
+    def _catalog_needs_refresh(self) -> bool:
+        if self._catalog is None:
+            return True
+        return self._catalog.expired(models.get_local_time().replace(tzinfo=None)) \
+            or not self._catalog.command_prefix()
+
+    async def _refresh_sensor_catalog(self):
+        """后台任务：以指标采集优先级重新扫描；目录仍有效、只缺本地 SDR 缓存时只重新导出缓存"""
+        with ipmi.ipmi_priority(ipmi.PRIORITY_METRICS):
+            try:
+                now = models.get_local_time().replace(tzinfo=None)
+                if self._catalog is not None and not self._catalog.expired(now):
+                    # 目录来自其他节点或数据目录被清理，重新导出本地 SDR 缓存
+                    self._catalog.sdr_cache = await self._dump_sdr_cache()
+                    return
+                catalog = await self._discover_sensor_catalog(now)
+                if catalog is not None:
+                    self._catalog = catalog
+                    await self._save_sensor_catalog(catalog)
+            except Exception as e:
+                logger.warning(f"Sensor catalog refresh failed for {self.server.name}: {e}")
+
+    def invalidate_sensor_catalog(self):
+        """读数与目录不符（如更换硬件、固件升级后传感器改名）时调用，下次读取前重新扫描"""
+        if self._catalog is not None and not self._catalog.stale:
+            logger.info(f"Sensor catalog for {self.server.name} no longer matches the BMC, rescanning.")
+            self._catalog.stale = True
+
+    async def _load_sensor_catalog(self) -> Optional[SensorCatalog]:
+        if self.server.id is None:
+            return None
+        try:
+            async with AsyncSessionLocal() as db:
+                row = await crud.get_sensor_catalog(db, self.server.id)
+        except Exception as e:
+            logger.warning(f"Could not load sensor catalog for {self.server.name}: {e}")
+            return None
+        if row is None or row.ipmi_host != self.server.ipmi_host:
+            return None
+        return SensorCatalog(row.ipmi_host, row.sensors, row.discovered_at,
+                             sensor_catalog.sdr_cache_path(row.ipmi_host))
+
+    async def _dump_sdr_cache(self) -> Optional[str]:
+        path = sensor_catalog.sdr_cache_path(self.server.ipmi_host)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        except OSError:
+            return None
+        if await self._run_ipmi_command('sdr', 'dump', path) is None or not os.path.exists(path):
+            return None
+        return path
+
+    async def _discover_sensor_catalog(self, now) -> Optional[SensorCatalog]:
+        """完整扫描一次 BMC：导出 SDR 缓存，并记录所有传感器及其编号、阈值"""
+        sdr_cache = await self._dump_sdr_cache()
+        prefix = ['-S', sdr_cache] if sdr_cache else []
+        listing = await self._run_ipmi_command(*prefix, 'sensor')
+        if not listing:
+            logger.warning(f"Sensor discovery failed for {self.server.name}.")
+            return None
+        elist = await self._run_ipmi_command(*prefix, 'sdr', 'elist', 'full')
+        catalog = SensorCatalog.build(self.server.ipmi_host, listing, elist, now, sdr_cache)
+        logger.info(f"Discovered {len(catalog.sensors)} sensors for {self.server.name}.")
+        return catalog
+
+    async def _save_sensor_catalog(self, catalog: SensorCatalog):
+        if self.server.id is None:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.save_sensor_catalog(db, self.server.id, catalog.host, catalog.sensors,
+                                               catalog.discovered_at)
+        except Exception as e:
+            logger.warning(f"Could not save sensor catalog for {self.server.name}: {e}")
+
+    async def read_catalog_sensors(self, sensor_type: str,
+                                   predicate: Optional[Callable[[str], bool]] = None) -> Optional[List[float]]:
+        """
+        只读取目录中指定类型（及名称条件）的传感器。
+        名称唯一时使用 sensor get；存在同名传感器（如 R730 两颗 CPU 都叫 "Temp"）时使用 sdr type。
+        :return: 有效读数列表，命令失败时为空列表；目录不可用或没有匹配的传感器时返回 None。
+        """
+        catalog = await self.get_sensor_catalog()
+        if catalog is None:
+            return None
+        names = [sensor["name"] for sensor in catalog.select(sensor_type, predicate)]
+        if not names:
+            return None
+        prefix = catalog.command_prefix()
+        if len(set(names)) == len(names):
+            output = await self._run_ipmi_command(*prefix, 'sensor', 'get', *names)
+            if not output:
+                return []
+            readings = parse_sensor_get(output)
+            values = [readings[name].value for name in names
+                      if name in readings and readings[name].value is not None]
+        else:
+            output = await self._run_ipmi_command(*prefix, 'sdr', 'type', sensor_catalog.SDR_TYPE_NAMES[sensor_type])
+            if not output:
+                return []
+            values = [reading.value for reading in parse_sdr_list(output)
+                      if reading.value is not None and (predicate is None or predicate(reading.name))]
+        if len(values) != len(names):
+            # 传感器缺失、无读数或多出了目录中没有的传感器
+            self.invalidate_sensor_catalog()
+        return values
 
     async def get_temperature_realtime(self) -> float:
         """
@@ -147,9 +300,10 @@ class BaseServerController(ABC):
         pass
 
     @abstractmethod
-    async def return_fan_control_to_system(self):
+    async def return_fan_control_to_system(self) -> bool:
         """
         将风扇控制权交还给服务器系统（iDRAC/BMC）。
         （对应 IPMI 的系统自动模式）
+        :return: 是否成功交还。
         """
         pass
\ No newline at end of file
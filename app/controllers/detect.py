@@ -0,0 +1,65 @@
+"""
+服务器型号自动识别：通过 BMC 的 mc info（厂商/产品 ID）和 fru（产品名称）确定型号，
+按各型号配置中的 detect 规则匹配已注册的控制器。
+"""
+import re
+from typing import List, NamedTuple, Optional
+
+from . import ipmi
+from .factory import CONTROLLER_MAP
+from .profile import PROFILES
+
+# mc info / fru print 输出中的 "字段 : 值" 行
+_FIELD = re.compile(r"^[ \t]*([^:\r\n]+?)[ \t]*:[ \t]*([^\r\n]*?)[ \t]*$", re.M)
+_NUMBER = re.compile(r"\d+")
+
+
+class DeviceIdentity(NamedTuple):
+    manufacturer_id: int
+    product_id: Optional[int]
+    product_name: str  # fru 中的产品名称，BMC 没有 FRU 信息时为空字符串
+
+
+def _fields(output: str) -> dict:
+    """字段 -> 值，同名字段保留第一个"""
+    fields = {}
+    for key, value in _FIELD.findall(output):
+        fields.setdefault(key, value)
+    return fields
+
+
+def parse_mc_info(output: str) -> Optional[tuple]:
+    """解析 ipmitool mc info 的输出，返回 (厂商 ID, 产品 ID)；缺少厂商 ID 时返回 None"""
+    fields = _fields(output)
+    manufacturer = _NUMBER.match(fields.get("Manufacturer ID", ""))
+    if manufacturer is None:
+        return None
+    product = _NUMBER.match(fields.get("Product ID", ""))  # 如 "256 (0x0100)"
+    return int(manufacturer.group()), int(product.group()) if product else None
+
+
+def parse_fru_product(output: str) -> str:
+    """从 ipmitool fru print 0 的输出中取产品名称，没有时使用主板名称"""
+    fields = _fields(output)
+    return fields.get("Product Name") or fields.get("Board Product") or ""
+
+
+async def probe_identity(server) -> Optional[DeviceIdentity]:
+    """
+    向 BMC 查询一次 mc info 和 fru print 0。
+    :param server: 提供 name 和 IPMI 连接信息的对象（服务器模型或 schemas.ServerCreate）
+    :return: BMC 不可达或 mc info 无法解析时返回 None
+    """
+    output = await ipmi.run_ipmi_command(server, 'mc', 'info')
+    ids = parse_mc_info(output) if output else None
+    if ids is None:
+        return None
+    fru = await ipmi.run_ipmi_command(server, 'fru', 'print', '0')
+    return DeviceIdentity(ids[0], ids[1], parse_fru_product(fru) if fru else "")
+
+
+def match_models(identity: DeviceIdentity) -> List[str]:
+    """返回 detect 规则与 identity 匹配且已注册控制器的型号名称"""
+    return [profile.model for key, profile in PROFILES.items()
+            if key in CONTROLLER_MAP and profile.detect is not None
+            and profile.detect.matches(identity.manufacturer_id, identity.product_id, identity.product_name)]
@@ -1,32 +1,62 @@
+from typing import Dict, Tuple
+
 from .. import models
 from .base import BaseServerController
+from .profile import PROFILES, controller_class_for
 from .r730 import R730Controller
 from .r4900g3 import R4900G3Controller
 
 # 注册所有可用的控制器
-# 键是服务器型号 (小写)，值是控制器类
-CONTROLLER_MAP = {
+# 键是服务器型号 (小写)，值是控制器类。每个型号配置 (profiles/*.json) 都对应一个控制器，
+# 有专门实现的型号使用其子类
+CONTROLLER_MAP = {key: controller_class_for(profile) for key, profile in PROFILES.items()}
+CONTROLLER_MAP.update({
     "r730": R730Controller,
     "r4900g3": R4900G3Controller,
-}
+})
 
 class UnsupportedModelError(Exception):
     """当服务器型号不被支持时抛出此异常。"""
     pass
 
+# {server_id: (型号与 IPMI 连接信息, 控制器实例)}，每台服务器一个长期存在的控制器，
+# 会话、传感器缓存等按服务器保存的状态都挂在该实例上
+_REGISTRY: Dict[int, Tuple[tuple, BaseServerController]] = {}
+
+def _identity(server: models.Server) -> tuple:
+    return (server.model.lower(), server.ipmi_host, server.ipmi_username, server.ipmi_password)
+
 def get_controller(server: models.Server) -> BaseServerController:
     """
     控制器工厂函数。
-    根据服务器型号返回一个具体的控制器实例。
+    根据服务器型号返回一个具体的控制器实例。同一台服务器复用同一个实例，
+    仅在型号或 IPMI 连接信息变化时重建；实例的 server 更新为传入的最新服务器信息。
     
     :param server: 服务器的 SQLAlchemy 模型实例。
     :return: 一个 BaseServerController 的子类实例。
     :raises UnsupportedModelError: 如果服务器型号不被支持。
     """
-    model_key = server.model.lower()
-    controller_class = CONTROLLER_MAP.get(model_key)
+    identity = _identity(server)
+    entry = _REGISTRY.get(server.id) if server.id is not None else None
+    if entry is not None and entry[0] == identity:
+        controller = entry[1]
+        controller.server = server
+        return controller
+
+    controller_class = CONTROLLER_MAP.get(identity[0])
 
     if not controller_class:
         raise UnsupportedModelError(f"Server model '{server.model}' is not supported.")
 
-    return controller_class(server)
\ No newline at end of file
+    controller = controller_class(server)
+    if server.id is not None:
+        if entry is not None:
+            entry[1].close()
+        _REGISTRY[server.id] = (identity, controller)
+    return controller
+
+def remove_controller(server_id: int):
+    """服务器被删除（或不再由本进程负责）时释放其控制器"""
+    entry = _REGISTRY.pop(server_id, None)
+    if entry is not None:
+        entry[1].close()
@@ -0,0 +1,387 @@
+"""
+ipmitool 命令的统一执行入口。
+每个 BMC (按 ipmi_host 区分) 有一个带优先级的命令队列，并发上限按 AIMD 自适应调整；
+所有 BMC 共享一个全局并发上限，限制同时运行的 ipmitool 子进程数。
+风扇控制命令优先于指标采集，指标采集优先于 API 的临时查询。
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from .. import models
+from ..histogram import Histogram
+
+logger = logging.getLogger(__name__)
+
+# 优先级类别，数值越小越优先
+PRIORITY_CONTROL = 0
+PRIORITY_METRICS = 1
+PRIORITY_API = 2
+PRIORITY_NAMES = ("control", "metrics", "api")
+
+GLOBAL_MAX_IN_FLIGHT = 32  # 全局同时运行的 ipmitool 子进程上限
+AGING_SECONDS = 5.0        # 排队每满这么多秒，等待中的命令提升一个优先级，防止低优先级命令饿死
+
+# 每个 BMC 的并发上限按 AIMD 调整：有排队时每完成一条命令加 1/limit，变慢或出错时减半
+BMC_MIN_LIMIT = 1          # 多数 BMC 只能很好地处理一个 lanplus 会话，从 1 开始
+BMC_MAX_LIMIT = 4
+LATENCY_TARGET = 3.0       # 秒，命令耗时的平滑值超过此值即视为 BMC 过载
+ERROR_RATE_THRESHOLD = 0.2 # 失败率的平滑值超过此值即视为 BMC 过载
+DECREASE_COOLDOWN = 5.0    # 两次减半之间的最小间隔（秒），避免一次突发连续减半
+EWMA_ALPHA = 0.2
+
+# 熔断：连续失败达到阈值后暂停向该 BMC 发送命令，退避时间按指数增长并加入随机抖动
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_BASE_BACKOFF = 10.0   # 秒，第一次熔断的退避时间
+CIRCUIT_MAX_BACKOFF = 600.0
+CIRCUIT_JITTER = 0.2          # 退避时间在 ±20% 内随机，避免大量 BMC 同时恢复探测
+
+COMMAND_TIMEOUT = 20.0     # 秒，单条命令（含排队）的最长时间；设置了截止时间时取两者中较早的
+
+# 当前协程发出的 IPMI 命令所属的优先级，未设置时视为 API 请求
+_PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar("ipmi_priority", default=PRIORITY_API)
+# 当前协程发出的 IPMI 命令必须完成的截止时间（单调时钟），未设置时只受 COMMAND_TIMEOUT 限制
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("ipmi_deadline", default=None)
+
+
+@contextlib.contextmanager
+def ipmi_priority(priority: int):
+    """在 with 块内发出的 IPMI 命令使用指定的优先级"""
+    token = _PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+@contextlib.contextmanager
+def ipmi_deadline(seconds: float):
+    """with 块内发出的 IPMI 命令须在 seconds 秒内完成；嵌套时以较早的截止时间为准"""
+    deadline = time.monotonic() + seconds
+    current = _DEADLINE.get()
+    token = _DEADLINE.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+class PriorityLimiter:
+    """
+    带优先级的并发限制器。
+    每个优先级一个先进先出队列；有空闲名额时，从各队首中选出
+    "优先级 - 已等待时间 / AGING_SECONDS" 最小的请求放行。
+    """
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._waiters = [deque() for _ in PRIORITY_NAMES]
+
+    @property
+    def limit(self) -> int:
+        return self.max_in_flight
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters)
+
+    def queued_by_priority(self) -> Dict[str, int]:
+        return {name: len(waiters) for name, waiters in zip(PRIORITY_NAMES, self._waiters)}
+
+    async def acquire(self, priority: int) -> float:
+        """等待一个执行名额，返回排队时间（秒）"""
+        if self.in_flight < self.limit and not self.queued:
+            self.in_flight += 1
+            return 0.0
+
+        enqueued = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters[priority]
+        waiters.append((enqueued, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已分配但调用方被取消，归还名额
+                self.release()
+            else:
+                with contextlib.suppress(ValueError):
+                    waiters.remove((enqueued, future))
+            raise
+        return time.monotonic() - enqueued
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.in_flight < self.limit:
+            future = self._next()
+            if future is None:
+                break
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _next(self) -> Optional[asyncio.Future]:
+        now = time.monotonic()
+        best, best_score = None, None
+        for priority, waiters in enumerate(self._waiters):
+            while waiters and waiters[0][1].done():
+                waiters.popleft()  # 已取消的等待者
+            if not waiters:
+                continue
+            score = priority - (now - waiters[0][0]) / AGING_SECONDS
+            if best_score is None or score < best_score:
+                best, best_score = waiters, score
+        return best.popleft()[1] if best is not None else None
+
+    def snapshot(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "queued": self.queued_by_priority()}
+
+
+class CircuitBreaker:
+    """
+    单个 BMC 的熔断器。
+    closed: 正常放行；连续失败 CIRCUIT_FAILURE_THRESHOLD 次后转为 open。
+    open: 直接拒绝所有命令，直到退避时间结束后转为 half_open。
+    half_open: 只放行一条探测命令，成功则恢复 closed，失败则以加倍的退避时间重新 open。
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0        # 连续失败次数
+        self.opens = 0           # 自上次恢复以来连续熔断的次数，决定退避时间
+        self.rejected = 0        # 被熔断直接拒绝的命令数
+        self.retry_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() < self.retry_at:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+        return True
+
+    def abandon(self):
+        """放行的命令在得出结果前被取消"""
+        self._probing = False
+
+    def record(self, ok: bool) -> Optional[str]:
+        """记录命令结果，状态发生变化时返回新状态"""
+        previous = self.state
+        self._probing = False
+        if ok:
+            self.state = self.CLOSED
+            self.failures = self.opens = 0
+        else:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+                self.opens += 1
+                backoff = min(CIRCUIT_BASE_BACKOFF * 2 ** (self.opens - 1), CIRCUIT_MAX_BACKOFF)
+                self.retry_at = time.monotonic() + backoff * random.uniform(1 - CIRCUIT_JITTER, 1 + CIRCUIT_JITTER)
+                self.state = self.OPEN
+        return self.state if self.state != previous else None
+
+    def snapshot(self) -> dict:
+        retry_in = self.retry_at - time.monotonic() if self.state == self.OPEN else None
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+            "retry_in": round(max(retry_in, 0.0), 1) if retry_in is not None else None,
+        }
+
+
+class BMCQueue(PriorityLimiter):
+    """
+    单个 BMC 的命令队列。
+    并发上限在 [BMC_MIN_LIMIT, BMC_MAX_LIMIT] 内按 AIMD 调整，依据命令耗时和失败率的指数平滑值；
+    命令结果同时计入熔断器。
+    """
+
+    def __init__(self, host: str, max_in_flight: int = BMC_MIN_LIMIT):
+        super().__init__(max_in_flight)
+        self.host = host
+        self.adaptive_limit = float(max_in_flight)
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self._last_decrease = 0.0
+        self.breaker = CircuitBreaker()
+        self.outcomes = {"ok": 0, "failed": 0, "timeout": 0}
+
+    @property
+    def limit(self) -> int:
+        return int(self.adaptive_limit)
+
+    def record(self, latency: float, outcome: str):
+        """记录一次命令的耗时和结果 (ok/failed/timeout)，调整并发上限和熔断状态"""
+        self.outcomes[outcome] += 1
+        ok = outcome == "ok"
+        state = self.breaker.record(ok)
+        if state == CircuitBreaker.OPEN:
+            logger.warning(f"Circuit opened for BMC {self.host} after {self.breaker.failures} consecutive failure(s), "
+                           f"retrying in {self.breaker.retry_at - time.monotonic():.0f}s.")
+        elif state == CircuitBreaker.CLOSED:
+            logger.info(f"Circuit closed for BMC {self.host}, commands resumed.")
+
+        self.latency = latency if self.latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+        self.error_rate = EWMA_ALPHA * (0.0 if ok else 1.0) + (1 - EWMA_ALPHA) * self.error_rate
+
+        now = time.monotonic()
+        if self.latency > LATENCY_TARGET or self.error_rate > ERROR_RATE_THRESHOLD:
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self.adaptive_limit = max(float(BMC_MIN_LIMIT), self.adaptive_limit / 2)
+                self._last_decrease = now
+        elif ok and self.queued:
+            # 只有存在排队命令时才放大上限，空闲的 BMC 保持原有并发
+            self.adaptive_limit = min(float(BMC_MAX_LIMIT), self.adaptive_limit + 1 / self.adaptive_limit)
+            self._wake()
+
+    def snapshot(self) -> dict:
+        return {
+            "host": self.host,
+            **super().snapshot(),
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "outcomes": dict(self.outcomes),
+            "circuit": self.breaker.snapshot(),
+        }
+
+
+_QUEUES: Dict[str, BMCQueue] = {}
+GLOBAL_LIMITER = PriorityLimiter(GLOBAL_MAX_IN_FLIGHT)
+QUEUE_WAIT = {name: Histogram() for name in PRIORITY_NAMES}  # 各优先级的排队时间
+
+
+def get_queue(host: str) -> BMCQueue:
+    queue = _QUEUES.get(host)
+    if queue is None:
+        queue = _QUEUES[host] = BMCQueue(host)
+    return queue
+
+
+async def run_ipmi_command(server: models.Server, *args) -> Optional[str]:
+    """
+    通过该服务器 BMC 的命令队列和全局并发限制执行 ipmitool 命令。
+    该 BMC 处于熔断状态时不启动子进程，直接返回 None；
+    超过截止时间（排队时间也计入）或调用方被取消时终止并回收子进程。
+    :return: 命令的标准输出；命令失败或超时时返回 None。
+    """
+    priority = _PRIORITY.get()
+    queue = get_queue(server.ipmi_host)
+    if not queue.breaker.allow():
+        return None
+    deadline = min(_DEADLINE.get() or math.inf, time.monotonic() + COMMAND_TIMEOUT)
+    try:
+        returncode, stdout, stderr = await _execute(server, queue, priority, args, deadline)
+    except asyncio.TimeoutError:
+        queue.breaker.abandon()
+        logger.warning(f"IPMI command timed out for server {server.name} ({' '.join(args)}).")
+        return None
+    except asyncio.CancelledError:
+        queue.breaker.abandon()
+        raise
+
+    if returncode != 0:
+        logger.error(f"IPMI command failed for server {server.name} ({' '.join(args)}): {stderr.decode().strip()}")
+        return None
+    return stdout.decode().strip()
+
+
+def _remaining(deadline: float) -> float:
+    return deadline - time.monotonic()
+
+
+async def _execute(server: models.Server, queue: BMCQueue, priority: int, args: tuple, deadline: float):
+    enqueued = time.monotonic()
+    try:
+        await asyncio.wait_for(queue.acquire(priority), _remaining(deadline))
+    except asyncio.TimeoutError:
+        queue.outcomes["timeout"] += 1  # 截止时间前未能排上队
+        raise
+    try:
+        try:
+            await asyncio.wait_for(GLOBAL_LIMITER.acquire(priority), _remaining(deadline))
+        except asyncio.TimeoutError:
+            queue.outcomes["timeout"] += 1
+            raise
+        try:
+            QUEUE_WAIT[PRIORITY_NAMES[priority]].observe(time.monotonic() - enqueued)
+            started = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    'ipmitool', '-I', 'lanplus',
+                    '-H', server.ipmi_host,
+                    '-U', server.ipmi_username,
+                    '-P', server.ipmi_password,
+                    *args,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            except Exception:
+                queue.record(time.monotonic() - started, "failed")
+                raise
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), _remaining(deadline))
+            except BaseException as e:
+                await _kill(process)
+                if isinstance(e, asyncio.TimeoutError):
+                    queue.record(time.monotonic() - started, "timeout")
+                elif not isinstance(e, asyncio.CancelledError):
+                    queue.record(time.monotonic() - started, "failed")
+                raise
+            queue.record(time.monotonic() - started, "ok" if process.returncode == 0 else "failed")
+        finally:
+            GLOBAL_LIMITER.release()
+    finally:
+        queue.release()
+    return process.returncode, stdout, stderr
+
+
+async def _kill(process: asyncio.subprocess.Process):
+    """终止子进程并等待回收；调用方被再次取消时回收仍在后台完成，不会留下僵尸进程"""
+    if process.returncode is None:
+        with contextlib.suppress(ProcessLookupError):
+            process.kill()
+    await asyncio.shield(process.wait())
+
+
+def circuit_counts() -> Dict[str, int]:
+    """各熔断状态的 BMC 数量"""
+    counts = {CircuitBreaker.CLOSED: 0, CircuitBreaker.OPEN: 0, CircuitBreaker.HALF_OPEN: 0}
+    for queue in _QUEUES.values():
+        counts[queue.breaker.state] += 1
+    return counts
+
+
+def snapshot() -> dict:
+    """
+    全局与各 BMC 的并发上限、执行中和排队中的命令数、命令结果计数 (ok/failed/timeout)、
+    熔断状态，以及各优先级的排队时间分布
+    """
+    outcomes = {"ok": 0, "failed": 0, "timeout": 0}
+    for queue in _QUEUES.values():
+        for outcome, count in queue.outcomes.items():
+            outcomes[outcome] += count
+    return {
+        "global": GLOBAL_LIMITER.snapshot(),
+        "outcomes": outcomes,
+        "queue_wait": {name: histogram.snapshot() for name, histogram in QUEUE_WAIT.items()},
+        "bmcs": [queue.snapshot() for queue in _QUEUES.values()],
+    }
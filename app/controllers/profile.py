@@ -0,0 +1,329 @@
+"""
+服务器型号配置 (profiles/<型号>.json)：声明温度和风扇传感器、聚合方式，以及风扇控制的 raw 命令模板。
+配置在导入时校验并编译为传感器组（预编译的名称匹配和读取计划）与命令模板，由 ProfileController 执行；
+新增型号只需添加一个配置文件，无需编写控制器代码。
+
+配置格式：
+    model            型号名称，不区分大小写地匹配 servers.model
+    temperature      传感器组，读数按 aggregate 聚合为决策温度
+    fans             传感器组，读数按 aggregate 聚合为平均转速
+    fan_control      encoding: percent (0x00~0x64) | byte (0x00~0xff)
+                     set_speed: 命令模板，{speed} 为编码后的转速，{fan} 为 fans 中的风扇编号（逐个风扇设置时）
+                     fans: 逐个风扇设置时的风扇编号列表（可选）
+                     take_over / return_to_system: 命令模板列表，null 表示该型号无需切换
+    detect           型号自动识别（可选）：manufacturer_id 为 mc info 中的厂商 ID (IANA 编号)，
+                     product_ids 为 mc info 中的产品 ID 列表（可选），
+                     product_name 为 fru 中产品名称的正则表达式（完整匹配，可选）
+传感器组：
+    sensors          传感器名称列表，通过一条 sensor get 批量读取
+    match            传感器名称的正则表达式（完整匹配），按传感器目录读取实际存在的传感器
+    aggregate        max | min | mean
+    ignore_zero      忽略不大于 0 的读数（可选，true 或 false）
+sensors 与 match 至少提供一个；都提供时优先按目录读取，目录不可用时读取 sensors。
+只有 match 时，目录不可用则完整扫描所有传感器。
+"""
+import collections
+import json
+import logging
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+from .base import BaseServerController
+from .sensor_catalog import UNIT_TYPES
+from .sensor_parser import iter_sensor_list, parse_sdr_list, parse_sensor_get
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+AGGREGATES: Dict[str, Callable[[List[float]], float]] = {
+    "max": max,
+    "min": min,
+    "mean": lambda values: sum(values) / len(values),
+}
+ENCODINGS: Dict[str, Callable[[int], str]] = {
+    "percent": lambda speed: hex(int(speed)),
+    "byte": lambda speed: f"0x{int((speed / 100) * 255):02x}",
+}
+# 传感器组对应的传感器目录类型及 sensor 输出中的单位
+SENSOR_GROUPS = {"temperature": ("temperature", "degrees C"), "fans": ("fan", "RPM")}
+# get_all_sensors 返回的传感器类型
+TELEMETRY_TYPES = ("temperature", "fan", "power")
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+class ProfileError(ValueError):
+    """型号配置无效"""
+    pass
+
+
+class SensorGroup:
+    """一组需要聚合的传感器（如所有 CPU 温度）"""
+
+    def __init__(self, key: str, spec: dict, source: str):
+        _check_keys(spec, {"sensors", "match", "aggregate", "ignore_zero"}, f"{source}: {key}")
+        self.sensor_type, self.unit = SENSOR_GROUPS[key]
+        names = spec.get("sensors", [])
+        if not isinstance(names, list) or not all(isinstance(name, str) and name for name in names):
+            raise ProfileError(f"{source}: {key}.sensors must be a list of sensor names")
+        self.names = tuple(names)
+        try:
+            self.pattern = re.compile(spec["match"]) if spec.get("match") else None
+        except (re.error, TypeError) as e:
+            raise ProfileError(f"{source}: invalid {key}.match: {e}")
+        if not self.names and self.pattern is None:
+            raise ProfileError(f"{source}: {key} needs sensors or match")
+        if spec.get("aggregate") not in AGGREGATES:
+            raise ProfileError(f"{source}: {key}.aggregate must be one of {sorted(AGGREGATES)}")
+        self._aggregate = AGGREGATES[spec["aggregate"]]
+        self.ignore_zero = spec.get("ignore_zero", False)
+        if not isinstance(self.ignore_zero, bool):
+            raise ProfileError(f"{source}: {key}.ignore_zero must be true or false")
+        self._name_set = frozenset(self.names)
+
+    def matches(self, name: str) -> bool:
+        if self.pattern is not None:
+            return self.pattern.fullmatch(name) is not None
+        return name in self._name_set
+
+    def aggregate(self, values: List[float]) -> Optional[float]:
+        if self.ignore_zero:
+            values = [value for value in values if value > 0]
+        return self._aggregate(values) if values else None
+
+
+class CommandTemplate:
+    """ipmitool 命令模板，编译时记录需要替换的参数位置"""
+
+    def __init__(self, args, allowed: set, source: str):
+        if not isinstance(args, list) or not args or not all(isinstance(arg, str) for arg in args):
+            raise ProfileError(f"{source}: command must be a non-empty list of strings")
+        self.args = tuple(args)
+        self.slots = [(i, arg) for i, arg in enumerate(self.args) if "{" in arg]
+        self.placeholders = {name for _, arg in self.slots for name in _PLACEHOLDER.findall(arg)}
+        if self.placeholders - allowed:
+            raise ProfileError(f"{source}: unknown placeholder(s) {sorted(self.placeholders - allowed)}")
+
+    def render(self, **values) -> tuple:
+        if not self.slots:
+            return self.args
+        args = list(self.args)
+        for i, arg in self.slots:
+            args[i] = arg.format(**values)
+        return tuple(args)
+
+
+class DetectRule:
+    """型号自动识别规则：按 mc info 的厂商/产品 ID 和 fru 的产品名称匹配"""
+
+    def __init__(self, spec: dict, source: str):
+        if not isinstance(spec, dict):
+            raise ProfileError(f"{source}: detect must be an object")
+        _check_keys(spec, {"manufacturer_id", "product_ids", "product_name"}, f"{source}: detect")
+        self.manufacturer_id = spec.get("manufacturer_id")
+        if not isinstance(self.manufacturer_id, int) or isinstance(self.manufacturer_id, bool):
+            raise ProfileError(f"{source}: detect.manufacturer_id must be an integer")
+        self.product_ids = spec.get("product_ids")
+        if self.product_ids is not None and (
+                not self.product_ids or not all(isinstance(product, int) for product in self.product_ids)):
+            raise ProfileError(f"{source}: detect.product_ids must be a list of integers")
+        try:
+            self.product_name = re.compile(spec["product_name"]) if spec.get("product_name") else None
+        except (re.error, TypeError) as e:
+            raise ProfileError(f"{source}: invalid detect.product_name: {e}")
+
+    def matches(self, manufacturer_id: int, product_id: Optional[int], product_name: str) -> bool:
+        if manufacturer_id != self.manufacturer_id:
+            return False
+        if self.product_ids is not None and product_id not in self.product_ids:
+            return False
+        return self.product_name is None or self.product_name.fullmatch(product_name) is not None
+
+
+class ModelProfile:
+    """编译后的型号配置"""
+
+    def __init__(self, spec: dict, source: str):
+        if not isinstance(spec, dict):
+            raise ProfileError(f"{source}: profile must be an object")
+        _check_keys(spec, {"model", "description", "temperature", "fans", "fan_control", "detect"}, source)
+        if not isinstance(spec.get("model"), str) or not spec["model"]:
+            raise ProfileError(f"{source}: model is required")
+        self.model = spec["model"]
+        self.key = self.model.lower()
+        self.description = spec.get("description", self.model)
+        for key in ("temperature", "fans", "fan_control"):
+            if not isinstance(spec.get(key), dict):
+                raise ProfileError(f"{source}: {key} is required")
+        self.temperature = SensorGroup("temperature", spec["temperature"], source)
+        self.fans = SensorGroup("fans", spec["fans"], source)
+
+        control = spec["fan_control"]
+        _check_keys(control, {"encoding", "set_speed", "fans", "take_over", "return_to_system"}, f"{source}: fan_control")
+        if control.get("encoding") not in ENCODINGS:
+            raise ProfileError(f"{source}: fan_control.encoding must be one of {sorted(ENCODINGS)}")
+        self.encode = ENCODINGS[control["encoding"]]
+        self.fan_ids = control.get("fans")
+        allowed = {"speed", "fan"} if self.fan_ids is not None else {"speed"}
+        self.set_speed = CommandTemplate(control.get("set_speed"), allowed, f"{source}: fan_control.set_speed")
+        if "speed" not in self.set_speed.placeholders:
+            raise ProfileError(f"{source}: fan_control.set_speed must contain {{speed}}")
+        if self.fan_ids is not None:
+            if not self.fan_ids or not all(isinstance(fan, int) and 0 <= fan <= 0xff for fan in self.fan_ids):
+                raise ProfileError(f"{source}: fan_control.fans must be a list of fan numbers (0-255)")
+            if "fan" not in self.set_speed.placeholders:
+                raise ProfileError(f"{source}: fan_control.set_speed must contain {{fan}} when fans is set")
+        self.take_over = self._commands(control, "take_over", source)
+        self.return_to_system = self._commands(control, "return_to_system", source)
+        self.detect = DetectRule(spec["detect"], source) if spec.get("detect") is not None else None
+
+    @staticmethod
+    def _commands(control: dict, key: str, source: str) -> Optional[List[CommandTemplate]]:
+        commands = control.get(key)
+        if commands is None:
+            return None
+        if not isinstance(commands, list):
+            raise ProfileError(f"{source}: fan_control.{key} must be a list of commands or null")
+        return [CommandTemplate(args, set(), f"{source}: fan_control.{key}") for args in commands]
+
+    def plan_set_speed(self, speed: int) -> List[tuple]:
+        """设置转速需要依次执行的命令"""
+        encoded = self.encode(speed)
+        if self.fan_ids is None:
+            return [self.set_speed.render(speed=encoded)]
+        return [self.set_speed.render(speed=encoded, fan=f"0x{fan:02x}") for fan in self.fan_ids]
+
+
+def _check_keys(spec: dict, allowed: set, source: str):
+    unknown = set(spec) - allowed
+    if unknown:
+        raise ProfileError(f"{source}: unknown key(s) {sorted(unknown)}")
+
+
+def load_profiles(directory: str = PROFILE_DIR) -> Dict[str, ModelProfile]:
+    """加载并校验目录中的所有型号配置，键为小写型号；任何配置无效时抛出 ProfileError"""
+    profiles = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path, encoding="utf-8") as f:
+                spec = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ProfileError(f"{filename}: {e}")
+        profile = ModelProfile(spec, filename)
+        if profile.key in profiles:
+            raise ProfileError(f"{filename}: duplicate model '{profile.model}'")
+        profiles[profile.key] = profile
+    return profiles
+
+
+PROFILES = load_profiles()
+
+
+class ProfileController(BaseServerController):
+    """
+    按型号配置实现的控制器。子类只需设置 profile；需要特殊处理的型号可以覆盖相应方法。
+    """
+    profile: ModelProfile
+
+    async def _read_group(self, group: SensorGroup) -> List[float]:
+        if group.pattern is not None:
+            values = await self.read_catalog_sensors(group.sensor_type, group.matches)
+            if values is not None:
+                return values
+        if group.names:
+            output = await self._run_ipmi_command('sensor', 'get', *group.names)
+            if not output:
+                return []
+            readings = parse_sensor_get(output)
+            return [readings[name].value for name in group.names
+                    if name in readings and readings[name].value is not None]
+        output = await self._run_ipmi_command('sensor')
+        if not output:
+            return []
+        return [reading.value for reading in iter_sensor_list(output)
+                if reading.value is not None and reading.unit == group.unit and group.matches(reading.name)]
+
+    async def _get_temperature_from_ipmi(self) -> float:
+        temperature = self.profile.temperature.aggregate(await self._read_group(self.profile.temperature))
+        if temperature is None:
+            logger.warning(f"No valid CPU temperature readings found for server {self.server.name}.")
+            return -1.0
+        return temperature
+
+    async def _get_fan_speed_from_ipmi(self) -> int:
+        speeds = await self._read_group(self.profile.fans)
+        speed = self.profile.fans.aggregate(speeds)
+        if speed is None:
+            logger.warning(f"No valid fan speed readings found for server {self.server.name}")
+            return -1
+        logger.debug(f"Retrieved fan speeds for {self.server.name}: {speeds}, average: {int(speed)} RPM")
+        return int(speed)
+
+    async def get_all_sensors(self) -> list[dict]:
+        """
+        读取所有温度、风扇和功率传感器：有传感器目录时通过本地 SDR 缓存执行一条 sdr elist full，否则完整扫描。
+        无读数的传感器也会返回（value 为 None），同名传感器（如 R730 的两个 "Temp"）按出现顺序加上 " #1"、" #2"。
+        :return: [{"name": "Fan1", "type": "fan", "value": 3720.0, "unit": "RPM", "status": "ok"}, ...]
+        """
+        catalog = await self.get_sensor_catalog()
+        if catalog is not None:
+            output = await self._run_ipmi_command(*catalog.command_prefix(), 'sdr', 'elist', 'full')
+            readings = parse_sdr_list(output) if output else []
+            # 无读数时输出中没有单位，从目录中取
+            known = {sensor["name"]: (sensor["type"], sensor["unit"]) for sensor in catalog.sensors}
+        else:
+            output = await self._run_ipmi_command('sensor')
+            readings = list(iter_sensor_list(output)) if output else []
+            known = {}
+
+        sensors = []
+        for reading in readings:
+            sensor_type, unit = UNIT_TYPES.get(reading.unit), reading.unit
+            if sensor_type is None:
+                sensor_type, unit = known.get(reading.name, (None, unit))
+            if sensor_type in TELEMETRY_TYPES:
+                sensors.append({"name": reading.name, "type": sensor_type, "value": reading.value,
+                                "unit": unit, "status": reading.status})
+        counts = collections.Counter(sensor["name"] for sensor in sensors)
+        seen = collections.Counter()
+        for sensor in sensors:
+            if counts[sensor["name"]] > 1:
+                seen[sensor["name"]] += 1
+                sensor["name"] = f"{sensor['name']} #{seen[sensor['name']]}"
+        return sensors
+
+    async def set_fan_speed(self, speed: int):
+        if not (0 <= speed <= 100):
+            logger.error(f"Invalid fan speed value for {self.server.name}: {speed}. Must be between 0 and 100.")
+            return
+        for args in self.profile.plan_set_speed(speed):
+            await self._run_ipmi_command(*args)
+        logger.info(f"Set fan speed to {speed}% for server {self.server.name}")
+
+    async def take_over_fan_control(self):
+        if self.profile.take_over is None:
+            logger.info(f"take_over_fan_control for {self.server.name} is not needed by {self.profile.model}.")
+            return
+        for command in self.profile.take_over:
+            await self._run_ipmi_command(*command.render())
+        logger.info(f"Took over fan control for server {self.server.name} (set to manual).")
+
+    async def return_fan_control_to_system(self) -> bool:
+        if self.profile.return_to_system is None:
+            logger.info(f"return_fan_control_to_system for {self.server.name} is not needed by {self.profile.model}.")
+            return True
+        for command in self.profile.return_to_system:
+            if await self._run_ipmi_command(*command.render()) is None:
+                return False
+        logger.info(f"Returned fan control to system for server {self.server.name} (set to auto).")
+        return True
+
+
+def controller_class_for(profile: ModelProfile) -> type:
+    """为没有专门实现的型号生成控制器类"""
+    return type(f"{profile.model}Controller", (ProfileController,), {"profile": profile})
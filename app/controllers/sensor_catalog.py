@@ -0,0 +1,113 @@
+"""
+BMC 传感器目录。
+首次使用时对 BMC 做一次完整扫描：将 SDR 仓库导出为本地缓存文件 (ipmitool sdr dump)，
+并记录每个传感器的名称、编号、实体、类型、单位和阈值，保存在 sensor_catalogs 表中。
+之后的读数通过 -S 使用本地 SDR 缓存，只读取需要的传感器，不再每次下载整个 SDR 仓库。
+"""
+import datetime
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..database import data_dir
+
+CATALOG_TTL = 24 * 3600      # 目录有效期（秒），过期后重新扫描
+CATALOG_RETRY_DELAY = 300    # 两次扫描之间的最短间隔（秒），避免 BMC 异常时反复全量扫描
+SDR_CACHE_DIR = os.path.join(data_dir, "sdr")
+
+THRESHOLD_COLUMNS = ("lnr", "lcr", "lnc", "unc", "ucr", "unr")
+UNIT_TYPES = {
+    "degrees C": "temperature",
+    "RPM": "fan",
+    "Volts": "voltage",
+    "Amps": "current",
+    "Watts": "power",
+    "percent": "percent",
+}
+# sdr type 命令使用的传感器类型名称
+SDR_TYPE_NAMES = {"temperature": "Temperature", "fan": "Fan"}
+
+def sdr_cache_path(host: str) -> str:
+    return os.path.join(SDR_CACHE_DIR, re.sub(r"[^\w.-]", "_", host) + ".sdr")
+
+
+def parse_sensor_listing(output: str) -> List[dict]:
+    """
+    解析 ipmitool sensor 的输出：名称 | 读数 | 单位 | 状态 | lnr | lcr | lnc | unc | ucr | unr
+    """
+    sensors = []
+    for line in output.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) < 3 or not parts[0]:
+            continue
+        unit = parts[2]
+        thresholds = {}
+        for column, value in zip(THRESHOLD_COLUMNS, parts[4:10]):
+            try:
+                thresholds[column] = float(value)
+            except ValueError:
+                continue  # na
+        sensors.append({
+            "name": parts[0],
+            "type": UNIT_TYPES.get(unit, "discrete" if unit == "discrete" else "other"),
+            "unit": unit,
+            "thresholds": thresholds,
+        })
+    return sensors
+
+
+def parse_sdr_elist(output: str) -> List[Tuple[str, Optional[int], str]]:
+    """解析 ipmitool sdr elist 的输出：名称 | 编号 (如 0Eh) | 状态 | 实体 | 读数，返回 (名称, 编号, 实体)"""
+    entries = []
+    for line in output.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) < 4 or not parts[0]:
+            continue
+        try:
+            number = int(parts[1].rstrip("h"), 16)
+        except ValueError:
+            number = None
+        entries.append((parts[0], number, parts[3]))
+    return entries
+
+
+class SensorCatalog:
+    """一台 BMC 的传感器目录"""
+
+    def __init__(self, host: str, sensors: List[dict], discovered_at: datetime.datetime,
+                 sdr_cache: Optional[str] = None):
+        self.host = host
+        self.sensors = sensors
+        self.discovered_at = discovered_at
+        self.sdr_cache = sdr_cache
+        self.stale = False  # 读数与目录不符时置位，下次读取前重新扫描
+
+    @classmethod
+    def build(cls, host: str, listing: str, elist: Optional[str], discovered_at: datetime.datetime,
+              sdr_cache: Optional[str] = None) -> "SensorCatalog":
+        """由 sensor 与 sdr elist 的输出构建目录；同名传感器按出现顺序对应"""
+        sensors = parse_sensor_listing(listing)
+        numbers: Dict[str, list] = {}
+        for name, number, entity in parse_sdr_elist(elist or ""):
+            numbers.setdefault(name, []).append((number, entity))
+        for sensor in sensors:
+            candidates = numbers.get(sensor["name"])
+            number, entity = candidates.pop(0) if candidates else (None, None)
+            sensor["number"] = number
+            sensor["entity"] = entity
+        return cls(host, sensors, discovered_at, sdr_cache)
+
+    def expired(self, now: datetime.datetime) -> bool:
+        return self.stale or (now - self.discovered_at).total_seconds() > CATALOG_TTL
+
+    def select(self, sensor_type: str, predicate: Optional[Callable[[str], bool]] = None) -> List[dict]:
+        return [
+            sensor for sensor in self.sensors
+            if sensor["type"] == sensor_type and (predicate is None or predicate(sensor["name"]))
+        ]
+
+    def command_prefix(self) -> list:
+        """使用本地 SDR 缓存的 ipmitool 参数（缓存文件不存在时为空）"""
+        if self.sdr_cache and os.path.exists(self.sdr_cache):
+            return ["-S", self.sdr_cache]
+        return []
@@ -0,0 +1,96 @@
+"""
+ipmitool 传感器读数输出的解析，所有型号共用。
+每个函数只遍历一次输出：sensor get 用一个预编译的多行正则表达式找出所需字段，
+表格形式的输出 (sensor / sdr) 逐行按 "|" 切分。
+"""
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+# 读数字段，如 "3720 (+/- 120) RPM"、"48 (+/- 0) degrees C"、"45.000"
+_VALUE = re.compile(r"\s*(-?\d+(?:\.\d+)?)(?:\s*\(\+/-\s*[\d.]+\))?\s*(.*)")
+# sensor get 输出中需要的三个字段 (行首)，一次扫描整段输出即可找出，阈值等其他行在正则引擎内跳过。
+# 以换行符而不是 ^ (re.M) 锚定行首，正则引擎可以按字面量前缀快速查找
+_SENSOR_GET_FIELDS = re.compile(r"\n[ \t]*(Sensor ID|Sensor Reading|Status)[ \t]*:[ \t]*([^\r\n]*)")
+
+
+class SensorReading(NamedTuple):
+    name: str
+    value: Optional[float]  # 无读数 (No Reading / na / 离散传感器) 时为 None
+    unit: str
+    status: str
+
+
+def _split_value(text: str):
+    match = _VALUE.fullmatch(text)
+    if match is None:
+        return None, ""
+    return float(match.group(1)), match.group(2).strip()
+
+
+def parse_sensor_get(output: str) -> Dict[str, SensorReading]:
+    """
+    解析 ipmitool sensor get <名称...> 的输出（可包含多个传感器），返回 {名称: 读数}。
+    每个传感器段以 "Sensor ID : <名称> (0x..)" 开始，读数和状态取自该段的 Sensor Reading / Status 行。
+    """
+    readings: Dict[str, SensorReading] = {}
+    name = None
+    value, unit, status = None, "", ""
+    for key, text in _SENSOR_GET_FIELDS.findall("\n" + output):
+        if key == "Sensor ID":
+            if name is not None:
+                readings[name] = SensorReading(name, value, unit, status)
+            # 如 "Fan1 (0x30)"
+            name = text.rstrip()
+            if name.endswith(")"):
+                suffix = name.rfind(" (0x")
+                if suffix >= 0:
+                    name = name[:suffix].rstrip()
+            value, unit, status = None, "", ""
+        elif name is None:
+            continue
+        elif key == "Status":
+            status = text.rstrip()
+        else:
+            value, unit = _split_value(text)
+    if name is not None:
+        readings[name] = SensorReading(name, value, unit, status)
+    return readings
+
+
+def iter_sensor_list(output: str) -> Iterator[SensorReading]:
+    """
+    解析 ipmitool sensor 的输出：名称 | 读数 | 单位 | 状态 | 阈值...
+    按出现顺序逐个返回，同名传感器（如 R730 的两个 "Temp"）各自返回。
+    """
+    for line in output.splitlines():
+        parts = line.split("|", 4)
+        if len(parts) < 3:
+            continue
+        name = parts[0].strip()
+        if not name:
+            continue
+        try:
+            value = float(parts[1])
+        except ValueError:
+            value = None  # na、0x0 等
+        yield SensorReading(name, value, parts[2].strip(), parts[3].strip() if len(parts) > 3 else "")
+
+
+def parse_sensor_list(output: str) -> Dict[str, SensorReading]:
+    """解析 ipmitool sensor 的输出，返回 {名称: 读数}；同名传感器只保留最后一个，需要全部时使用 iter_sensor_list"""
+    return {reading.name: reading for reading in iter_sensor_list(output)}
+
+
+def parse_sdr_list(output: str) -> List[SensorReading]:
+    """解析 ipmitool sdr type / sdr elist 的输出：名称 | 编号 | 状态 | 实体 | 读数，按出现顺序返回"""
+    readings = []
+    for line in output.splitlines():
+        parts = line.split("|")
+        if len(parts) < 5:
+            continue
+        name = parts[0].strip()
+        if not name:
+            continue
+        value, unit = _split_value(parts[4])
+        readings.append(SensorReading(name, value, unit, parts[2].strip()))
+    return readings
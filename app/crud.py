@@ -1,7 +1,9 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
-from sqlalchemy import func, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import func, delete, update, and_, or_, case, cast, null, union_all, Integer, Float
 import datetime
 from . import models, schemas
 
@@ -23,6 +25,13 @@ async def get_server_by_name(db: AsyncSession, name: str):
     result = await db.execute(select(models.Server).filter(models.Server.name == name))
     return result.scalars().first()
 
+async def get_existing_server_names(db: AsyncSession, names: list[str]) -> set:
+    """返回 names 中已被使用的服务器名称"""
+    if not names:
+        return set()
+    result = await db.execute(select(models.Server.name).filter(models.Server.name.in_(names)))
+    return set(result.scalars().all())
+
 async def get_servers(db: AsyncSession, skip: int = 0, limit: int = 100):
     """获取服务器列表"""
     result = await db.execute(
@@ -67,6 +76,43 @@ async def delete_server(db: AsyncSession, server_id: int):
     return db_server
 
 
+async def get_servers_with_polling(db: AsyncSession):
+    """获取所有服务器及其采样间隔配置"""
+    result = await db.execute(select(models.Server).options(joinedload(models.Server.polling)).order_by(models.Server.id))
+    return result.scalars().all()
+
+async def get_server_labels(db: AsyncSession):
+    """获取所有服务器的 (id, 名称, 型号) 列元组"""
+    result = await db.execute(select(models.Server.id, models.Server.name, models.Server.model))
+    return result.all()
+
+async def get_servers_for_startup(db: AsyncSession):
+    """
+    启动时一次查询加载所有服务器及其风扇曲线、采样间隔配置和最新的温度/转速读数。
+    :return: [(Server, 最新温度或 None, 最新平均转速或 None), ...]
+    """
+    def latest(model, column):
+        return (
+            select(column)
+            .where(model.server_id == models.Server.id)
+            .order_by(model.timestamp.desc(), model.id.desc())
+            .limit(1)
+            .correlate(models.Server)
+            .scalar_subquery()
+        )
+
+    result = await db.execute(
+        select(
+            models.Server,
+            latest(models.TemperatureHistory, models.TemperatureHistory.temperature),
+            latest(models.FanSpeedHistory, models.FanSpeedHistory.average_speed_rpm),
+        )
+        .options(joinedload(models.Server.fan_curves), joinedload(models.Server.polling))
+        .order_by(models.Server.id)
+    )
+    return result.unique().all()
+
+
 # ====================
 # Fan Curve & History CRUD
 # ====================
@@ -215,4 +261,450 @@ async def get_recent_fan_speed_history(db: AsyncSession, server_id: int, limit:
         .order_by(models.FanSpeedHistory.timestamp.desc())
         .limit(limit)
     )
-    return result.scalars().all()
\ No newline at end of file
+    return result.scalars().all()
+
+# ====================
+# Polling Config CRUD
+# ====================
+
+async def get_polling_config(db: AsyncSession, server_id: int):
+    """获取服务器的采样间隔配置"""
+    result = await db.execute(select(models.ServerPolling).filter(models.ServerPolling.server_id == server_id))
+    return result.scalars().first()
+
+async def get_polling_configs(db: AsyncSession):
+    """获取所有服务器的采样间隔配置"""
+    result = await db.execute(select(models.ServerPolling))
+    return result.scalars().all()
+
+async def set_polling_config(db: AsyncSession, server_id: int, config: schemas.PollingConfig):
+    """创建或更新服务器的采样间隔配置"""
+    db_config = await get_polling_config(db, server_id)
+    if db_config is None:
+        db_config = models.ServerPolling(server_id=server_id)
+        db.add(db_config)
+    for key, value in config.dict().items():
+        setattr(db_config, key, value)
+    await db.commit()
+    await db.refresh(db_config)
+    return db_config
+
+
+# ====================
+# Fail-safe Event CRUD
+# ====================
+
+async def open_fail_safe_event(db: AsyncSession, server_id: int, action: str, failures: int):
+    """记录服务器进入故障安全模式"""
+    db_event = models.FailSafeEvent(server_id=server_id, action=action, failures=failures)
+    db.add(db_event)
+    await db.commit()
+    await db.refresh(db_event)
+    return db_event
+
+async def close_fail_safe_events(db: AsyncSession, server_id: int | None = None):
+    """记录服务器退出故障安全模式（server_id 为空时关闭所有未结束的记录）"""
+    stmt = update(models.FailSafeEvent).where(models.FailSafeEvent.exited_at.is_(None))
+    if server_id is not None:
+        stmt = stmt.where(models.FailSafeEvent.server_id == server_id)
+    result = await db.execute(stmt.values(exited_at=models.get_local_time()))
+    await db.commit()
+    return result.rowcount
+
+async def get_fail_safe_events(db: AsyncSession, server_id: int, limit: int = 20):
+    """获取服务器最近的故障安全记录（新的在前）"""
+    result = await db.execute(
+        select(models.FailSafeEvent)
+        .filter(models.FailSafeEvent.server_id == server_id)
+        .order_by(models.FailSafeEvent.entered_at.desc(), models.FailSafeEvent.id.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_fail_safe_totals(db: AsyncSession, server_id: int):
+    """进入故障安全模式的总次数，以及已结束记录的累计时长（秒）"""
+    event = models.FailSafeEvent
+    duration = (func.julianday(event.exited_at) - func.julianday(event.entered_at)) * 86400
+    result = await db.execute(
+        select(func.count(event.id), func.coalesce(func.sum(duration), 0.0))
+        .filter(event.server_id == server_id)
+    )
+    return result.one()
+
+
+# ====================
+# Latest Reading CRUD
+# ====================
+
+async def upsert_latest_readings(db: AsyncSession, readings: list[dict]):
+    """批量写入服务器的最新读数（一条语句、一次提交）"""
+    if not readings:
+        return
+    stmt = sqlite_insert(models.LatestReading)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.LatestReading.server_id],
+        set_={
+            "temperature": stmt.excluded.temperature,
+            "average_speed_rpm": stmt.excluded.average_speed_rpm,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await db.execute(stmt, readings)
+    await db.commit()
+
+async def get_latest_readings(db: AsyncSession):
+    """获取所有服务器的最新读数及名称、型号（列元组）"""
+    reading = models.LatestReading
+    result = await db.execute(
+        select(reading.server_id, models.Server.name, models.Server.model,
+               reading.temperature, reading.average_speed_rpm, reading.updated_at)
+        .join(models.Server, models.Server.id == reading.server_id)
+    )
+    return result.all()
+
+
+# ====================
+# Sensor Catalog CRUD
+# ====================
+
+async def get_sensor_catalog(db: AsyncSession, server_id: int):
+    """获取服务器的传感器目录，不存在时返回 None"""
+    return await db.get(models.ServerSensorCatalog, server_id)
+
+async def save_sensor_catalog(db: AsyncSession, server_id: int, ipmi_host: str, sensors: list[dict],
+                              discovered_at: datetime.datetime):
+    """保存（覆盖）服务器的传感器目录"""
+    await db.merge(models.ServerSensorCatalog(
+        server_id=server_id, ipmi_host=ipmi_host, sensors=sensors, discovered_at=discovered_at))
+    await db.commit()
+
+
+# ====================
+# BMC Identity CRUD
+# ====================
+
+async def get_bmc_identities(db: AsyncSession, ipmi_hosts: list[str]) -> dict:
+    """按 BMC 地址获取缓存的探测结果，返回 {ipmi_host: models.BmcIdentity}"""
+    if not ipmi_hosts:
+        return {}
+    result = await db.execute(select(models.BmcIdentity).filter(models.BmcIdentity.ipmi_host.in_(ipmi_hosts)))
+    return {identity.ipmi_host: identity for identity in result.scalars().all()}
+
+async def save_bmc_identities(db: AsyncSession, identities: dict, probed_at: datetime.datetime):
+    """保存（覆盖）探测结果，identities 为 {ipmi_host: (厂商 ID, 产品 ID, 产品名称)}，一次提交"""
+    for ipmi_host, (manufacturer_id, product_id, product_name) in identities.items():
+        await db.merge(models.BmcIdentity(ipmi_host=ipmi_host, manufacturer_id=manufacturer_id, product_id=product_id,
+                                          product_name=product_name, probed_at=probed_at))
+    await db.commit()
+
+
+# ====================
+# Sensor History CRUD
+# ====================
+
+SENSOR_SAMPLES_KEPT = 3600  # 每台服务器保留的传感器采样数
+
+async def get_latest_sensor_dictionary(db: AsyncSession, server_id: int):
+    """获取服务器最新的传感器列表，不存在时返回 None"""
+    result = await db.execute(
+        select(models.SensorDictionary)
+        .filter(models.SensorDictionary.server_id == server_id)
+        .order_by(models.SensorDictionary.id.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+async def create_sensor_dictionary(db: AsyncSession, server_id: int, sensors: list[dict], created_at: datetime.datetime):
+    """新建服务器的传感器列表"""
+    dictionary = models.SensorDictionary(server_id=server_id, sensors=sensors, created_at=created_at)
+    db.add(dictionary)
+    await db.commit()
+    await db.refresh(dictionary)
+    return dictionary
+
+async def get_sensor_dictionaries(db: AsyncSession, dictionary_ids: list[int]) -> dict:
+    """按 ID 获取传感器列表，返回 {id: sensors}"""
+    if not dictionary_ids:
+        return {}
+    result = await db.execute(
+        select(models.SensorDictionary.id, models.SensorDictionary.sensors)
+        .filter(models.SensorDictionary.id.in_(dictionary_ids))
+    )
+    return dict(result.all())
+
+async def create_sensor_sample(db: AsyncSession, server_id: int, dictionary_id: int, readings: bytes,
+                               timestamp: datetime.datetime):
+    """写入一次采样的打包读数，并清理超出保留数量的旧采样"""
+    db.add(models.SensorSample(server_id=server_id, dictionary_id=dictionary_id, readings=readings, timestamp=timestamp))
+    await db.flush()
+    oldest_kept = (
+        select(models.SensorSample.timestamp)
+        .filter(models.SensorSample.server_id == server_id)
+        .order_by(models.SensorSample.timestamp.desc())
+        .offset(SENSOR_SAMPLES_KEPT - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
+    await db.execute(
+        delete(models.SensorSample)
+        .filter(models.SensorSample.server_id == server_id, models.SensorSample.timestamp < oldest_kept)
+    )
+    await db.commit()
+
+async def get_sensor_samples(db: AsyncSession, server_id: int, start_date: datetime.datetime, end_date: datetime.datetime):
+    """获取时间范围内的传感器采样（列元组：时间戳、传感器列表 ID、打包读数，按时间升序）"""
+    sample = models.SensorSample
+    result = await db.execute(
+        select(sample.timestamp, sample.dictionary_id, sample.readings)
+        .filter(sample.server_id == server_id, sample.timestamp >= start_date, sample.timestamp <= end_date)
+        .order_by(sample.timestamp)
+    )
+    return result.all()
+
+
+# ====================
+# Collector Sharding CRUD
+# ====================
+
+async def heartbeat_collector_member(db: AsyncSession, member_id: str, hostname: str, pid: int, now: datetime.datetime):
+    """登记采集进程或刷新其心跳时间"""
+    result = await db.execute(
+        update(models.CollectorMember)
+        .where(models.CollectorMember.member_id == member_id)
+        .values(heartbeat_at=now)
+    )
+    if result.rowcount == 0:
+        db.add(models.CollectorMember(member_id=member_id, hostname=hostname, pid=pid, started_at=now, heartbeat_at=now))
+    await db.commit()
+
+async def get_live_collector_members(db: AsyncSession, since: datetime.datetime) -> list:
+    """获取 since 之后仍有心跳的采集进程 ID"""
+    result = await db.execute(
+        select(models.CollectorMember.member_id).where(models.CollectorMember.heartbeat_at >= since)
+    )
+    return result.scalars().all()
+
+async def get_collector_members(db: AsyncSession):
+    """获取所有登记过的采集进程及其持有的租约数量（列元组）"""
+    member = models.CollectorMember
+    result = await db.execute(
+        select(member.member_id, member.hostname, member.pid, member.started_at, member.heartbeat_at,
+               func.count(models.ServerLease.server_id))
+        .outerjoin(models.ServerLease, models.ServerLease.owner == member.member_id)
+        .group_by(member.member_id)
+        .order_by(member.started_at)
+    )
+    return result.all()
+
+async def delete_collector_member(db: AsyncSession, member_id: str):
+    """采集进程退出时注销，并释放其全部租约"""
+    await db.execute(delete(models.ServerLease).where(models.ServerLease.owner == member_id))
+    await db.execute(delete(models.CollectorMember).where(models.CollectorMember.member_id == member_id))
+    await db.commit()
+
+async def claim_server_lease(db: AsyncSession, server_id: int, owner: str, now: datetime.datetime,
+                             expires_at: datetime.datetime) -> bool:
+    """
+    获取服务器的租约。租约不存在、已过期或本来就属于 owner 时成功；
+    其他进程持有未过期的租约时失败（对方尚未完成交接）。
+    """
+    lease = models.ServerLease
+    result = await db.execute(
+        update(lease)
+        .where(lease.server_id == server_id, or_(lease.owner == owner, lease.expires_at < now))
+        .values(owner=owner, expires_at=expires_at)
+    )
+    if result.rowcount == 0:
+        exists = await db.execute(select(lease.server_id).where(lease.server_id == server_id))
+        if exists.first() is not None:
+            await db.rollback()
+            return False
+        db.add(lease(server_id=server_id, owner=owner, expires_at=expires_at))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 另一个进程同时插入了租约
+        await db.rollback()
+        return False
+    return True
+
+async def renew_server_leases(db: AsyncSession, owner: str, now: datetime.datetime,
+                              expires_at: datetime.datetime) -> set:
+    """
+    续期 owner 持有且尚未过期的全部租约。
+    :return: 续期成功的服务器 ID；不在其中的服务器已失去租约，须立即停止控制。
+    """
+    lease = models.ServerLease
+    await db.execute(
+        update(lease).where(lease.owner == owner, lease.expires_at >= now).values(expires_at=expires_at)
+    )
+    await db.commit()
+    result = await db.execute(select(lease.server_id).where(lease.owner == owner, lease.expires_at == expires_at))
+    return set(result.scalars().all())
+
+async def release_server_lease(db: AsyncSession, server_id: int, owner: str):
+    """释放租约（仅当仍由 owner 持有时）"""
+    lease = models.ServerLease
+    await db.execute(delete(lease).where(lease.server_id == server_id, lease.owner == owner))
+    await db.commit()
+
+
+# ====================
+# History fast path (Core 列元组)
+# ====================
+
+TEMPERATURE_HISTORY_COLUMNS = ("id", "server_id", "temperature", "timestamp")
+FAN_SPEED_HISTORY_COLUMNS = ("id", "server_id", "average_speed_rpm", "timestamp")
+
+def _history_columns(model, columns):
+    table = model.__table__
+    return [table.c[name] for name in columns]
+
+async def _get_history_rows(db: AsyncSession, model, columns, server_id: int, start_date: datetime.datetime, end_date: datetime.datetime,
+                            after: tuple | None = None, limit: int | None = None):
+    """
+    按 (timestamp, id) 升序获取时间范围内的历史记录。
+    after 为上一页最后一行的 (timestamp, id)，用于键集分页（无 OFFSET 扫描）。
+    """
+    table = model.__table__
+    query = (
+        select(*_history_columns(model, columns))
+        .where(
+            table.c.server_id == server_id,
+            table.c.timestamp >= start_date,
+            table.c.timestamp <= end_date
+        )
+        .order_by(table.c.timestamp, table.c.id)
+    )
+    if after is not None:
+        after_ts, after_id = after
+        query = query.where(or_(
+            table.c.timestamp > after_ts,
+            and_(table.c.timestamp == after_ts, table.c.id > after_id)
+        ))
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return result.all()
+
+async def _get_recent_history_rows(db: AsyncSession, model, columns, server_id: int, limit: int, before: tuple | None = None):
+    """
+    按 (timestamp, id) 降序获取最近的历史记录。
+    before 为上一页最后一行的 (timestamp, id)，用于向更早的数据翻页。
+    """
+    table = model.__table__
+    query = (
+        select(*_history_columns(model, columns))
+        .where(table.c.server_id == server_id)
+        .order_by(table.c.timestamp.desc(), table.c.id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        before_ts, before_id = before
+        query = query.where(or_(
+            table.c.timestamp < before_ts,
+            and_(table.c.timestamp == before_ts, table.c.id < before_id)
+        ))
+    result = await db.execute(query)
+    return result.all()
+
+async def get_temperature_history_rows(db: AsyncSession, server_id: int, start_date: datetime.datetime, end_date: datetime.datetime,
+                                       after: tuple | None = None, limit: int | None = None):
+    """获取指定时间范围内的温度历史记录（列元组，按 TEMPERATURE_HISTORY_COLUMNS 顺序）"""
+    return await _get_history_rows(db, models.TemperatureHistory, TEMPERATURE_HISTORY_COLUMNS, server_id, start_date, end_date, after, limit)
+
+async def get_fan_speed_history_rows(db: AsyncSession, server_id: int, start_date: datetime.datetime, end_date: datetime.datetime,
+                                     after: tuple | None = None, limit: int | None = None):
+    """获取指定时间范围内的风扇转速历史记录（列元组，按 FAN_SPEED_HISTORY_COLUMNS 顺序）"""
+    return await _get_history_rows(db, models.FanSpeedHistory, FAN_SPEED_HISTORY_COLUMNS, server_id, start_date, end_date, after, limit)
+
+async def get_recent_temperature_history_rows(db: AsyncSession, server_id: int, limit: int = 540, before: tuple | None = None):
+    """获取最近的温度历史记录（列元组）"""
+    return await _get_recent_history_rows(db, models.TemperatureHistory, TEMPERATURE_HISTORY_COLUMNS, server_id, limit, before)
+
+async def get_recent_fan_speed_history_rows(db: AsyncSession, server_id: int, limit: int = 540, before: tuple | None = None):
+    """获取最近的风扇转速历史记录（列元组）"""
+    return await _get_recent_history_rows(db, models.FanSpeedHistory, FAN_SPEED_HISTORY_COLUMNS, server_id, limit, before)
+
+def _epoch_bucket(table, bucket_seconds: int):
+    """按 epoch 秒整除得到时间桶编号（在 SQLite 中计算）"""
+    return cast(func.strftime('%s', table.c.timestamp), Integer).op('/')(bucket_seconds)
+
+async def get_aligned_metrics_rows(db: AsyncSession, server_id: int, start_date: datetime.datetime, end_date: datetime.datetime, bucket_seconds: int):
+    """
+    在一次查询中获取温度与风扇转速历史，并按时间桶对齐。
+    :return: (bucket, 平均温度, 平均转速) 元组列表，某一序列在该桶内无数据时对应值为 None。
+    """
+    temp_table = models.TemperatureHistory.__table__
+    fan_table = models.FanSpeedHistory.__table__
+
+    temps = select(
+        _epoch_bucket(temp_table, bucket_seconds).label("bucket"),
+        temp_table.c.temperature.label("temperature"),
+        cast(null(), Float).label("speed_rpm"),
+    ).where(
+        temp_table.c.server_id == server_id,
+        temp_table.c.timestamp >= start_date,
+        temp_table.c.timestamp <= end_date
+    )
+    fans = select(
+        _epoch_bucket(fan_table, bucket_seconds).label("bucket"),
+        cast(null(), Float).label("temperature"),
+        fan_table.c.average_speed_rpm.label("speed_rpm"),
+    ).where(
+        fan_table.c.server_id == server_id,
+        fan_table.c.timestamp >= start_date,
+        fan_table.c.timestamp <= end_date
+    )
+    samples = union_all(temps, fans).subquery()
+
+    result = await db.execute(
+        select(samples.c.bucket, func.avg(samples.c.temperature), func.avg(samples.c.speed_rpm))
+        .group_by(samples.c.bucket)
+        .order_by(samples.c.bucket)
+    )
+    return result.all()
+
+# 可聚合的历史指标: 名称 -> (模型, 数值列)
+HISTORY_METRICS = {
+    "temperature": (models.TemperatureHistory, "temperature"),
+    "fan_speed": (models.FanSpeedHistory, "average_speed_rpm"),
+}
+
+async def get_bucketed_aggregates(db: AsyncSession, metric: str, server_ids: list[int], start_date: datetime.datetime, end_date: datetime.datetime, bucket_seconds: int):
+    """
+    在 SQLite 内按时间桶聚合历史数据，可同时查询多台服务器。
+    p95 使用最近秩法 (nearest-rank)：桶内升序排名首个不小于 0.95 * 样本数 的值。
+    :return: (server_id, bucket, min, max, avg, count, p95) 元组列表，按服务器和时间桶排序。
+    """
+    model, value_column = HISTORY_METRICS[metric]
+    table = model.__table__
+    value = table.c[value_column]
+    partition = (table.c.server_id, _epoch_bucket(table, bucket_seconds))
+
+    ranked = select(
+        table.c.server_id,
+        _epoch_bucket(table, bucket_seconds).label("bucket"),
+        value.label("value"),
+        func.row_number().over(partition_by=partition, order_by=value).label("rank"),
+        func.count().over(partition_by=partition).label("total"),
+    ).where(
+        table.c.server_id.in_(server_ids),
+        table.c.timestamp >= start_date,
+        table.c.timestamp <= end_date
+    ).subquery()
+
+    result = await db.execute(
+        select(
+            ranked.c.server_id,
+            ranked.c.bucket,
+            func.min(ranked.c.value),
+            func.max(ranked.c.value),
+            func.avg(ranked.c.value),
+            func.count(),
+            func.min(case((ranked.c.rank >= ranked.c.total * 0.95, ranked.c.value))),
+        )
+        .group_by(ranked.c.server_id, ranked.c.bucket)
+        .order_by(ranked.c.server_id, ranked.c.bucket)
+    )
+    return result.all()
@@ -6,14 +6,14 @@ from sqlalchemy.orm import sessionmaker, declarative_base
 data_dir = "./data"
 os.makedirs(data_dir, exist_ok=True)
 
-# 数据库文件的路径
-DATABASE_URL = f"sqlite+aiosqlite:///{data_dir}/app.db"
+# 数据库文件的路径（分片部署时各采集进程须通过 DATABASE_URL 指向同一个数据库）
+DATABASE_URL = os.environ.get("DATABASE_URL", f"sqlite+aiosqlite:///{data_dir}/app.db")
 
 # 创建异步数据库引擎
 # connect_args={"check_same_thread": False} 是 SQLite 特有的配置，
 # 用于在 FastAPI 的异步环境中允许多个线程访问同一个连接。
 engine = create_async_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+    DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 )
 
 # 创建一个异步会話工厂
@@ -28,4 +28,17 @@ Base = declarative_base()
 # 依赖注入函数，用于在 API 路由中获取数据库会话
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+def _create_missing_indexes(sync_conn):
+    # create_all 只会为新建的表创建索引，已存在的数据库需要单独补建
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+# 创建所有数据库表（API 进程和独立采集进程启动时均会调用）
+async def create_tables():
+    from . import models  # noqa: F401  确保所有模型已注册到 Base.metadata
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_missing_indexes)
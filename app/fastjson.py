@@ -0,0 +1,47 @@
+"""
+历史数据等大批量响应使用的快速 JSON 编码。
+
+直接把 SQLAlchemy Core 查询得到的列元组编码为 JSON，跳过 ORM 实体构建和
+Pydantic 逐行校验。优先使用 orjson，未安装时退回标准库 json。
+"""
+import datetime
+import json
+from typing import Any, Iterable, Sequence
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 是可选依赖
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """将任意 JSON 兼容对象编码为 bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def rows_to_dicts(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> list:
+    """将列元组转换为与 orm_mode 响应模型相同结构的字典列表"""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+class FastJSONResponse(Response):
+    """使用 orjson（若可用）编码的 JSON 响应"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_response(columns: Sequence[str], rows: Iterable[Sequence[Any]], headers: dict | None = None) -> FastJSONResponse:
+    """将列元组直接编码为 JSON 数组响应"""
+    return FastJSONResponse(rows_to_dicts(columns, rows), headers=headers)
@@ -0,0 +1,56 @@
+"""
+用于运行时指标（延迟、耗时等）的固定分桶直方图。
+"""
+import bisect
+import math
+from typing import Optional, Sequence
+
+# 默认分桶上界（秒），覆盖从毫秒级到分钟级的延迟
+DEFAULT_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    固定分桶直方图，记录 O(log 桶数)。
+    分位数以所在桶的上界近似（最后一个溢出桶以观测到的最大值近似）。
+    """
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                (f"le_{bound:g}" if i < len(self.bounds) else "inf"): count
+                for i, (bound, count) in enumerate(zip(self.bounds + (math.inf,), self.counts))
+                if count
+            },
+        }
@@ -1,24 +1,23 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
-from .services import per_server_scheduler
-
-# 创建所有数据库表
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+from .database import create_tables
+from .services.leader import ROLE
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 应用启动时执行
     await create_tables()
-    await per_server_scheduler.start_all_loops()
-    print("--- All server loops started and tables created ---")
+    # 多进程部署时只有一个进程负责采集和风扇控制
+    await ROLE.start()
+    print(f"--- Tables created, running as {ROLE.name} ---")
     yield
     # 应用关闭时执行
-    per_server_scheduler.stop_all_loops()
-    print("--- All server loops stopped ---")
+    report = await ROLE.stop()
+    print(f"--- All server loops stopped, fan control returned for {report['restored']} server(s) ---")
+    for item in report["failed"]:
+        print(f"--- WARNING: fan control NOT returned for {item['name']} (ID: {item['server_id']}) ---")
 
 
 app = FastAPI(
@@ -40,15 +39,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Rack Server Fan Controller API"}
 
+@app.get("/health/ready")
+async def read_readiness():
+    """
+    就绪检查：采集进程在所有服务器完成首次采样前返回 503，响应体中包含预热进度；
+    仅提供 API 的进程在首次同步最新读数后即就绪
+    """
+    readiness = ROLE.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
 # 引入 API 路由
-from .api import servers, control, history
+from .api import servers, control, history, fleet
 
 app.include_router(servers.router, prefix="/api/v1/servers", tags=["Servers"])
 app.include_router(control.router, prefix="/api/v1/control", tags=["Control"])
-app.include_router(history.router, prefix="/api/v1/history", tags=["History"])
\ No newline at end of file
+app.include_router(history.router, prefix="/api/v1/history", tags=["History"])
+app.include_router(fleet.router, prefix="/api/v1/fleet", tags=["Fleet"])
\ No newline at end of file
@@ -5,8 +5,11 @@ from sqlalchemy import (
     String,
     Float,
     DateTime,
+    Boolean,
     ForeignKey,
     JSON,
+    Index,
+    LargeBinary,
 )
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -28,6 +31,13 @@ class Server(Base):
     fan_curves = relationship("FanCurve", back_populates="server", cascade="all, delete-orphan")
     temp_history = relationship("TemperatureHistory", back_populates="server", cascade="all, delete-orphan")
     fan_speed_history = relationship("FanSpeedHistory", back_populates="server", cascade="all, delete-orphan")
+    polling = relationship("ServerPolling", back_populates="server", uselist=False, cascade="all, delete-orphan")
+    fail_safe_events = relationship("FailSafeEvent", back_populates="server", cascade="all, delete-orphan")
+    latest_reading = relationship("LatestReading", back_populates="server", uselist=False, cascade="all, delete-orphan")
+    lease = relationship("ServerLease", back_populates="server", uselist=False, cascade="all, delete-orphan")
+    sensor_catalog = relationship("ServerSensorCatalog", back_populates="server", uselist=False, cascade="all, delete-orphan")
+    sensor_dictionaries = relationship("SensorDictionary", back_populates="server", cascade="all, delete-orphan")
+    sensor_samples = relationship("SensorSample", back_populates="server", cascade="all, delete-orphan")
 
 
 class FanCurve(Base):
@@ -40,6 +50,18 @@ class FanCurve(Base):
     server = relationship("Server", back_populates="fan_curves")
 
 
+class ServerPolling(Base):
+    """服务器的采样间隔配置（无记录时使用固定间隔）"""
+    __tablename__ = "server_polling"
+
+    server_id = Column(Integer, ForeignKey("servers.id"), primary_key=True)
+    adaptive = Column(Boolean, default=False, nullable=False)
+    min_interval = Column(Float, nullable=False)
+    max_interval = Column(Float, nullable=False)
+
+    server = relationship("Server", back_populates="polling")
+
+
 def get_local_time():
     """获取本地时间（上海时区）"""
     shanghai_tz = pytz.timezone('Asia/Shanghai')
@@ -55,6 +77,11 @@ class TemperatureHistory(Base):
 
     server = relationship("Server", back_populates="temp_history")
 
+    # 历史查询与键集分页均按 (server_id, timestamp, id) 顺序扫描
+    __table_args__ = (
+        Index("ix_temperature_history_server_ts_id", "server_id", "timestamp", "id"),
+    )
+
 
 class FanSpeedHistory(Base):
     __tablename__ = "fan_speed_history"
@@ -64,4 +91,111 @@ class FanSpeedHistory(Base):
     average_speed_rpm = Column(Integer, nullable=False)
     timestamp = Column(DateTime, default=get_local_time, nullable=False)
 
-    server = relationship("Server", back_populates="fan_speed_history")
\ No newline at end of file
+    server = relationship("Server", back_populates="fan_speed_history")
+
+    __table_args__ = (
+        Index("ix_fan_speed_history_server_ts_id", "server_id", "timestamp", "id"),
+    )
+
+
+class FailSafeEvent(Base):
+    """服务器进入故障安全模式的记录，exited_at 为空表示仍处于故障安全模式"""
+    __tablename__ = "fail_safe_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    server_id = Column(Integer, ForeignKey("servers.id"), nullable=False, index=True)
+    action = Column(String, nullable=False)      # "safe_speed" 或 "return_to_bmc"
+    failures = Column(Integer, nullable=False)   # 进入时的连续读取失败次数
+    entered_at = Column(DateTime, default=get_local_time, nullable=False)
+    exited_at = Column(DateTime, nullable=True)
+
+    server = relationship("Server", back_populates="fail_safe_events")
+
+
+class LatestReading(Base):
+    """每台服务器的最新读数，由采集进程定期批量写入，供其他 API 进程读取"""
+    __tablename__ = "latest_readings"
+
+    server_id = Column(Integer, ForeignKey("servers.id"), primary_key=True)
+    temperature = Column(Float, nullable=True)
+    average_speed_rpm = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=False)
+
+    server = relationship("Server", back_populates="latest_reading")
+
+
+class CollectorMember(Base):
+    """分片部署中的采集进程，heartbeat_at 超过租约时长未更新即视为已退出"""
+    __tablename__ = "collector_members"
+
+    member_id = Column(String, primary_key=True)
+    hostname = Column(String, nullable=False)
+    pid = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    heartbeat_at = Column(DateTime, nullable=False)
+
+
+class ServerLease(Base):
+    """服务器的采集租约：只有持有未过期租约的采集进程才会采样和控制该服务器的风扇"""
+    __tablename__ = "server_leases"
+
+    server_id = Column(Integer, ForeignKey("servers.id"), primary_key=True)
+    owner = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+
+    server = relationship("Server", back_populates="lease")
+
+
+class ServerSensorCatalog(Base):
+    """BMC 的传感器目录（名称、编号、类型、单位、阈值），避免每次读数都完整扫描传感器"""
+    __tablename__ = "sensor_catalogs"
+
+    server_id = Column(Integer, ForeignKey("servers.id"), primary_key=True)
+    ipmi_host = Column(String, nullable=False)  # 扫描时的 BMC 地址，地址变化后目录失效
+    sensors = Column(JSON, nullable=False)
+    discovered_at = Column(DateTime, nullable=False)
+
+    server = relationship("Server", back_populates="sensor_catalog")
+
+
+class SensorDictionary(Base):
+    """
+    服务器的传感器列表（名称、类型、单位），定义 sensor_samples 中读数向量的顺序。
+    传感器组成变化时新建一条，旧的采样仍引用原来的列表
+    """
+    __tablename__ = "sensor_dictionaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    server_id = Column(Integer, ForeignKey("servers.id"), nullable=False, index=True)
+    sensors = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    server = relationship("Server", back_populates="sensor_dictionaries")
+
+
+class SensorSample(Base):
+    """一次采样中所有传感器的读数，按传感器列表的顺序打包为 float32 向量（无读数为 NaN），每次采样一行"""
+    __tablename__ = "sensor_samples"
+
+    id = Column(Integer, primary_key=True, index=True)
+    server_id = Column(Integer, ForeignKey("servers.id"), nullable=False)
+    dictionary_id = Column(Integer, ForeignKey("sensor_dictionaries.id"), nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    readings = Column(LargeBinary, nullable=False)
+
+    server = relationship("Server", back_populates="sensor_samples")
+
+    __table_args__ = (
+        Index("ix_sensor_samples_server_ts", "server_id", "timestamp"),
+    )
+
+
+class BmcIdentity(Base):
+    """BMC 的厂商/产品 ID 与 FRU 产品名称（型号自动识别的探测结果），按 BMC 地址缓存"""
+    __tablename__ = "bmc_identities"
+
+    ipmi_host = Column(String, primary_key=True)
+    manufacturer_id = Column(Integer, nullable=False)
+    product_id = Column(Integer, nullable=True)
+    product_name = Column(String, nullable=False)
+    probed_at = Column(DateTime, nullable=False)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import datetime
 
@@ -30,6 +30,7 @@ class ServerBase(BaseModel):
     ipmi_username: str
 
 class ServerCreate(ServerBase):
+    model: Optional[str] = None  # 省略时通过 BMC 自动识别
     ipmi_password: str
 
 class ServerUpdate(ServerBase):
@@ -50,6 +51,12 @@ class Server(ServerBase):
     class Config:
         orm_mode = True
 
+class ServerCreateResult(BaseModel):
+    """批量添加中一台服务器的结果，成功时 server 有值，失败时 error 有值"""
+    name: str
+    server: Optional[Server] = None
+    error: Optional[str] = None
+
 # ====================
 # API 响应模型
 # ====================
@@ -84,4 +91,187 @@ class FanSpeedHistory(BaseModel):
     timestamp: datetime.datetime
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class MetricsHistory(BaseModel):
+    """按共享时间轴对齐的温度与风扇转速历史（列式存储，三个列表等长）"""
+    server_id: int
+    bucket_seconds: int
+    timestamps: List[datetime.datetime]
+    temperature: List[Optional[float]]
+    average_speed_rpm: List[Optional[int]]
+
+class SensorSeries(BaseModel):
+    name: str
+    type: str  # temperature / fan / power
+    unit: str
+    values: List[Optional[float]]
+
+class SensorHistory(BaseModel):
+    """逐传感器历史（列式存储，每个传感器的 values 与 timestamps 等长，无读数为 null）"""
+    server_id: int
+    timestamps: List[datetime.datetime]
+    sensors: List[SensorSeries]
+
+class AggregateSeries(BaseModel):
+    """单台服务器的分桶聚合序列（列式存储，各列表等长）"""
+    server_id: int
+    timestamps: List[datetime.datetime]
+    min: List[float]
+    max: List[float]
+    avg: List[float]
+    count: List[int]
+    p95: List[float]
+
+class AggregateHistory(BaseModel):
+    metric: str
+    bucket_seconds: int
+    series: List[AggregateSeries]
+
+# ====================
+# 机群汇总
+# ====================
+
+class FleetServerReading(BaseModel):
+    server_id: int
+    name: str
+    model: str
+    temperature: Optional[float] = None
+    average_speed_rpm: Optional[int] = None
+    updated_at: Optional[datetime.datetime] = None
+
+class FleetPercentiles(BaseModel):
+    count: int
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+
+class FleetFanLoadBin(BaseModel):
+    min_rpm: int
+    max_rpm: int
+    servers: int
+
+class FleetModelAverage(BaseModel):
+    model: str
+    servers: int
+    avg_temperature: Optional[float] = None
+    avg_fan_speed_rpm: Optional[int] = None
+
+class FleetSummary(BaseModel):
+    servers: int
+    hottest: List[FleetServerReading]
+    temperature: FleetPercentiles
+    fan_speed_rpm: FleetPercentiles
+    fan_load_distribution: List[FleetFanLoadBin]
+    models: List[FleetModelAverage]
+    circuits: Dict[str, int]
+
+class FailSafeEvent(BaseModel):
+    id: int
+    action: str
+    failures: int
+    entered_at: datetime.datetime
+    exited_at: Optional[datetime.datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class FailSafeStatus(BaseModel):
+    server_id: int
+    active: bool
+    consecutive_failures: int
+    entries: int
+    total_seconds: float
+    events: List[FailSafeEvent]
+
+class PollingConfig(BaseModel):
+    adaptive: bool = False
+    min_interval: float = 2
+    max_interval: float = 60
+
+class PollingStatus(PollingConfig):
+    server_id: int
+    current_interval: Optional[float] = None
+    temperature_rate: Optional[float] = None
+
+class HistogramSnapshot(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    max: float
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    buckets: Dict[str, int]
+
+class JobTickStats(BaseModel):
+    job: str
+    interval: float
+    runs: int
+    late_runs: int
+    skipped_ticks: int
+    last_lateness: float
+    last_duration: float
+    lateness: HistogramSnapshot
+    duration: HistogramSnapshot
+
+class PipelineStageStats(BaseModel):
+    stage: str
+    every: int
+    runs: int
+
+class ServerTickStats(BaseModel):
+    server_id: int
+    sampling: Optional[JobTickStats] = None
+    stages: List[PipelineStageStats] = []
+
+class SchedulerLateJob(BaseModel):
+    job: str
+    lateness: float
+    queued: bool
+
+class SchedulerStatus(BaseModel):
+    jobs: int
+    workers: int
+    queued: int
+    running: int
+    late_runs: int
+    skipped_ticks: int
+    loop_lag: HistogramSnapshot
+    late: List[SchedulerLateJob]
+
+class IpmiLimiterStatus(BaseModel):
+    limit: int
+    in_flight: int
+    queued: Dict[str, int]
+
+class IpmiCircuitStatus(BaseModel):
+    state: str
+    consecutive_failures: int
+    rejected: int
+    retry_in: Optional[float]
+
+class IpmiQueueStatus(BaseModel):
+    host: str
+    limit: int
+    in_flight: int
+    queued: Dict[str, int]
+    latency: Optional[float]
+    error_rate: float
+    outcomes: Dict[str, int]
+    circuit: IpmiCircuitStatus
+
+class IpmiStatus(BaseModel):
+    global_: IpmiLimiterStatus = Field(..., alias="global")
+    outcomes: Dict[str, int]
+    queue_wait: Dict[str, HistogramSnapshot]
+    bmcs: List[IpmiQueueStatus]
+
+class CollectorMemberStatus(BaseModel):
+    member_id: str
+    hostname: str
+    pid: int
+    started_at: datetime.datetime
+    heartbeat_at: datetime.datetime
+    alive: bool
+    servers: int  # 当前持有的服务器租约数量
@@ -0,0 +1,236 @@
+import datetime
+import heapq
+import math
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+from .. import models
+
+# 直方图范围与分辨率（分位数误差不超过半个分辨率）
+TEMPERATURE_RANGE = (0.0, 130.0, 0.5)
+FAN_SPEED_RANGE = (0.0, 30000.0, 50.0)
+
+# 风扇负载分布的分箱宽度 (RPM)
+FAN_LOAD_BIN_RPM = 1000
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class _FenwickHistogram:
+    """
+    固定分辨率直方图（Fenwick 树实现）。
+    增删一个样本与查询分位数均为 O(log n)，n 为桶数量。
+    """
+
+    def __init__(self, low: float, high: float, resolution: float):
+        self.low = low
+        self.resolution = resolution
+        self.size = int(math.ceil((high - low) / resolution)) + 1
+        self.total = 0
+        self._tree = [0] * (self.size + 1)
+
+    def _index(self, value: float) -> int:
+        index = int((value - self.low) // self.resolution)
+        return min(max(index, 0), self.size - 1)
+
+    def add(self, value: float, delta: int = 1):
+        self.total += delta
+        i = self._index(value) + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def count_below(self, value: float) -> int:
+        """value 所在桶之前（不含）的样本数"""
+        i = self._index(value)
+        count = 0
+        while i > 0:
+            count += self._tree[i]
+            i -= i & -i
+        return count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """最近秩法分位数，返回所在桶的中点"""
+        if self.total <= 0:
+            return None
+        remaining = max(1, math.ceil(q * self.total))
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self._tree[nxt] < remaining:
+                pos = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return self.low + (pos + 0.5) * self.resolution
+
+
+class _TopN:
+    """
+    延迟删除的最大堆，记录每个键的当前值。
+    更新为 O(log n)；查询时丢弃过期条目，堆中过期条目过多时整体重建。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._current: Dict[int, float] = {}
+
+    def update(self, key: int, value: float):
+        self._current[key] = value
+        heapq.heappush(self._heap, (-value, key))
+        self._maybe_compact()
+
+    def remove(self, key: int):
+        self._current.pop(key, None)
+        self._maybe_compact()
+
+    def top(self, n: int) -> list:
+        result, kept, seen = [], [], set()
+        while self._heap and len(result) < n:
+            item = heapq.heappop(self._heap)
+            neg_value, key = item
+            if key in seen or self._current.get(key) != -neg_value:
+                continue  # 过期或重复条目，直接丢弃
+            seen.add(key)
+            kept.append(item)
+            result.append((key, -neg_value))
+        for item in kept:
+            heapq.heappush(self._heap, item)
+        return result
+
+    def _maybe_compact(self):
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._heap = [(-value, key) for key, value in self._current.items()]
+            heapq.heapify(self._heap)
+
+
+class FleetStats:
+    """
+    全机群增量聚合：每台服务器的最新读数、最热 N 台、温度/转速分位数和按型号的平均值。
+    由指标记录循环在每次采样后调用 record()，每次更新为 O(log n)，查询不访问数据库。
+    采集进程通过 drain_changes() 取出变化的读数写入数据库，其他进程用 load() 从数据库同步。
+    """
+
+    def __init__(self):
+        self._latest: Dict[int, dict] = {}
+        self._hottest = _TopN()
+        self._temperatures = _FenwickHistogram(*TEMPERATURE_RANGE)
+        self._fan_speeds = _FenwickHistogram(*FAN_SPEED_RANGE)
+        # model -> [服务器数, 温度和, 温度样本数, 转速和, 转速样本数]
+        self._model_sums: Dict[str, list] = {}
+        self._changed = set()  # 自上次 drain_changes() 以来有变化的服务器
+
+    def record(self, server: models.Server, temperature: Optional[float] = None, fan_speed: Optional[int] = None,
+               updated_at: Optional[datetime.datetime] = None):
+        """记录一次采样。读数为 None 时保留该项的上一次有效值"""
+        entry = self._latest.get(server.id)
+        if entry is None:
+            entry = self._latest[server.id] = {
+                "server_id": server.id, "name": server.name, "model": server.model.lower(),
+                "temperature": None, "average_speed_rpm": None, "updated_at": None,
+            }
+        else:
+            self._contribute(entry, -1)
+
+        entry["name"] = server.name
+        entry["model"] = server.model.lower()
+        if temperature is not None:
+            entry["temperature"] = temperature
+            self._hottest.update(server.id, temperature)
+        if fan_speed is not None:
+            entry["average_speed_rpm"] = fan_speed
+        entry["updated_at"] = updated_at or models.get_local_time()
+        self._contribute(entry, 1)
+        self._changed.add(server.id)
+
+    def remove(self, server_id: int):
+        """服务器被删除时移除其全部统计"""
+        entry = self._latest.pop(server_id, None)
+        if entry is None:
+            return
+        self._contribute(entry, -1)
+        self._hottest.remove(server_id)
+        self._changed.discard(server_id)
+
+    def get(self, server_id: int) -> Optional[dict]:
+        """某台服务器的最新读数（读数为 None 的项保留上一次有效值）"""
+        return self._latest.get(server_id)
+
+    def drain_changes(self) -> list:
+        """取出自上次调用以来有变化的读数"""
+        changed = [dict(self._latest[server_id]) for server_id in self._changed if server_id in self._latest]
+        self._changed.clear()
+        return changed
+
+    def load(self, rows):
+        """
+        用另一进程发布的读数同步统计：rows 为 (server_id, name, model, temperature, average_speed_rpm, updated_at)，
+        不在 rows 中的服务器被移除。
+        """
+        seen = set()
+        for server_id, name, model, temperature, fan_speed, updated_at in rows:
+            seen.add(server_id)
+            entry = self._latest.get(server_id)
+            if entry is not None and entry["updated_at"] == updated_at and entry["name"] == name:
+                continue
+            self.record(SimpleNamespace(id=server_id, name=name, model=model), temperature, fan_speed, updated_at)
+        for server_id in [server_id for server_id in self._latest if server_id not in seen]:
+            self.remove(server_id)
+        self._changed.clear()
+
+    def _contribute(self, entry: dict, sign: int):
+        """将该服务器当前读数计入 (sign=1) 或移出 (sign=-1) 直方图和型号统计"""
+        sums = self._model_sums.setdefault(entry["model"], [0, 0.0, 0, 0, 0])
+        sums[0] += sign
+        if entry["temperature"] is not None:
+            self._temperatures.add(entry["temperature"], sign)
+            sums[1] += sign * entry["temperature"]
+            sums[2] += sign
+        if entry["average_speed_rpm"] is not None:
+            self._fan_speeds.add(entry["average_speed_rpm"], sign)
+            sums[3] += sign * entry["average_speed_rpm"]
+            sums[4] += sign
+        if sums[0] == 0:
+            del self._model_sums[entry["model"]]
+
+    def _fan_load_distribution(self) -> list:
+        """按 FAN_LOAD_BIN_RPM 分箱统计各转速区间的服务器数量（省略空箱）"""
+        total = self._fan_speeds.total
+        distribution, counted, low = [], 0, 0
+        while counted < total:
+            high = low + FAN_LOAD_BIN_RPM
+            upto = self._fan_speeds.count_below(high) if high < FAN_SPEED_RANGE[1] else total
+            if upto > counted:
+                distribution.append({"min_rpm": low, "max_rpm": high, "servers": upto - counted})
+            counted, low = upto, high
+        return distribution
+
+    @staticmethod
+    def _percentiles(histogram: _FenwickHistogram) -> dict:
+        result = {"count": histogram.total}
+        for q in PERCENTILES:
+            result[f"p{round(q * 100)}"] = histogram.quantile(q)
+        return result
+
+    def summary(self, top_n: int = 5) -> dict:
+        models_summary = [
+            {
+                "model": model,
+                "servers": servers,
+                "avg_temperature": round(temp_sum / temp_count, 2) if temp_count else None,
+                "avg_fan_speed_rpm": int(rpm_sum / rpm_count) if rpm_count else None,
+            }
+            for model, (servers, temp_sum, temp_count, rpm_sum, rpm_count) in sorted(self._model_sums.items())
+        ]
+        return {
+            "servers": len(self._latest),
+            "hottest": [dict(self._latest[server_id]) for server_id, _ in self._hottest.top(top_n)],
+            "temperature": self._percentiles(self._temperatures),
+            "fan_speed_rpm": self._percentiles(self._fan_speeds),
+            "fan_load_distribution": self._fan_load_distribution(),
+            "models": models_summary,
+        }
+
+
+# 进程内唯一的机群统计实例
+FLEET = FleetStats()
@@ -0,0 +1,255 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from ..histogram import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """
+    由 PeriodicScheduler 管理的周期任务。
+    func 为无参协程函数；返回数值时表示下一次执行的延迟（秒），返回 None 时按 interval 周期执行。
+    """
+
+    def __init__(self, key: Hashable, func: Callable[[], Awaitable], interval: float, error_delay: Optional[float] = None):
+        self.key = key
+        self.func = func
+        self.interval = interval
+        self.error_delay = error_delay if error_delay is not None else interval
+        self.deadline = 0.0         # 下一次执行的单调时钟截止时间
+        self.cancelled = False
+        self.queued = False         # 已到期，正在等待空闲的工作协程
+        self.task: Optional[asyncio.Task] = None  # 正在执行的任务
+        self.runs = 0
+        self.late_runs = 0
+        self.skipped_ticks = 0      # 因上一次执行超时而跳过的周期数
+        self.last_lateness = 0.0
+        self.last_duration = 0.0
+        self.lateness = Histogram()  # 实际开始时间相对截止时间的延迟
+        self.duration = Histogram()  # 每次执行耗时
+
+    @property
+    def name(self) -> str:
+        if isinstance(self.key, tuple):
+            return ":".join(str(part) for part in self.key)
+        return str(self.key)
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None
+
+    def stats(self) -> dict:
+        return {
+            "job": self.name,
+            "interval": self.interval,
+            "runs": self.runs,
+            "late_runs": self.late_runs,
+            "skipped_ticks": self.skipped_ticks,
+            "last_lateness": round(self.last_lateness, 6),
+            "last_duration": round(self.last_duration, 6),
+            "lateness": self.lateness.snapshot(),
+            "duration": self.duration.snapshot(),
+        }
+
+
+class PeriodicScheduler:
+    """
+    集中式周期任务调度器。
+    所有任务的截止时间保存在一个最小堆中，由单个调度协程在最近的截止时间唤醒，
+    到期任务交给固定数量的工作协程执行。任务数量增加不会产生额外的常驻协程。
+    """
+
+    def __init__(self, workers: int = 64, late_tolerance: float = 1.0):
+        self.workers = workers
+        self.late_tolerance = late_tolerance  # 开始执行晚于截止时间超过此值即视为迟到（秒）
+        self._jobs: Dict[Hashable, PeriodicJob] = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._ready: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self.loop_lag = Histogram()  # 调度协程实际唤醒时间相对最早截止时间的延迟
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        """在当前事件循环中启动调度协程和工作协程"""
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._dispatch())]
+        self._tasks += [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def stop(self):
+        """取消所有任务和调度协程（不等待）"""
+        for job in self._jobs.values():
+            job.cancelled = True
+            if job.task is not None:
+                job.task.cancel()
+        self._jobs.clear()
+        self._heap.clear()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def shutdown(self, grace: float = 0.0, timeout: float = 5.0):
+        """
+        停止调度并等待退出：不再开始新的执行，正在执行的任务最多再运行 grace 秒后被取消，
+        再最多等待 timeout 秒让被取消的任务完成清理。
+        """
+        running = {job.task for job in self._jobs.values() if job.task is not None}
+        for job in self._jobs.values():
+            job.cancelled = True
+        self._jobs.clear()
+        self._heap.clear()
+        if running and grace > 0:
+            await asyncio.wait(running, timeout=grace)
+        for task in running:
+            task.cancel()
+        for task in self._tasks:
+            task.cancel()
+        pending = running | set(self._tasks)
+        self._tasks = []
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+
+    def add(self, key: Hashable, func: Callable[[], Awaitable], interval: float,
+            error_delay: Optional[float] = None, delay: Optional[float] = None) -> PeriodicJob:
+        """
+        注册周期任务。同名任务会被替换。
+        :param delay: 首次执行前的延迟；默认在 [0, interval) 内随机，分散各 BMC 的负载。
+        """
+        self.remove(key)
+        job = PeriodicJob(key, func, interval, error_delay)
+        if delay is None:
+            delay = random.uniform(0, interval)
+        job.deadline = time.monotonic() + delay
+        self._jobs[key] = job
+        self._push(job)
+        return job
+
+    def get(self, key: Hashable) -> Optional[PeriodicJob]:
+        return self._jobs.get(key)
+
+    def remove(self, key: Hashable) -> Optional[PeriodicJob]:
+        """注销任务，不再调度；正在执行的本次运行不受影响"""
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            job.cancelled = True
+        return job
+
+    async def cancel(self, key: Hashable) -> Optional[PeriodicJob]:
+        """注销任务，并取消、等待正在执行的本次运行"""
+        job = self.remove(key)
+        task = job.task if job is not None else None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            await asyncio.wait({task})
+        return job
+
+    def _push(self, job: PeriodicJob):
+        heapq.heappush(self._heap, (job.deadline, next(self._seq), job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _reschedule(self, job: PeriodicJob, delay: Optional[float]):
+        now = time.monotonic()
+        if delay is not None:
+            job.deadline = now + delay
+        else:
+            # 基于上一次截止时间推进，执行耗时不会累积为周期漂移
+            job.deadline += job.interval
+            if job.deadline < now:
+                # 本次执行超出周期：跳过已错过的周期，保持原有的时间网格
+                skipped = math.ceil((now - job.deadline) / job.interval)
+                job.skipped_ticks += skipped
+                job.deadline += skipped * job.interval
+                logger.warning(f"Scheduled job {job.name} overran its period, skipped {skipped} tick(s).")
+        self._push(job)
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            if self._heap and self._heap[0][0] <= now:
+                self.loop_lag.observe(now - self._heap[0][0])
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, job = heapq.heappop(self._heap)
+                # 已注销或已重新调度的过期条目直接丢弃
+                if job.cancelled or job.queued or job.deadline != deadline:
+                    continue
+                job.queued = True
+                self._ready.put_nowait(job)
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            job = await self._ready.get()
+            job.queued = False
+            if job.cancelled:
+                continue
+            job.last_lateness = time.monotonic() - job.deadline
+            if job.last_lateness > self.late_tolerance:
+                job.late_runs += 1
+            job.runs += 1
+            job.lateness.observe(max(job.last_lateness, 0.0))
+            started = time.monotonic()
+            delay = await self._run(job)
+            job.last_duration = time.monotonic() - started
+            job.duration.observe(job.last_duration)
+            if not job.cancelled:
+                self._reschedule(job, delay)
+
+    async def _run(self, job: PeriodicJob) -> Optional[float]:
+        task = asyncio.ensure_future(job.func())
+        job.task = task
+        try:
+            # asyncio.wait 不会在工作协程被取消时吞掉 CancelledError
+            await asyncio.wait({task})
+        finally:
+            job.task = None
+            if not task.done():
+                task.cancel()
+
+        if task.cancelled():
+            return None
+        exc = task.exception()
+        if exc is not None:
+            logger.error(f"Error in scheduled job {job.name}: {exc}", exc_info=exc)
+            return job.error_delay
+        return task.result()
+
+    def snapshot(self, limit: int = 50) -> dict:
+        """调度器状态：任务总数、排队/执行中数量，以及当前迟到最多的任务"""
+        now = time.monotonic()
+        late = [
+            {"job": job.name, "lateness": round(now - job.deadline, 3), "queued": job.queued}
+            for job in self._jobs.values()
+            if not job.running and now - job.deadline > self.late_tolerance
+        ]
+        late.sort(key=lambda item: item["lateness"], reverse=True)
+        return {
+            "jobs": len(self._jobs),
+            "workers": self.workers,
+            "queued": self._ready.qsize() if self._ready is not None else 0,
+            "running": sum(1 for job in self._jobs.values() if job.running),
+            "late_runs": sum(job.late_runs for job in self._jobs.values()),
+            "skipped_ticks": sum(job.skipped_ticks for job in self._jobs.values()),
+            "loop_lag": self.loop_lag.snapshot(),
+            "late": late[:limit],
+        }
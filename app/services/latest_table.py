@@ -0,0 +1,143 @@
+"""
+进程间共享的最新读数表：数据目录下的内存映射文件，按服务器 ID 定长分槽。
+采集进程每次采样后原地写入对应的槽；API 进程以只读方式映射同一文件，
+通过 memoryview 直接解析槽内容，读取时不访问数据库、不复制整张表。
+"""
+import datetime
+import math
+import mmap
+import os
+import struct
+from typing import Iterator, Optional, Tuple
+
+import pytz
+
+from ..database import data_dir
+
+LATEST_TABLE_PATH = os.path.join(data_dir, "latest.bin")
+LATEST_TABLE_CAPACITY = 65536  # 可容纳的最大服务器 ID（不含）；文件为稀疏文件，未使用的槽不占磁盘
+
+MAGIC = b"FANLTST1"
+# 文件头：魔数、槽数、槽大小
+_HEADER = struct.Struct("<8sII")
+HEADER_SIZE = 64
+# 槽：序号（奇数表示正在写入）、平均风扇转速（-1 为无效）、温度（NaN 为无效）、读数时间（Unix 时间戳，0 为空槽）
+_SLOT = struct.Struct("<Iidd8x")
+# 读取一个槽时遇到写入中数据的最大重试次数；超过后视为无读数（写入方可能在写入中途退出）
+READ_RETRIES = 100
+# 读数时间按与 models.get_local_time() 相同的时区还原
+_LOCAL_TZ = pytz.timezone('Asia/Shanghai')
+
+
+class LatestTable:
+    """
+    定长的最新读数表。每个槽用序号实现单写多读的顺序锁：写入前后各将序号加一，
+    读取时序号为奇数或前后不一致说明读到了写入中的数据，重读即可。
+    写入方在写入中途退出时序号停留在奇数，下一次写入从该奇数继续，序号恢复为偶数。
+    """
+
+    def __init__(self, path: str = LATEST_TABLE_PATH, capacity: int = LATEST_TABLE_CAPACITY, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        size = HEADER_SIZE + capacity * _SLOT.size
+        if writable and not self._valid(path, size):
+            # 格式或容量不符时在临时文件中重建后替换（内容由下一轮采样恢复），
+            # 已映射旧文件的读取方不会因文件被截断而出错，重新打开后即读到新表
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(MAGIC, capacity, _SLOT.size))
+                f.truncate(size)
+            os.replace(tmp_path, path)
+        with open(path, "r+b" if writable else "rb") as f:
+            self._ino = os.fstat(f.fileno()).st_ino
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, self.capacity, slot_size = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or slot_size != _SLOT.size or len(self._map) < HEADER_SIZE + self.capacity * _SLOT.size:
+            self._map.close()
+            raise ValueError(f"{path} is not a latest-reading table")
+        self._view = memoryview(self._map)
+
+    @staticmethod
+    def _valid(path: str, size: int) -> bool:
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                return os.fstat(f.fileno()).st_size == size and header[:len(MAGIC)] == MAGIC
+        except FileNotFoundError:
+            return False
+
+    @property
+    def replaced(self) -> bool:
+        """文件是否已被采集进程重建（读取方需重新打开）"""
+        try:
+            return os.stat(self.path).st_ino != self._ino
+        except FileNotFoundError:
+            return True
+
+    @classmethod
+    def open_reader(cls, path: str = LATEST_TABLE_PATH) -> Optional["LatestTable"]:
+        """以只读方式打开；采集进程尚未创建该文件时返回 None"""
+        try:
+            return cls(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def _offset(self, server_id: int) -> int:
+        if not 0 <= server_id < self.capacity:
+            raise IndexError(f"server id {server_id} exceeds latest table capacity {self.capacity}")
+        return HEADER_SIZE + server_id * _SLOT.size
+
+    def _write_slot(self, offset: int, fan_speed: int, temperature: float, timestamp: float):
+        # 写入中的序号总是奇数：上一次写入中途退出时序号已是奇数，直接沿用，保证写完后为偶数
+        seq = _SLOT.unpack_from(self._view, offset)[0] | 1
+        struct.pack_into("<I", self._view, offset, seq)  # 先标记为写入中，再写入内容
+        _SLOT.pack_into(self._view, offset, seq, fan_speed, temperature, timestamp)
+        struct.pack_into("<I", self._view, offset, (seq + 1) & 0xFFFFFFFF)
+
+    def write(self, server_id: int, temperature: Optional[float], fan_speed: Optional[int],
+              updated_at: datetime.datetime):
+        self._write_slot(
+            self._offset(server_id),
+            fan_speed if fan_speed is not None else -1,
+            temperature if temperature is not None else math.nan,
+            updated_at.timestamp(),
+        )
+
+    def clear(self, server_id: int):
+        """服务器被删除时清空其槽"""
+        self._write_slot(self._offset(server_id), -1, math.nan, 0.0)
+
+    def _read_slot(self, offset: int) -> Optional[tuple]:
+        """读取一致的槽内容；重试 READ_RETRIES 次仍读到写入中的数据时返回 None"""
+        for _ in range(READ_RETRIES):
+            slot = _SLOT.unpack_from(self._view, offset)
+            if not slot[0] & 1 and _SLOT.unpack_from(self._view, offset)[0] == slot[0]:
+                return slot
+        return None
+
+    def read(self, server_id: int) -> Optional[Tuple[Optional[float], Optional[int], datetime.datetime]]:
+        """读取一台服务器的 (温度, 平均风扇转速, 读数时间)；没有读数时返回 None"""
+        if not 0 <= server_id < self.capacity:
+            return None
+        slot = self._read_slot(self._offset(server_id))
+        if slot is None:
+            return None
+        _, fan_speed, temperature, timestamp = slot
+        if not timestamp:
+            return None
+        return (
+            None if math.isnan(temperature) else temperature,
+            None if fan_speed < 0 else fan_speed,
+            datetime.datetime.fromtimestamp(timestamp, _LOCAL_TZ),
+        )
+
+    def items(self, server_ids) -> Iterator[tuple]:
+        """按给定的服务器 ID 依次产出 (server_id, 温度, 平均风扇转速, 读数时间)，跳过没有读数的服务器"""
+        for server_id in server_ids:
+            reading = self.read(server_id)
+            if reading is not None:
+                yield (server_id, *reading)
+
+    def close(self):
+        self._view.release()
+        self._map.close()
@@ -0,0 +1,179 @@
+"""
+多进程部署（如 uvicorn --workers N）时选出唯一的采集进程。
+持有数据目录下文件锁的进程负责全部 BMC 的采样和风扇控制，并将最新读数写入共享内存表和 latest_readings 表；
+其余进程只提供 API，定期从共享内存表（不可用时从数据库）同步机群汇总，并在采集进程退出后接替它。
+COLLECTOR_MODE=external/sharded 时采集由独立进程 (python -m app.collector) 负责，API 进程从不接替。
+"""
+import asyncio
+import fcntl
+import logging
+import os
+from typing import Optional
+
+from .. import crud
+from ..database import AsyncSessionLocal, data_dir
+from . import per_server_scheduler
+from .fleet_stats import FLEET
+from .latest_table import LatestTable
+
+logger = logging.getLogger(__name__)
+
+COLLECTOR_LOCK_PATH = os.path.join(data_dir, "collector.lock")
+ELECTION_INTERVAL = 5  # 非采集进程尝试接替采集、刷新服务器列表的间隔（秒）
+SYNC_INTERVAL = 1      # 非采集进程从共享内存表同步最新读数的间隔（秒）
+# embedded: API 进程之一兼任采集；external: 本机的独立采集进程；sharded: 多个分片采集进程（见 sharding.py）
+COLLECTOR_MODE = os.environ.get("COLLECTOR_MODE", "embedded")
+
+
+class CollectorLock:
+    """
+    基于 flock 的进程间互斥锁。持有者退出（包括崩溃）时由内核自动释放，不会残留。
+    """
+
+    def __init__(self, path: str = COLLECTOR_LOCK_PATH):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """非阻塞地尝试获取锁，成功后在锁文件中写入本进程 pid（仅用于排查）"""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def held_elsewhere(self) -> bool:
+        """是否有其他进程持有该锁（即本机有存活的采集进程）"""
+        if self._fd is not None:
+            return False
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        finally:
+            os.close(fd)  # 关闭即释放刚获得的共享锁
+        return False
+
+    def release(self):
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+class CollectorRole:
+    """本进程在多进程部署中的角色：collector（采集进程）或 api（仅提供 API）"""
+
+    def __init__(self, lock: Optional[CollectorLock] = None):
+        self.lock = lock or CollectorLock()
+        self.synced = False  # api 进程是否已完成至少一次同步
+        self.source: Optional[str] = None  # 最近一次同步的数据来源：shared_memory 或 database
+        self._table: Optional[LatestTable] = None
+        self._labels = []  # (server_id, 名称, 型号)，每 ELECTION_INTERVAL 秒从数据库刷新
+        self._follow_task: Optional[asyncio.Task] = None
+
+    @property
+    def name(self) -> str:
+        return "collector" if self.lock.held else "api"
+
+    @property
+    def may_collect(self) -> bool:
+        return COLLECTOR_MODE == "embedded"
+
+    async def start(self):
+        if self.may_collect and self.lock.try_acquire():
+            logger.info(f"Process {os.getpid()} acquired the collector lock, starting sampling.")
+            await per_server_scheduler.start_all_loops()
+            return
+        logger.info(f"Process {os.getpid()} is serving API only, another process is the collector.")
+        await self._sync()
+        self._follow_task = asyncio.create_task(self._follow())
+
+    async def _sync(self, refresh: bool = True):
+        """
+        同步机群汇总：本机有存活的采集进程时直接读取共享内存表（服务器名称和型号每次 refresh 时从数据库刷新），
+        否则（分片部署、采集进程未启动或已退出）从 latest_readings 表读取。
+        """
+        if self._table is not None and (self._table.replaced or not self.lock.held_elsewhere()):
+            self._close_table()
+        if self._table is None and self.lock.held_elsewhere():
+            self._table = LatestTable.open_reader()
+        if self._table is None:
+            if refresh:
+                async with AsyncSessionLocal() as db:
+                    FLEET.load(await crud.get_latest_readings(db))
+                self.source = "database"
+                self.synced = True
+            return
+        if refresh or self.source != "shared_memory":
+            async with AsyncSessionLocal() as db:
+                self._labels = await crud.get_server_labels(db)
+        FLEET.load(
+            (server_id, name, model, *reading)
+            for server_id, name, model in self._labels
+            if (reading := self._table.read(server_id)) is not None
+        )
+        self.source = "shared_memory"
+        self.synced = True
+
+    async def _follow(self):
+        """定期同步读数；采集进程退出后获取锁并接替采集"""
+        ticks_per_election = max(int(ELECTION_INTERVAL / SYNC_INTERVAL), 1)
+        tick = 0
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            tick += 1
+            refresh = tick % ticks_per_election == 0
+            try:
+                if refresh and self.may_collect and self.lock.try_acquire():
+                    logger.info(f"Process {os.getpid()} took over as collector.")
+                    self._close_table()
+                    await per_server_scheduler.start_all_loops()
+                    return
+                await self._sync(refresh)
+            except Exception as e:
+                logger.error(f"Error following the collector process: {e}", exc_info=True)
+
+    def _close_table(self):
+        if self._table is not None:
+            self._table.close()
+            self._table = None
+
+    async def stop(self) -> dict:
+        """停止同步或采集；采集进程在交还风扇控制权后释放锁"""
+        if self._follow_task is not None:
+            self._follow_task.cancel()
+            await asyncio.wait({self._follow_task})
+            self._follow_task = None
+        self._close_table()
+        if not self.lock.held:
+            return {"restored": 0, "failed": []}
+        try:
+            return await per_server_scheduler.stop_all_loops()
+        finally:
+            self.lock.release()
+
+    def readiness(self) -> dict:
+        """采集进程按预热进度判断就绪；api 进程完成首次同步后即就绪"""
+        if self.lock.held:
+            return {**per_server_scheduler.get_readiness(), "role": self.name}
+        return {"ready": self.synced, "role": self.name, "source": self.source}
+
+
+ROLE = CollectorRole()
@@ -0,0 +1,65 @@
+"""
+添加服务器时的型号自动识别。
+每个 BMC 只探测一次（mc info + fru），探测结果按 BMC 地址缓存在 bmc_identities 表中；
+缓存的是厂商/产品 ID 和产品名称而不是型号，新增型号配置后无需重新探测即可识别。
+批量添加时并发探测，同时进行的探测数不超过 PROBE_CONCURRENCY。
+"""
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from .. import crud, models
+from ..controllers.detect import DeviceIdentity, match_models, probe_identity
+
+logger = logging.getLogger(__name__)
+
+PROBE_CONCURRENCY = 16  # 批量识别时同时探测的 BMC 数
+
+
+async def detect_models(db, servers: list, refresh: bool = False) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    识别每台服务器的型号。
+    :param servers: 提供 name 和 IPMI 连接信息的对象（如 schemas.ServerCreate）
+    :param refresh: 忽略缓存，重新探测
+    :return: 与 servers 一一对应的 (型号, 错误信息)，识别成功时错误信息为 None，失败时型号为 None
+    """
+    hosts = list(dict.fromkeys(server.ipmi_host for server in servers))
+    identities = {}
+    if not refresh:
+        for host, row in (await crud.get_bmc_identities(db, hosts)).items():
+            identities[host] = DeviceIdentity(row.manufacturer_id, row.product_id, row.product_name)
+
+    # 同一 BMC 只探测一次，使用第一台服务器的凭据
+    pending = {}
+    for server in servers:
+        if server.ipmi_host not in identities:
+            pending.setdefault(server.ipmi_host, server)
+    if pending:
+        semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+        async def probe(server):
+            async with semaphore:
+                return await probe_identity(server)
+
+        probed = await asyncio.gather(*(probe(server) for server in pending.values()))
+        fresh = {host: identity for host, identity in zip(pending, probed) if identity is not None}
+        if fresh:
+            await crud.save_bmc_identities(db, fresh, models.get_local_time().replace(tzinfo=None))
+        identities.update(fresh)
+        logger.info(f"Probed {len(pending)} BMC(s) for model detection, {len(fresh)} answered.")
+
+    results = []
+    for server in servers:
+        identity = identities.get(server.ipmi_host)
+        if identity is None:
+            results.append((None, f"BMC {server.ipmi_host} did not answer the device probe"))
+            continue
+        matched = match_models(identity)
+        if len(matched) == 1:
+            results.append((matched[0], None))
+        elif not matched:
+            results.append((None, f"No supported model matches manufacturer ID {identity.manufacturer_id}, "
+                                  f"product ID {identity.product_id}, product name '{identity.product_name}'"))
+        else:
+            results.append((None, f"Ambiguous model: {', '.join(matched)} all match '{identity.product_name}'"))
+    return results
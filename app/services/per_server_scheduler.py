@@ -1,16 +1,72 @@
 import asyncio
 import logging
-from typing import Dict
+import os
+import time
+from typing import Callable, Dict, Optional
 from ..database import AsyncSessionLocal
 from .. import crud, models
-from ..controllers.factory import get_controller
+from ..controllers.factory import get_controller, remove_controller
+from ..controllers.ipmi import PRIORITY_CONTROL, ipmi_deadline, ipmi_priority
+from .fleet_stats import FLEET
+from .job_scheduler import PeriodicScheduler
+from .latest_table import LatestTable
+from . import sensor_history
+from .sampling import AdaptivePolling, PipelineStage, SamplingPipeline, SensorSnapshot
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# {server_id: asyncio.Task}
-SERVER_CONTROL_TASKS: Dict[int, asyncio.Task] = {}
-SERVER_METRIC_TASKS: Dict[int, asyncio.Task] = {}
+SAMPLE_INTERVAL = 10         # 固定模式下的采样间隔（秒），即风扇控制间隔
+CONTROL_NO_CURVE_DELAY = 30  # 没有曲线定义时的重试间隔
+CONTROL_ERROR_DELAY = 30     # 控制出现异常后的重试间隔
+HISTORY_PERIOD = 30          # 历史数据记录间隔（固定模式下即每 3 次采样）
+HISTORY_ERROR_DELAY = 60     # 记录历史数据出现异常后的重试间隔
+SENSOR_HISTORY_PERIOD = 60   # 逐传感器读数的记录间隔（秒）
+SENSOR_HISTORY_ERROR_DELAY = 120
+FLEET_EVERY = 1              # 每次采样都更新机群汇总
+SCHEDULER_WORKERS = 64       # 同时执行的采样任务上限
+WARMUP_WINDOW = 30           # 启动时各服务器首次采样分散在此时间窗口内（秒）
+WARMUP_STAGGER = 0.5         # 服务器较少时，相邻两台首次采样的最大间隔（秒）
+SHUTDOWN_DEADLINE = 15       # 关闭流程的总时间上限（秒）
+SHUTDOWN_GRACE = 5           # 关闭时等待进行中的采样（含历史数据写入）完成的最长时间（秒）
+RECONCILE_INTERVAL = 15      # 与数据库同步服务器列表和采样配置的间隔（秒），用于发现其他进程的修改
+PUBLISH_INTERVAL = 5         # 将最新读数批量写入 latest_readings 表的间隔（秒）
+
+# 故障安全：自动模式下连续读取温度失败达到次数后，将风扇设为安全转速 (safe_speed)
+# 或交还 BMC 控制 (return_to_bmc)；期间缩短采样间隔，读数恢复后自动退出
+FAIL_SAFE_READ_FAILURES = int(os.environ.get("MAX_TEMP_READ_FAILURES", "5"))
+FAIL_SAFE_FAN_SPEED = int(os.environ.get("DEFAULT_FAIL_SAFE_FAN_SPEED", "75"))
+FAIL_SAFE_ACTIONS = ("safe_speed", "return_to_bmc")
+FAIL_SAFE_ACTION = os.environ.get("FAIL_SAFE_ACTION", "safe_speed")
+if FAIL_SAFE_ACTION not in FAIL_SAFE_ACTIONS:
+    raise ValueError(f"FAIL_SAFE_ACTION must be one of {FAIL_SAFE_ACTIONS}, got '{FAIL_SAFE_ACTION}'")
+FAIL_SAFE_RECHECK_INTERVAL = 3  # 故障安全模式下的采样间隔（秒）
+
+# 所有服务器的控制和指标任务都由同一个调度器驱动
+SCHEDULER = PeriodicScheduler(workers=SCHEDULER_WORKERS)
+
+# {server_id: 接管时的服务器实例}，记录已接管风扇控制权的服务器
+_FAN_CONTROL_TAKEN: Dict[int, models.Server] = {}
+
+
+# {server_id: SamplingPipeline}
+SERVER_PIPELINES: Dict[int, SamplingPipeline] = {}
+
+# 共享内存中的最新读数表，由采集进程在启动时打开，供其他进程直接读取
+LATEST_TABLE: Optional[LatestTable] = None
+
+# {server_id: (adaptive, min_interval, max_interval)}，管道当前使用的采样配置，用于发现数据库中的修改
+_POLLING_KEYS: Dict[int, Optional[tuple]] = {}
+
+# 启动进度：loaded 表示服务器列表已加载并全部注册到调度器
+_STARTUP = {"started_at": None, "loaded": False}
+
+# 分片部署时判断服务器是否由本进程负责；为 None 时负责所有服务器
+_OWNS: Optional[Callable[[int], bool]] = None
+
+
+def _sample_key(server_id: int):
+    return ("sample", server_id)
 
 # --- Fan Control Logic ---
 
@@ -37,182 +93,408 @@ def _calculate_fan_speed_from_curve(temperature: float, curve_points: list) -> i
     
     return curve_points[-1]['speed']
 
-async def _server_control_loop(server: models.Server):
-    """
-    单个服务器的风扇控制循环。
-    """
-    logger.info(f"Starting control loop for server: {server.name} (ID: {server.id})")
-    controller = get_controller(server)
+async def _take_over_fan_control(server: models.Server):
     try:
-        await controller.take_over_fan_control()
+        with ipmi_priority(PRIORITY_CONTROL):
+            await get_controller(server).take_over_fan_control()
     except Exception as e:
         logger.error(f"Error taking over fan control for {server.name}: {e}", exc_info=True)
+    _FAN_CONTROL_TAKEN[server.id] = server
 
-    while True:
-        try:
-            # 每次循环都重新获取服务器信息，以防其状态（如 control_mode）发生变化
-            async with AsyncSessionLocal() as db:
-                refreshed_server = await crud.get_server(db, server.id)
-            
-            if not refreshed_server or refreshed_server.control_mode != "auto":
-                logger.info(f"Stopping control loop for {server.name} as it's no longer in 'auto' mode.")
-                break
-
-            controller = get_controller(refreshed_server)
-            temperature = await controller.get_temperature()
-
-            if temperature == -1.0:
-                logger.warning(f"Cannot auto-control fans for {server.name}, invalid temperature reading.")
-                await asyncio.sleep(10) # 等待10秒后重试
-                continue
-
-            async with AsyncSessionLocal() as db:
-                curve = await crud.get_fan_curve(db, server_id=refreshed_server.id)
-            
-            if not curve or not curve.points:
-                logger.warning(f"Cannot auto-control fans for {server.name}, no fan curve defined.")
-                await asyncio.sleep(30) # 没有曲线定义，等待较长时间
-                continue
-
-            target_speed = _calculate_fan_speed_from_curve(temperature, list(curve.points))
-            logger.info(f"Auto-control for {server.name}: Temp={temperature}°C, Target Speed={target_speed}%")
-            await controller.set_fan_speed(target_speed)
-            
-            await asyncio.sleep(10) # 控制间隔
-
-        except asyncio.CancelledError:
-            logger.info(f"Control loop for server {server.name} was cancelled.")
-            break
-        except Exception as e:
-            logger.error(f"Error in control loop for server {server.name}: {e}", exc_info=True)
-            await asyncio.sleep(30) # 出现异常时，等待较长时间后重试
-
-    # 清理任务字典
+async def _return_fan_control(server_id: int, server: models.Server | None = None) -> bool:
+    """
+    若已接管，则将风扇控制权交还给系统（优先使用最新的服务器信息）。
+    :return: 未接管或交还成功时为 True。
+    """
+    taken = _FAN_CONTROL_TAKEN.pop(server_id, None)
+    if taken is None:
+        return True
+    server = server or taken
     try:
-        await controller.return_fan_control_to_system()
+        with ipmi_priority(PRIORITY_CONTROL):
+            return await get_controller(server).return_fan_control_to_system() is not False
     except Exception as e:
         logger.error(f"Error returning fan control for {server.name}: {e}", exc_info=True)
-
-    if server.id in SERVER_CONTROL_TASKS:
-        del SERVER_CONTROL_TASKS[server.id]
-    logger.info(f"Control loop for server {server.name} has stopped.")
-
+        return False
+
+# --- Pipeline Stages ---
+
+class ControlStage(PipelineStage):
+    """自动模式下根据温度曲线设置风扇转速；连续读取温度失败时进入故障安全模式"""
+    name = "control"
+    priority = PRIORITY_CONTROL
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_failures = 0                        # 连续读取温度失败的次数
+        self.fail_safe_since: Optional[float] = None  # 进入故障安全模式的单调时钟时间
+
+    @property
+    def in_fail_safe(self) -> bool:
+        return self.fail_safe_since is not None
+
+    def is_active(self, server: models.Server) -> bool:
+        return server.control_mode == "auto"
+
+    async def prepare(self, server: models.Server):
+        if server.control_mode != "auto":
+            self.read_failures = 0
+            if self.in_fail_safe:
+                await self._exit_fail_safe(server)
+            if server.id in _FAN_CONTROL_TAKEN:
+                logger.info(f"Stopping fan control for {server.name} as it's no longer in 'auto' mode.")
+                await _return_fan_control(server.id, server)
+
+    async def process(self, snapshot: SensorSnapshot, controller):
+        server = snapshot.server
+        if snapshot.temperature is None:
+            self.read_failures += 1
+            logger.warning(f"Cannot auto-control fans for {server.name}, invalid temperature reading "
+                           f"({self.read_failures} consecutive).")
+            if self.in_fail_safe:
+                if FAIL_SAFE_ACTION != "return_to_bmc":
+                    await controller.set_fan_speed(FAIL_SAFE_FAN_SPEED)  # BMC 可能只是读数失败，继续尝试保持安全转速
+            elif self.read_failures >= FAIL_SAFE_READ_FAILURES:
+                await self._enter_fail_safe(server, controller)
+            return
+
+        self.read_failures = 0
+        if self.in_fail_safe:
+            await self._exit_fail_safe(server)
+        if server.id not in _FAN_CONTROL_TAKEN:
+            await _take_over_fan_control(server)
+
+        curve = server.fan_curves[0] if server.fan_curves else None
+        if not curve or not curve.points:
+            logger.warning(f"Cannot auto-control fans for {server.name}, no fan curve defined.")
+            self.defer(CONTROL_NO_CURVE_DELAY) # 没有曲线定义，等待较长时间
+            return
+
+        target_speed = _calculate_fan_speed_from_curve(snapshot.temperature, list(curve.points))
+        logger.info(f"Auto-control for {server.name}: Temp={snapshot.temperature}°C, Target Speed={target_speed}%")
+        await controller.set_fan_speed(target_speed)
+
+    async def _enter_fail_safe(self, server: models.Server, controller):
+        logger.critical(f"{self.read_failures} consecutive temperature read failures for {server.name}, "
+                        f"entering fail-safe mode ({FAIL_SAFE_ACTION}).")
+        self.fail_safe_since = time.monotonic()
+        self.interval_cap = FAIL_SAFE_RECHECK_INTERVAL
+        if FAIL_SAFE_ACTION == "return_to_bmc":
+            await _return_fan_control(server.id, server)
+        else:
+            if server.id not in _FAN_CONTROL_TAKEN:
+                await _take_over_fan_control(server)
+            await controller.set_fan_speed(FAIL_SAFE_FAN_SPEED)
+        async with AsyncSessionLocal() as db:
+            await crud.open_fail_safe_event(db, server.id, FAIL_SAFE_ACTION, self.read_failures)
+
+    async def _exit_fail_safe(self, server: models.Server):
+        logger.warning(f"Leaving fail-safe mode for {server.name} after {time.monotonic() - self.fail_safe_since:.0f}s.")
+        self.fail_safe_since = None
+        self.interval_cap = None
+        async with AsyncSessionLocal() as db:
+            await crud.close_fail_safe_events(db, server.id)
+
+
+class HistoryStage(PipelineStage):
+    """将温度和平均风扇转速写入历史表"""
+    name = "history"
+    needs_fan_speed = True
+
+    async def process(self, snapshot: SensorSnapshot, controller):
+        if snapshot.temperature is None and snapshot.fan_speed is None:
+            return
+        # 一次性将两个数据写入数据库
+        async with AsyncSessionLocal() as db:
+            if snapshot.temperature is not None:
+                await crud.create_temperature_history(db, server_id=snapshot.server.id, temperature=snapshot.temperature)
+            if snapshot.fan_speed is not None:
+                await crud.create_fan_speed_history(db, server_id=snapshot.server.id, speed_rpm=snapshot.fan_speed)
+        logger.info(f"Recorded metrics for {snapshot.server.name}: Temp={snapshot.temperature}°C, Fan={snapshot.fan_speed} RPM")
+
+
+class SensorHistoryStage(PipelineStage):
+    """记录所有温度、风扇和功率传感器的读数，用于发现被平均值掩盖的单个故障风扇等问题"""
+    name = "sensors"
+    needs_temperature = False
+    needs_all_sensors = True
+
+    async def process(self, snapshot: SensorSnapshot, controller):
+        if not snapshot.sensors:
+            return
+        async with AsyncSessionLocal() as db:
+            await sensor_history.record(db, snapshot.server.id, snapshot.sensors,
+                                        snapshot.taken_at.replace(tzinfo=None))
+
+
+class FleetStage(PipelineStage):
+    """用本次采样中其他阶段读取到的数据更新内存中的机群汇总（自身不触发传感器读取）"""
+    name = "fleet"
+    needs_temperature = False
+
+    async def process(self, snapshot: SensorSnapshot, controller):
+        if snapshot.temperature is None and snapshot.fan_speed is None:
+            return
+        FLEET.record(snapshot.server, temperature=snapshot.temperature, fan_speed=snapshot.fan_speed)
+        _write_latest(snapshot.server.id)
+
+
+def _write_latest(server_id: int):
+    """将机群汇总中该服务器的最新读数写入共享内存表"""
+    entry = FLEET.get(server_id)
+    if LATEST_TABLE is None or entry is None:
+        return
+    try:
+        LATEST_TABLE.write(server_id, entry["temperature"], entry["average_speed_rpm"], entry["updated_at"])
+    except IndexError as e:
+        logger.warning(f"Cannot publish reading to shared memory: {e}")
+
+
+def _build_polling(config: Optional[models.ServerPolling]) -> Optional[AdaptivePolling]:
+    if config is None or not config.adaptive:
+        return None
+    return AdaptivePolling(SAMPLE_INTERVAL, config.min_interval, config.max_interval)
+
+def _build_pipeline(server: models.Server, polling_config: Optional[models.ServerPolling] = None) -> SamplingPipeline:
+    return SamplingPipeline(server, [
+        ControlStage(error_delay=CONTROL_ERROR_DELAY),
+        HistoryStage(period=HISTORY_PERIOD, error_delay=HISTORY_ERROR_DELAY),
+        SensorHistoryStage(period=SENSOR_HISTORY_PERIOD, error_delay=SENSOR_HISTORY_ERROR_DELAY),
+        FleetStage(every=FLEET_EVERY),
+    ], interval=SAMPLE_INTERVAL, polling=_build_polling(polling_config))
+
+async def _run_pipeline(pipeline: SamplingPipeline):
+    await pipeline.run_once()
+    # 自适应模式下，下一次截止时间按新的采样间隔推进
+    job = SCHEDULER.get(_sample_key(pipeline.server.id))
+    if job is not None:
+        job.interval = pipeline.interval
+
+def _polling_key(config: Optional[models.ServerPolling]):
+    return (config.adaptive, config.min_interval, config.max_interval) if config is not None else None
+
+def _ensure_pipeline(server: models.Server, polling_config: Optional[models.ServerPolling] = None,
+                     delay: Optional[float] = None) -> SamplingPipeline:
+    """
+    为服务器注册采样管道（已存在则复用）。
+    :param delay: 首次采样前的延迟；默认在一个采样间隔内随机。
+    """
+    pipeline = SERVER_PIPELINES.get(server.id)
+    if pipeline is None:
+        logger.info(f"Starting sampling pipeline for server: {server.name} (ID: {server.id})")
+        pipeline = SERVER_PIPELINES[server.id] = _build_pipeline(server, polling_config)
+        _POLLING_KEYS[server.id] = _polling_key(polling_config)
+        SCHEDULER.add(_sample_key(server.id), lambda: _run_pipeline(pipeline), pipeline.interval, delay=delay)
+    return pipeline
+
+def configure_polling(server_id: int, config: Optional[models.ServerPolling]):
+    """更新服务器的采样间隔配置，下一次采样后生效"""
+    pipeline = SERVER_PIPELINES.get(server_id)
+    if pipeline is not None:
+        pipeline.polling = _build_polling(config)
+        _POLLING_KEYS[server_id] = _polling_key(config)
+
+def get_polling_status(server_id: int) -> dict:
+    """获取服务器当前的采样间隔及温度变化率（°C/s）"""
+    pipeline = SERVER_PIPELINES.get(server_id)
+    if pipeline is None:
+        return {"current_interval": None, "temperature_rate": None}
+    return {
+        "current_interval": pipeline.interval,
+        "temperature_rate": round(pipeline.polling.rate, 4) if pipeline.polling else None,
+    }
+
+# --- Loop Management ---
 
 async def start_server_control_loop(server: models.Server):
-    """启动或重启指定服务器的控制循环"""
-    if server.id in SERVER_CONTROL_TASKS:
-        await stop_server_control_loop(server.id)
-    
-    if server.control_mode == "auto":
-        loop = asyncio.get_running_loop()
-        task = loop.create_task(_server_control_loop(server))
-        SERVER_CONTROL_TASKS[server.id] = task
-        return task
+    """
+    为指定服务器启用自动风扇控制（在下一次采样时接管风扇控制权）。
+    以下启停函数在非采集进程中不做任何操作，采集进程会在下一次同步时发现数据库中的变化。
+    """
+    if SCHEDULER.started and server.control_mode == "auto":
+        logger.info(f"Starting control loop for server: {server.name} (ID: {server.id})")
+        _ensure_pipeline(server).server = server
 
 async def stop_server_control_loop(server_id: int):
-    """停止指定服务器的控制循环"""
-    if server_id in SERVER_CONTROL_TASKS:
-        task = SERVER_CONTROL_TASKS[server_id]
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass # 任务取消是正常行为
-        logger.info(f"Successfully stopped control loop for server ID: {server_id}")
-    if server_id in SERVER_CONTROL_TASKS:
-        del SERVER_CONTROL_TASKS[server_id]
-
-# --- Metrics Recording Logic ---
-
-async def _server_metrics_loop(server: models.Server):
-    """单个服务器的指标记录循环（原子化获取和存储数据）"""
-    logger.info(f"Starting metrics loop for server: {server.name} (ID: {server.id})")
-    while True:
-        try:
-            controller = get_controller(server)
-            
-            # 原子化获取温度和风扇速度数据
-            temperature = await controller._get_temperature_from_ipmi()
-            fan_speed = await controller._get_fan_speed_from_ipmi()
-            
-            if temperature != -1.0 or fan_speed != -1:
-                # 一次性将两个数据写入数据库
-                async with AsyncSessionLocal() as db:
-                    if temperature != -1.0:
-                        await crud.create_temperature_history(db, server_id=server.id, temperature=temperature)
-                    if fan_speed != -1:
-                        await crud.create_fan_speed_history(db, server_id=server.id, speed_rpm=fan_speed)
-                
-                logger.info(f"Recorded metrics for {server.name}: Temp={temperature}°C, Fan={fan_speed} RPM")
-            
-            await asyncio.sleep(30) # 指标记录间隔
-
-        except asyncio.CancelledError:
-            logger.info(f"Metrics loop for server {server.name} was cancelled.")
-            break
-        except Exception as e:
-            logger.error(f"Error in metrics loop for server {server.name}: {e}", exc_info=True)
-            await asyncio.sleep(60)
-
-    if server.id in SERVER_METRIC_TASKS:
-        del SERVER_METRIC_TASKS[server.id]
-    logger.info(f"Metrics loop for server {server.name} has stopped.")
-
-async def start_server_metrics_loop(server: models.Server):
-    if server.id in SERVER_METRIC_TASKS:
-        await stop_server_metrics_loop(server.id)
-    
-    loop = asyncio.get_running_loop()
-    task = loop.create_task(_server_metrics_loop(server))
-    SERVER_METRIC_TASKS[server.id] = task
-    return task
-
-async def stop_server_metrics_loop(server_id: int):
-    if server_id in SERVER_METRIC_TASKS:
-        task = SERVER_METRIC_TASKS[server_id]
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
-        logger.info(f"Successfully stopped metrics loop for server ID: {server_id}")
-    if server_id in SERVER_METRIC_TASKS:
-        del SERVER_METRIC_TASKS[server_id]
+    """停止指定服务器的自动风扇控制，并将风扇控制权交还给系统"""
+    await _return_fan_control(server_id)
+    logger.info(f"Successfully stopped control loop for server ID: {server_id}")
+
+async def start_server_metrics_loop(server: models.Server, polling_config: Optional[models.ServerPolling] = None):
+    if SCHEDULER.started:
+        _ensure_pipeline(server, polling_config)
+
+async def stop_server_metrics_loop(server_id: int, return_control: bool = True):
+    """
+    停止指定服务器的采样管道（若仍接管着风扇控制权则一并交还），并释放其控制器。
+    :param return_control: 为 False 时只清除本地的接管标记，不发送任何 IPMI 命令（如租约已被其他进程获取）。
+    """
+    SERVER_PIPELINES.pop(server_id, None)
+    _POLLING_KEYS.pop(server_id, None)
+    if LATEST_TABLE is not None and 0 <= server_id < LATEST_TABLE.capacity:
+        LATEST_TABLE.clear(server_id)
+    if await SCHEDULER.cancel(_sample_key(server_id)) is not None:
+        logger.info(f"Successfully stopped sampling pipeline for server ID: {server_id}")
+    if return_control:
+        await _return_fan_control(server_id)
+    else:
+        _FAN_CONTROL_TAKEN.pop(server_id, None)
+    remove_controller(server_id)
+    sensor_history.forget(server_id)
+
+def get_tick_stats(server_id: int) -> dict:
+    """获取指定服务器采样任务的执行统计（迟到、耗时直方图和跳过的周期数）"""
+    job = SCHEDULER.get(_sample_key(server_id))
+    pipeline = SERVER_PIPELINES.get(server_id)
+    return {
+        "server_id": server_id,
+        "sampling": job.stats() if job else None,
+        "stages": [
+            {"stage": stage.name, "every": stage.every, "runs": stage.runs}
+            for stage in pipeline.stages
+        ] if pipeline else [],
+    }
+
+
+def get_fail_safe_state(server_id: int) -> dict:
+    """获取服务器当前是否处于故障安全模式，以及连续读取失败次数"""
+    pipeline = SERVER_PIPELINES.get(server_id)
+    stage = pipeline.stage(ControlStage.name) if pipeline else None
+    if stage is None:
+        return {"active": False, "consecutive_failures": 0}
+    return {"active": stage.in_fail_safe, "consecutive_failures": stage.read_failures}
 
 
 # --- Global Control ---
 
-async def start_all_loops():
-    """在应用启动时，为所有服务器启动控制和指标记录循环"""
+async def start_all_loops(owns: Optional[Callable[[int], bool]] = None, shared_memory: bool = True):
+    """
+    在应用启动时启动调度器，并为所有服务器注册采样管道后立即返回。
+    服务器、曲线和最新读数由一次查询加载；各服务器的首次采样（及接管风扇控制）
+    均匀分散在预热窗口内，避免启动时的 IPMI 突发。
+    :param owns: 分片部署时只为 owns(server_id) 为真的服务器注册采样管道，其余服务器由分片协调器按租约启停。
+    :param shared_memory: 是否将读数写入本机的共享内存表（分片部署时每个进程只有部分读数，不写入）。
+    """
+    global LATEST_TABLE, _OWNS
     logger.info("Starting all server loops...")
+    _STARTUP.update(started_at=time.monotonic(), loaded=False)
+    _OWNS = owns
+    if shared_memory:
+        try:
+            LATEST_TABLE = LatestTable(writable=True)
+        except OSError as e:
+            logger.error(f"Cannot open shared latest-reading table, readings are published to the database only: {e}")
+    SCHEDULER.start()
     async with AsyncSessionLocal() as db:
-        servers = await crud.get_servers(db, limit=1000)
-    
+        rows = await crud.get_servers_for_startup(db)
+        if owns is None:
+            # 上次运行时未结束的故障安全记录在本次启动时结束（分片部署时由获得租约的进程逐台结束）
+            await crud.close_fail_safe_events(db)
+    if owns is not None:
+        rows = [row for row in rows if owns(row[0].id)]
+
+    spacing = min(WARMUP_WINDOW / len(rows), WARMUP_STAGGER) if rows else 0
+    for i, (server, temperature, fan_speed) in enumerate(rows):
+        # 用历史表中的最新读数预填机群汇总，首次采样前即可查询
+        FLEET.record(server, temperature=temperature, fan_speed=fan_speed)
+        _write_latest(server.id)
+        _ensure_pipeline(server, server.polling, delay=i * spacing)
+    SCHEDULER.add(("reconcile",), _reconcile, RECONCILE_INTERVAL)
+    SCHEDULER.add(("publish",), _publish_latest, PUBLISH_INTERVAL)
+    _STARTUP["loaded"] = True
+    logger.info(f"Registered {len(rows)} server(s), warm-up spread over {len(rows) * spacing:.1f}s.")
+
+async def _reconcile():
+    """按数据库中的服务器列表增删采样管道，并应用变化了的采样配置（可能由其他 API 进程修改）"""
+    async with AsyncSessionLocal() as db:
+        servers = await crud.get_servers_with_polling(db)
+    current = {server.id: server for server in servers}
+    for server_id in [server_id for server_id in SERVER_PIPELINES if server_id not in current]:
+        logger.info(f"Server ID {server_id} no longer exists, stopping its sampling pipeline.")
+        await stop_server_metrics_loop(server_id)
+        FLEET.remove(server_id)
     for server in servers:
-        await start_server_metrics_loop(server)
-        if server.control_mode == "auto":
-            await start_server_control_loop(server)
-
-def stop_all_loops():
-    """在应用关闭时，停止所有正在运行的循环"""
-    logger.info("Stopping all server loops...")
-    
-    # 收集所有任务
-    control_tasks = list(SERVER_CONTROL_TASKS.values())
-    metric_tasks = list(SERVER_METRIC_TASKS.values())
-    all_tasks = control_tasks + metric_tasks
-
-    if not all_tasks:
+        pipeline = SERVER_PIPELINES.get(server.id)
+        if pipeline is None:
+            if _OWNS is None or _OWNS(server.id):
+                _ensure_pipeline(server, server.polling)
+        elif _POLLING_KEYS.get(server.id) != _polling_key(server.polling):
+            configure_polling(server.id, server.polling)
+
+async def _publish_latest():
+    """将自上次发布以来变化的读数批量写入 latest_readings 表，供其他进程读取"""
+    changes = FLEET.drain_changes()
+    if not changes:
         return
-
-    # 取消所有任务
-    for task in all_tasks:
-        task.cancel()
-
-    # 等待所有任务完成取消
-    # loop = asyncio.get_running_loop()
-    # await asyncio.gather(*all_tasks, return_exceptions=True)
-    
-    SERVER_CONTROL_TASKS.clear()
-    SERVER_METRIC_TASKS.clear()
-    logger.info("All server loops have been requested to stop.")
+    readings = [
+        {
+            "server_id": entry["server_id"],
+            "temperature": entry["temperature"],
+            "average_speed_rpm": entry["average_speed_rpm"],
+            "updated_at": entry["updated_at"],
+        }
+        for entry in changes if entry["server_id"] in SERVER_PIPELINES
+    ]
+    async with AsyncSessionLocal() as db:
+        await crud.upsert_latest_readings(db, readings)
+
+def get_readiness() -> dict:
+    """启动进度：已执行首次采样的服务器数量，全部执行后即为就绪；failing 列出最近一次采样失败的服务器"""
+    total = len(SERVER_PIPELINES)
+    warmed_up = sum(1 for pipeline in SERVER_PIPELINES.values() if pipeline.completed)
+    failing = [
+        {"server_id": server_id, "error": pipeline.last_error}
+        for server_id, pipeline in SERVER_PIPELINES.items() if pipeline.last_error is not None
+    ]
+    started_at = _STARTUP["started_at"]
+    return {
+        "ready": _STARTUP["loaded"] and warmed_up == total,
+        "loaded": _STARTUP["loaded"],
+        "servers": total,
+        "warmed_up": warmed_up,
+        "failing": failing,
+        "elapsed": round(time.monotonic() - started_at, 1) if started_at is not None else None,
+    }
+
+async def stop_all_loops() -> dict:
+    """
+    在应用关闭时停止所有采样任务，并在 SHUTDOWN_DEADLINE 内并发地将风扇控制权交还给所有已接管的 BMC。
+    进行中的采样最多再运行 SHUTDOWN_GRACE 秒，以便其历史数据写入完成；之后写入尚未发布的最新读数。
+    :return: 交还结果，failed 中列出未能交还控制权的服务器。
+    """
+    global LATEST_TABLE
+    logger.info("Stopping all server loops...")
+    started = time.monotonic()
+    await SCHEDULER.shutdown(grace=SHUTDOWN_GRACE)
+    # 写入尚未发布的最新读数；须在清空 SERVER_PIPELINES 之前，否则这些读数会被当作已停止采集的服务器丢弃
+    try:
+        await _publish_latest()
+    except Exception as e:
+        logger.error(f"Failed to publish latest readings on shutdown: {e}")
+    SERVER_PIPELINES.clear()
+    _POLLING_KEYS.clear()
+    if LATEST_TABLE is not None:
+        # 文件保留，其他进程在下一个采集进程启动前仍可读到最后的读数
+        LATEST_TABLE.close()
+        LATEST_TABLE = None
+
+    taken = list(_FAN_CONTROL_TAKEN.items())
+    remaining = max(started + SHUTDOWN_DEADLINE - time.monotonic(), 0)
+    with ipmi_deadline(remaining):
+        tasks = [asyncio.ensure_future(_return_fan_control(server_id)) for server_id, _ in taken]
+    if tasks:
+        # IPMI 命令本身受截止时间约束；这里再兜底，超时未完成的一律视为失败
+        _, pending = await asyncio.wait(tasks, timeout=remaining)
+        for task in pending:
+            task.cancel()
+    failed = [
+        {"server_id": server_id, "name": server.name}
+        for (server_id, server), task in zip(taken, tasks)
+        if not task.done() or task.cancelled() or not task.result()
+    ]
+    if failed:
+        logger.error(f"Could not return fan control to the BMC for {len(failed)} server(s): "
+                     f"{', '.join(item['name'] for item in failed)}")
+    logger.info(f"All server loops stopped in {time.monotonic() - started:.1f}s, "
+                f"fan control returned for {len(taken) - len(failed)}/{len(taken)} server(s).")
+    return {"restored": len(taken) - len(failed), "failed": failed}
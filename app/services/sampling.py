@@ -0,0 +1,224 @@
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from .. import crud, models
+from ..controllers.base import BaseServerController
+from ..controllers.factory import get_controller
+from ..controllers.ipmi import PRIORITY_METRICS, ipmi_deadline, ipmi_priority
+from ..database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# 每次采样中所有 IPMI 命令（含排队）的总时间预算：采样间隔的 80%，但不少于 3 秒
+TICK_DEADLINE_FRACTION = 0.8
+TICK_DEADLINE_MIN = 3.0
+
+
+class SensorSnapshot:
+    """一次采样得到的传感器读数，由管道中所有到期的处理阶段共享"""
+
+    def __init__(self, server: models.Server, index: int):
+        self.server = server
+        self.index = index                      # 该服务器的第几次采样
+        self.temperature: Optional[float] = None  # 读取失败或未读取时为 None
+        self.fan_speed: Optional[int] = None
+        self.sensors: Optional[List[dict]] = None  # 逐个传感器的读数 (get_all_sensors)
+        self.taken_at = models.get_local_time()
+
+
+class PipelineStage(ABC):
+    """
+    采样管道中的一个处理阶段。
+    every 表示每 N 次采样执行一次；period 表示两次执行之间至少间隔的秒数（采样间隔可变时使用）；
+    needs_* 声明该阶段需要的读数，只有到期阶段需要的传感器才会被读取；
+    priority 为该阶段发出的 IPMI 命令在 BMC 队列中的优先级；
+    interval_cap 不为空时，管道的采样间隔不超过该值（用于需要更频繁检查的状态）。
+    prepare 或 process 出现异常后本阶段暂停 error_delay 秒。
+    """
+    name = "stage"
+    needs_temperature = True
+    needs_fan_speed = False
+    needs_all_sensors = False
+    priority = PRIORITY_METRICS
+
+    def __init__(self, every: int = 1, period: Optional[float] = None, error_delay: float = 0):
+        self.every = every
+        self.period = period
+        self.error_delay = error_delay
+        self.interval_cap: Optional[float] = None
+        self.runs = 0
+        self._skip_until = 0.0
+        self._last_run: Optional[float] = None
+
+    def mark_run(self):
+        self.runs += 1
+        self._last_run = time.monotonic()
+
+    def defer(self, seconds: float):
+        """在接下来的 seconds 秒内跳过本阶段（用于退避）"""
+        self._skip_until = time.monotonic() + seconds
+
+    def is_active(self, server: models.Server) -> bool:
+        return True
+
+    def is_due(self, server: models.Server, index: int, interval: float) -> bool:
+        if index % self.every:
+            return False
+        now = time.monotonic()
+        if now < self._skip_until:
+            return False
+        # 允许半个采样间隔的误差，避免因调度抖动错过一次采样
+        if self.period is not None and self._last_run is not None and now - self._last_run < self.period - interval / 2:
+            return False
+        return self.is_active(server)
+
+    async def prepare(self, server: models.Server):
+        """每次采样前调用，无论本阶段是否到期"""
+        pass
+
+    @abstractmethod
+    async def process(self, snapshot: SensorSnapshot, controller: BaseServerController):
+        """处理一次采样的读数"""
+        pass
+
+
+class AdaptivePolling:
+    """
+    根据温度变化率自适应调整采样间隔。
+    温度快速上升，或在风扇曲线拐点下方 KNEE_MARGIN 内且正在上升时间隔减半（不低于 min_interval）；
+    停留在拐点附近但没有向拐点移动时保持不变，以免稳定在拐点上的温度把间隔一直压到最小；
+    其余温度稳定的情况下间隔逐步放大（不超过 max_interval）。
+    """
+    RISING_RATE = 0.1    # °C/s，超过即视为快速升温
+    STABLE_RATE = 0.02   # °C/s，变化率绝对值低于此值视为稳定
+    KNEE_MARGIN = 2.0    # °C，与曲线点的距离在此范围内视为接近拐点
+    BACKOFF_FACTOR = 1.5
+    SMOOTHING = 0.5      # 变化率的指数平滑系数
+
+    def __init__(self, interval: float, min_interval: float, max_interval: float):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(interval, min_interval), max_interval)
+        self.rate = 0.0
+        self._last: Optional[tuple] = None
+
+    def update(self, temperature: Optional[float], knees: List[float]) -> float:
+        if temperature is None:
+            return self.interval
+
+        now = time.monotonic()
+        if self._last is not None and now > self._last[0]:
+            rate = (temperature - self._last[1]) / (now - self._last[0])
+            self.rate = self.SMOOTHING * rate + (1 - self.SMOOTHING) * self.rate
+        self._last = (now, temperature)
+
+        approaching_knee = self.rate > 0 and any(knee - self.KNEE_MARGIN <= temperature < knee for knee in knees)
+        near_knee = any(abs(temperature - knee) <= self.KNEE_MARGIN for knee in knees)
+        if self.rate >= self.RISING_RATE or approaching_knee:
+            self.interval = max(self.min_interval, self.interval / 2)
+        elif near_knee:
+            pass
+        elif abs(self.rate) <= self.STABLE_RATE:
+            self.interval = min(self.max_interval, self.interval * self.BACKOFF_FACTOR)
+        return self.interval
+
+
+class SamplingPipeline:
+    """
+    单个服务器的采样管道：每次采样读取一次传感器，再将同一份读数交给各个到期的处理阶段。
+    设置 polling 后采样间隔按温度变化自适应调整，否则固定为 interval；
+    任一阶段设置了 interval_cap 时取较小值。
+    """
+
+    def __init__(self, server: models.Server, stages: List[PipelineStage], interval: float,
+                 polling: Optional[AdaptivePolling] = None):
+        self.server = server
+        self.stages = stages
+        self.base_interval = interval
+        self.polling = polling
+        self.samples = 0
+        self.completed = 0  # 已执行（无论成功与否）的采样次数，用于判断启动预热是否完成
+        self.last_error: Optional[str] = None  # 最近一次采样失败的原因，成功后清空
+
+    @property
+    def nominal_interval(self) -> float:
+        """不考虑 interval_cap 的采样间隔"""
+        return self.polling.interval if self.polling is not None else self.base_interval
+
+    @property
+    def interval(self) -> float:
+        interval = self.nominal_interval
+        caps = [stage.interval_cap for stage in self.stages if stage.interval_cap is not None]
+        return min(interval, *caps) if caps else interval
+
+    def stage(self, name: str) -> Optional[PipelineStage]:
+        return next((stage for stage in self.stages if stage.name == name), None)
+
+    async def run_once(self):
+        try:
+            # 每次采样都重新获取服务器信息（含风扇曲线），以防其状态发生变化
+            async with AsyncSessionLocal() as db:
+                refreshed_server = await crud.get_server(db, self.server.id)
+            if refreshed_server is None:
+                return
+            self.server = refreshed_server
+
+            index = self.samples
+            self.samples += 1
+            # 超时的命令会被终止，单次采样的耗时不会无限拖长。预算按正常采样间隔计算：
+            # 故障安全模式缩短了采样间隔，但读取慢的 BMC 仍需要与平时相同的时间才能读到温度并退出故障安全模式
+            with ipmi_deadline(max(self.nominal_interval * TICK_DEADLINE_FRACTION, TICK_DEADLINE_MIN)):
+                await self._sample(refreshed_server, index)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            # 失败的采样同样计入，配置错误（如不支持的型号）的服务器不会使启动预热永远无法完成
+            self.completed += 1
+
+    async def _sample(self, refreshed_server: models.Server, index: int):
+        for stage in self.stages:
+            try:
+                with ipmi_priority(stage.priority):
+                    await stage.prepare(refreshed_server)
+            except Exception as e:
+                # 单个阶段失败不影响其他阶段
+                logger.error(f"Error preparing {stage.name} stage for server {refreshed_server.name}: {e}",
+                             exc_info=True)
+                stage.defer(stage.error_delay)
+
+        interval = self.interval
+        due = [stage for stage in self.stages if stage.is_due(refreshed_server, index, interval)]
+        if not due and self.polling is None:
+            return
+
+        controller = get_controller(refreshed_server)
+        snapshot = SensorSnapshot(refreshed_server, index)
+        # 共享读数按到期阶段中最高的优先级读取
+        with ipmi_priority(min((stage.priority for stage in due), default=PRIORITY_METRICS)):
+            # 自适应模式需要每次采样都读取温度以计算变化率
+            if self.polling is not None or any(stage.needs_temperature for stage in due):
+                temperature = await controller.get_temperature()
+                snapshot.temperature = temperature if temperature != -1.0 else None
+            if any(stage.needs_fan_speed for stage in due):
+                fan_speed = await controller.get_fan_speed()
+                snapshot.fan_speed = fan_speed if fan_speed != -1 else None
+            if any(stage.needs_all_sensors for stage in due):
+                snapshot.sensors = await controller.get_all_sensors() or None
+
+        if self.polling is not None:
+            knees = [point["temp"] for curve in refreshed_server.fan_curves for point in curve.points]
+            self.polling.update(snapshot.temperature, knees)
+
+        for stage in due:
+            stage.mark_run()
+            try:
+                with ipmi_priority(stage.priority):
+                    await stage.process(snapshot, controller)
+            except Exception as e:
+                # 单个阶段失败不影响其他阶段
+                logger.error(f"Error in {stage.name} stage for server {refreshed_server.name}: {e}", exc_info=True)
+                stage.defer(stage.error_delay)
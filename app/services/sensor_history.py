@@ -0,0 +1,65 @@
+"""
+逐个传感器的历史读数。
+每台服务器的传感器列表（名称、类型、单位）保存在 sensor_dictionaries 表中，每次采样只写一行 sensor_samples，
+所有读数按列表顺序打包为 float32 向量（无读数为 NaN），行数不随传感器数量增加。
+"""
+import math
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from .. import crud
+
+# {server_id: (传感器列表, sensor_dictionaries.id)}，避免每次采样都查询传感器列表
+_DICTIONARIES: Dict[int, Tuple[tuple, int]] = {}
+
+
+def pack_readings(values: List[Optional[float]]) -> bytes:
+    return struct.pack(f"<{len(values)}f", *(math.nan if value is None else value for value in values))
+
+
+def unpack_readings(data: bytes) -> List[Optional[float]]:
+    return [None if math.isnan(value) else value for value in struct.unpack(f"<{len(data) // 4}f", data)]
+
+
+def _layout(sensors: List[dict]) -> tuple:
+    return tuple((sensor["name"], sensor["type"], sensor["unit"]) for sensor in sensors)
+
+
+async def record(db, server_id: int, sensors: List[dict], timestamp):
+    """
+    写入一次采样。sensors 为控制器 get_all_sensors() 的结果；传感器组成变化时新建传感器列表。
+    """
+    layout = _layout(sensors)
+    cached = _DICTIONARIES.get(server_id)
+    if cached is None or cached[0] != layout:
+        dictionary = await crud.get_latest_sensor_dictionary(db, server_id)
+        if dictionary is None or _layout(dictionary.sensors) != layout:
+            dictionary = await crud.create_sensor_dictionary(
+                db, server_id, [{"name": name, "type": type_, "unit": unit} for name, type_, unit in layout], timestamp)
+        cached = _DICTIONARIES[server_id] = (layout, dictionary.id)
+    await crud.create_sensor_sample(db, server_id, cached[1], pack_readings([sensor["value"] for sensor in sensors]),
+                                    timestamp)
+
+
+def forget(server_id: int):
+    _DICTIONARIES.pop(server_id, None)
+
+
+async def get_history(db, server_id: int, start_date, end_date) -> dict:
+    """
+    时间范围内的逐传感器历史（列式）：共享的时间轴，以及每个传感器与之等长的读数列表。
+    传感器按首次出现的顺序排列；某段时间内不存在的传感器读数为 None。
+    """
+    rows = await crud.get_sensor_samples(db, server_id, start_date, end_date)
+    dictionaries = await crud.get_sensor_dictionaries(db, sorted({row[1] for row in rows}))
+    series: Dict[tuple, dict] = {}
+    timestamps = []
+    for i, (timestamp, dictionary_id, readings) in enumerate(rows):
+        timestamps.append(timestamp)
+        for sensor, value in zip(dictionaries[dictionary_id], unpack_readings(readings)):
+            key = (sensor["name"], sensor["type"], sensor["unit"])
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = dict(sensor, values=[None] * len(rows))
+            entry["values"][i] = value
+    return {"server_id": server_id, "timestamps": timestamps, "sensors": list(series.values())}
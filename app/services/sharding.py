@@ -0,0 +1,182 @@
+"""
+多节点分片采集：每个采集进程 (COLLECTOR_MODE=sharded python -m app.collector) 在共享数据库的
+collector_members 表中登记并定期心跳，按一致性哈希从存活成员中计算自己负责的服务器，
+再通过 server_leases 表中的租约获得这些服务器的控制权。
+
+交接顺序保证同一台服务器不会同时被两个进程控制：
+旧的负责进程先停止采样并交还风扇控制权，再删除租约；新的负责进程只有在租约不存在或已过期时才能获得它。
+进程崩溃时租约在 SHARD_LEASE_TTL 后过期；与数据库失联的进程在租约过期前主动停止控制。
+"""
+import asyncio
+import bisect
+import datetime
+import hashlib
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from .. import crud, models
+from ..database import AsyncSessionLocal
+from . import per_server_scheduler
+from .fleet_stats import FLEET
+
+logger = logging.getLogger(__name__)
+
+SHARD_HEARTBEAT_INTERVAL = float(os.environ.get("SHARD_HEARTBEAT_INTERVAL", "5"))  # 心跳及重新分配的间隔（秒）
+SHARD_LEASE_TTL = float(os.environ.get("SHARD_LEASE_TTL", "30"))  # 租约及成员心跳的有效期（秒）
+SHARD_VNODES = 64  # 每个成员在哈希环上的虚拟节点数，使负载分布更均匀
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    一致性哈希环。成员加入或退出时，只有约 1/N 的服务器需要更换负责进程。
+    """
+
+    def __init__(self, members: Iterable[str], vnodes: int = SHARD_VNODES):
+        points = sorted((_hash(f"{member}#{i}"), member) for member in set(members) for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._members = [member for _, member in points]
+
+    def owner(self, key) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._members[index]
+
+
+async def _start_server(server: models.Server):
+    await per_server_scheduler.start_server_metrics_loop(server, server.polling)
+
+async def _stop_server(server_id: int):
+    await per_server_scheduler.stop_server_metrics_loop(server_id)
+    FLEET.remove(server_id)
+
+async def _abandon_server(server_id: int):
+    # 租约可能已属于新的负责进程，此时交还控制权会覆盖对方的风扇控制
+    await per_server_scheduler.stop_server_metrics_loop(server_id, return_control=False)
+    FLEET.remove(server_id)
+
+
+class ShardCoordinator:
+    """
+    本进程的分片成员身份。每个心跳周期：刷新心跳、续期已持有的租约、按哈希环计算应负责的服务器，
+    释放不再属于自己的服务器并尝试获取新分配到的服务器。
+    on_claim / on_release 在获得租约后 / 删除租约前调用，默认启停该服务器的采样管道；
+    on_lost 在发现租约已过期时调用，默认只停止采样管道，不发送任何 IPMI 命令。
+    """
+
+    def __init__(self, member_id: Optional[str] = None, session_factory=AsyncSessionLocal,
+                 heartbeat_interval: float = SHARD_HEARTBEAT_INTERVAL, lease_ttl: float = SHARD_LEASE_TTL,
+                 on_claim: Callable[[models.Server], Awaitable] = _start_server,
+                 on_release: Callable[[int], Awaitable] = _stop_server,
+                 on_lost: Callable[[int], Awaitable] = _abandon_server):
+        self.hostname = socket.gethostname()
+        self.member_id = member_id or os.environ.get("COLLECTOR_ID") or f"{self.hostname}:{os.getpid()}"
+        self.session_factory = session_factory
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_ttl = lease_ttl
+        self.on_claim = on_claim
+        self.on_release = on_release
+        self.on_lost = on_lost
+        self.owned: Dict[int, models.Server] = {}
+        self.members: list = []
+        self.rounds = 0
+        self._renewed_at: Optional[float] = None  # 最近一次成功续期开始时的单调时钟时间
+        self._task: Optional[asyncio.Task] = None
+
+    def owns(self, server_id: int) -> bool:
+        return server_id in self.owned
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def _fence_in(self) -> Optional[float]:
+        """距离必须主动停止控制的剩余时间（租约过期前留出一个心跳周期的余量）；未持有租约时为 None"""
+        if self._renewed_at is None or not self.owned:
+            return None
+        return self._renewed_at + self.lease_ttl - self.heartbeat_interval - time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                # 数据库长时间无响应时也要在租约过期前停止控制
+                await asyncio.wait_for(self.rebalance(), self._fence_in())
+            except Exception as e:
+                logger.error(f"Error rebalancing shard for collector {self.member_id}: {e!r}", exc_info=True)
+                await self.fence()
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def rebalance(self):
+        began = time.monotonic()
+        now = models.get_local_time()
+        expires_at = now + datetime.timedelta(seconds=self.lease_ttl)
+        async with self.session_factory() as db:
+            await crud.heartbeat_collector_member(db, self.member_id, self.hostname, os.getpid(), now)
+            members = await crud.get_live_collector_members(db, now - datetime.timedelta(seconds=self.lease_ttl))
+            renewed = await crud.renew_server_leases(db, self.member_id, now, expires_at)
+            servers = await crud.get_servers_with_polling(db)
+        self._renewed_at = began
+        self.members = sorted(set(members) | {self.member_id})
+        self.rounds += 1
+        if self.rounds == 1:
+            return  # 首轮只登记，等其他进程看到本进程后再分配，减少同时启动时的来回交接
+
+        # 租约已过期（可能已被其他进程获取）的服务器立即停止，不再交还控制权，也不删除租约
+        for server_id in [server_id for server_id in self.owned if server_id not in renewed]:
+            logger.warning(f"Collector {self.member_id} lost the lease for server ID {server_id}.")
+            self.owned.pop(server_id, None)
+            await self.on_lost(server_id)
+
+        ring = HashRing(self.members)
+        desired = {server.id: server for server in servers if ring.owner(server.id) == self.member_id}
+        for server_id in [server_id for server_id in self.owned if server_id not in desired]:
+            logger.info(f"Handing off server ID {server_id} from collector {self.member_id}.")
+            await self._release(server_id)
+
+        for server_id, server in desired.items():
+            if server_id in self.owned:
+                self.owned[server_id] = server
+                continue
+            async with self.session_factory() as db:
+                if not await crud.claim_server_lease(db, server_id, self.member_id, now, expires_at):
+                    continue  # 旧的负责进程尚未交接，下一个周期再试
+                # 上一个负责进程未结束的故障安全记录由新的负责进程结束
+                await crud.close_fail_safe_events(db, server_id)
+            logger.info(f"Collector {self.member_id} claimed server: {server.name} (ID: {server_id})")
+            self.owned[server_id] = server
+            await self.on_claim(server)
+
+    async def fence(self):
+        """续期失败时，在租约过期前（留出一个心跳周期的余量）停止控制所有服务器"""
+        fence_in = self._fence_in()
+        if fence_in is not None and fence_in <= self.heartbeat_interval:
+            logger.critical(f"Collector {self.member_id} could not renew its leases, "
+                            f"stopping control of {len(self.owned)} server(s).")
+            for server_id in list(self.owned):
+                await self._release(server_id, delete_lease=False)
+
+    async def _release(self, server_id: int, delete_lease: bool = True):
+        self.owned.pop(server_id, None)
+        await self.on_release(server_id)
+        if delete_lease:
+            async with self.session_factory() as db:
+                await crud.release_server_lease(db, server_id, self.member_id)
+
+    async def stop(self):
+        """停止重新分配（在交还风扇控制权之前调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait({self._task})
+            self._task = None
+
+    async def leave(self):
+        """风扇控制权交还后注销成员并释放全部租约，其他进程在下一个周期即可接手"""
+        self.owned.clear()
+        async with self.session_factory() as db:
+            await crud.delete_collector_member(db, self.member_id)
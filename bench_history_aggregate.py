@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+分桶聚合查询基准测试
+在数百万行的合成温度历史数据库上测量 crud.get_bucketed_aggregates 的耗时
+
+用法: python bench_history_aggregate.py [服务器数量] [每台服务器的样本数]
+默认 200 台服务器 x 10080 个样本（一周，每分钟一条）≈ 200 万行
+"""
+import asyncio
+import datetime
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database import Base
+
+SERVERS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+SAMPLES_PER_SERVER = int(sys.argv[2]) if len(sys.argv) > 2 else 10080
+SAMPLE_INTERVAL = 60
+START = datetime.datetime(2024, 1, 1)
+
+
+def _generate(db_path: str):
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO servers (id, name, model, ipmi_host, ipmi_username, ipmi_password, control_mode) VALUES (?, ?, 'r730', '127.0.0.1', 'root', 'calvin', 'auto')",
+        [(server_id, f"bench-{server_id}") for server_id in range(1, SERVERS + 1)],
+    )
+    rng = random.Random(42)
+
+    def rows():
+        for server_id in range(1, SERVERS + 1):
+            base = rng.uniform(35, 60)
+            for i in range(SAMPLES_PER_SERVER):
+                timestamp = START + datetime.timedelta(seconds=i * SAMPLE_INTERVAL)
+                temperature = round(base + 8 * math.sin(i / 180) + rng.gauss(0, 1.5), 1)
+                yield server_id, temperature, timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    conn.executemany("INSERT INTO temperature_history (server_id, temperature, timestamp) VALUES (?, ?, ?)", rows())
+    conn.commit()
+    conn.close()
+
+
+def _nearest_rank_p95(values):
+    ordered = sorted(values)
+    return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+
+async def _run(db_path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    end = START + datetime.timedelta(seconds=SAMPLES_PER_SERVER * SAMPLE_INTERVAL)
+
+    cases = [
+        ("1 server, hourly", [1], 3600),
+        ("10 servers, hourly", list(range(1, 11)), 3600),
+        (f"{min(SERVERS, 100)} servers, daily", list(range(1, min(SERVERS, 100) + 1)), 86400),
+    ]
+    async with session_factory() as db:
+        # 正确性校验：与 Python 端计算的第一个桶对比
+        rows = await crud.get_bucketed_aggregates(db, "temperature", [1], START, end, 3600)
+        conn = sqlite3.connect(db_path)
+        first_bucket = [value for (value,) in conn.execute(
+            "SELECT temperature FROM temperature_history WHERE server_id = 1 AND timestamp < ?",
+            ((START + datetime.timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S.%f"),),
+        )]
+        conn.close()
+        _, _, min_value, max_value, _, count, p95 = rows[0]
+        assert (min_value, max_value, count) == (min(first_bucket), max(first_bucket), len(first_bucket))
+        assert p95 == _nearest_rank_p95(first_bucket)
+
+        for label, server_ids, bucket_seconds in cases:
+            began = time.perf_counter()
+            rows = await crud.get_bucketed_aggregates(db, "temperature", server_ids, START, end, bucket_seconds)
+            elapsed = time.perf_counter() - began
+            scanned = len(server_ids) * SAMPLES_PER_SERVER
+            print(f"{label:<24} {len(rows):6d} buckets  {elapsed * 1000:9.1f} ms  {elapsed / scanned * 1e6:6.2f} us/row")
+    await engine.dispose()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        began = time.perf_counter()
+        _generate(db_path)
+        print(f"generated {SERVERS * SAMPLES_PER_SERVER:,} rows in {time.perf_counter() - began:.1f} s")
+        asyncio.run(_run(db_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+历史数据序列化基准测试
+对比 ORM 实体 + Pydantic 逐行校验 与 Core 列元组 + 快速 JSON 编码 两条路径的单行开销
+"""
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.database import Base
+from app.fastjson import dumps, rows_to_dicts
+
+ROWS = 3600
+ROUNDS = 20
+
+
+async def _prepare(db_path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(models.Server.__table__).values(
+            id=1, name="bench", model="r730", ipmi_host="127.0.0.1",
+            ipmi_username="root", ipmi_password="calvin", control_mode="auto",
+        ))
+        start = datetime.datetime(2024, 1, 1)
+        await conn.execute(insert(models.TemperatureHistory.__table__), [
+            {"server_id": 1, "temperature": 40 + (i % 30) * 0.5, "timestamp": start + datetime.timedelta(seconds=10 * i)}
+            for i in range(ROWS)
+        ])
+    return engine, start, start + datetime.timedelta(seconds=10 * ROWS)
+
+
+def _validate(item):
+    # 兼容 Pydantic v1 (orm_mode) 与 v2 (from_attributes)
+    if hasattr(schemas.TemperatureHistory, "model_validate"):
+        return schemas.TemperatureHistory.model_validate(item, from_attributes=True)
+    return schemas.TemperatureHistory.from_orm(item)
+
+
+async def _orm_path(session_factory, start, end) -> bytes:
+    async with session_factory() as db:
+        history = await crud.get_temperature_history(db, 1, start, end)
+        validated = [_validate(item) for item in history]
+        return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+async def _fast_path(session_factory, start, end) -> bytes:
+    async with session_factory() as db:
+        rows = await crud.get_temperature_history_rows(db, 1, start, end)
+        return dumps(rows_to_dicts(crud.TEMPERATURE_HISTORY_COLUMNS, rows))
+
+
+async def _measure(fn, *args) -> float:
+    await fn(*args)  # 预热
+    began = time.perf_counter()
+    for _ in range(ROUNDS):
+        await fn(*args)
+    return (time.perf_counter() - began) / ROUNDS
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, start, end = await _prepare(os.path.join(tmp, "bench.db"))
+        session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+        orm_body = json.loads(await _orm_path(session_factory, start, end))
+        fast_body = json.loads(await _fast_path(session_factory, start, end))
+        assert orm_body == fast_body, "两条路径的 JSON 输出不一致"
+
+        orm_seconds = await _measure(_orm_path, session_factory, start, end)
+        fast_seconds = await _measure(_fast_path, session_factory, start, end)
+        await engine.dispose()
+
+    print(f"rows per request: {ROWS}")
+    print(f"ORM + Pydantic : {orm_seconds * 1000:8.2f} ms/request  {orm_seconds / ROWS * 1e6:6.2f} us/row")
+    print(f"Core + fastjson: {fast_seconds * 1000:8.2f} ms/request  {fast_seconds / ROWS * 1e6:6.2f} us/row")
+    print(f"speedup        : {orm_seconds / fast_seconds:8.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+ipmitool sensor get 输出解析基准测试
+对比原来各型号的解析方式（R4900G3 每个风扇一个 DOTALL 正则搜索整段输出，R730 逐行 re.search）
+与共用的单遍解析器，分别使用录制的 6 风扇输出和合成的多传感器批量输出
+"""
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from app.controllers.sensor_parser import parse_sensor_get
+
+ROUNDS = 1000
+REPEAT = 7
+
+
+def _legacy_r4900g3(output: str, names: list) -> dict:
+    readings = {}
+    for name in names:
+        match = re.search(f"{name}.*?Sensor Reading\\s*:\\s*([\\d\\.-]+)", output, re.DOTALL)
+        if match:
+            readings[name] = float(match.group(1))
+    return readings
+
+
+def _legacy_r730(output: str) -> dict:
+    readings = {}
+    current = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith('Sensor ID') and 'Fan' in line:
+            sensor_match = re.search(r'Fan\d+', line)
+            if sensor_match:
+                current = sensor_match.group(0)
+        elif line.startswith('Sensor Reading') and current:
+            rpm_match = re.search(r'(\d+)\s*\(\+/-\s*\d+\)\s*RPM', line)
+            if rpm_match:
+                readings[current] = float(rpm_match.group(1))
+                current = None
+    return readings
+
+
+def _shared(output: str, names: list) -> dict:
+    readings = parse_sensor_get(output)
+    return {name: readings[name].value for name in names if name in readings}
+
+
+def _synthetic(fixture: str, first: str, template: str, count: int) -> str:
+    """将录制输出中第一个风扇的段落复制为 count 个风扇的批量 sensor get 输出"""
+    with open(os.path.join(ROOT, "fixtures", "ipmitool", fixture)) as f:
+        block = f.read().split("Sensor ID")[1]
+    return "Locating sensor record...\n" + "".join(
+        "Sensor ID" + block.replace(first, template.format(i)) for i in range(1, count + 1))
+
+
+def _measure(fn, *args) -> float:
+    """取多次测量中最快的一次，减少其他进程的干扰"""
+    fn(*args)  # 预热
+    best = float("inf")
+    for _ in range(REPEAT):
+        began = time.perf_counter()
+        for _ in range(ROUNDS):
+            fn(*args)
+        best = min(best, time.perf_counter() - began)
+    return best / ROUNDS
+
+
+def main():
+    cases = []
+    for count in (6, 48):
+        names = [f"FAN{i}_Speed" for i in range(1, count + 1)]
+        output = _synthetic("r4900g3_sensor_get_fans.txt", "FAN1_Speed", "FAN{}_Speed", count)
+        cases.append((f"R4900G3, {count} fans", output, names, _legacy_r4900g3))
+    for count in (6, 48):
+        names = [f"Fan{i}" for i in range(1, count + 1)]
+        output = _synthetic("r730_sensor_get_fans.txt", "Fan1 (0x30)", "Fan{} (0x30)", count)
+        cases.append((f"R730, {count} fans", output, names, lambda output, names: _legacy_r730(output)))
+
+    for label, output, names, legacy in cases:
+        assert legacy(output, names) == _shared(output, names), f"{label}: results differ"
+        legacy_seconds = _measure(legacy, output, names)
+        shared_seconds = _measure(_shared, output, names)
+        print(f"{label:17}: legacy {legacy_seconds * 1e6:8.1f} us  shared {shared_seconds * 1e6:8.1f} us  "
+              f"speedup {legacy_seconds / shared_seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+多进程部署下采集进程选举与最新读数同步的测试
+不访问 BMC，可直接运行或通过 pytest 执行
+"""
+import datetime
+import os
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from app.services.fleet_stats import FleetStats
+from app.services.latest_table import HEADER_SIZE, LatestTable, _SLOT
+from app.services.leader import CollectorLock
+
+
+def test_only_one_process_holds_collector_lock():
+    """锁被占用时其他进程获取失败；持有者退出后可被接替"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "collector.lock")
+        holder = subprocess.Popen(
+            [sys.executable, "-c",
+             "import fcntl, os, sys, time\n"
+             f"fd = os.open({path!r}, os.O_RDWR | os.O_CREAT)\n"
+             "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+             "print('locked', flush=True)\n"
+             "time.sleep(30)\n"],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            assert holder.stdout.readline().strip() == "locked"
+            lock = CollectorLock(path)
+            assert not lock.try_acquire() and not lock.held
+        finally:
+            holder.kill()
+            holder.wait()
+            holder.stdout.close()
+
+        assert lock.try_acquire() and lock.held
+        with open(path) as f:
+            assert f.read() == str(os.getpid())
+        other = CollectorLock(path)
+        assert not other.try_acquire()
+        lock.release()
+        assert other.try_acquire()
+        other.release()
+
+
+def test_fleet_changes_round_trip_to_api_process():
+    """采集进程取出的变化读数可在另一进程还原出相同的汇总，已删除的服务器被移除"""
+    collector = FleetStats()
+    servers = [SimpleNamespace(id=i, name=f"srv{i}", model="R730") for i in range(1, 4)]
+    for i, server in enumerate(servers):
+        collector.record(server, temperature=40.0 + i, fan_speed=3000 + i * 100)
+    changes = collector.drain_changes()
+    assert sorted(entry["server_id"] for entry in changes) == [1, 2, 3]
+    assert collector.drain_changes() == []
+
+    collector.record(servers[0], temperature=55.0)
+    assert [entry["server_id"] for entry in collector.drain_changes()] == [1]
+
+    rows = [
+        (entry["server_id"], entry["name"], entry["model"], entry["temperature"],
+         entry["average_speed_rpm"], entry["updated_at"])
+        for entry in collector._latest.values()
+    ]
+    follower = FleetStats()
+    follower.record(SimpleNamespace(id=9, name="gone", model="R730"), temperature=90.0)
+    follower.load(rows)
+    assert follower.summary(top_n=3) == collector.summary(top_n=3)
+    assert follower.drain_changes() == []
+
+    # 未变化的读数不会重复计入
+    follower.load(rows)
+    assert follower.summary(top_n=3) == collector.summary(top_n=3)
+
+    stale = datetime.datetime(2000, 1, 1)
+    follower.load([row[:5] + (stale,) for row in rows[:1]])
+    assert [entry["server_id"] for entry in follower.summary(top_n=3)["hottest"]] == [1]
+
+
+def test_shutdown_publishes_buffered_latest_readings():
+    """关闭采集进程时，尚未到发布周期的最新读数也会写入 latest_readings 表"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+        script = (
+            "import asyncio, sqlite3\n"
+            "from types import SimpleNamespace\n"
+            "from app.database import create_tables\n"
+            "from app.services import per_server_scheduler\n"
+            "from app.services.fleet_stats import FLEET\n"
+            "async def main():\n"
+            "    await create_tables()\n"
+            f"    with sqlite3.connect({db_path!r}) as conn:\n"
+            "        conn.execute(\"INSERT INTO servers (id, name, model, ipmi_host, ipmi_username, ipmi_password, \"\n"
+            "                     \"control_mode) VALUES (1, 'srv1', 'R730', 'bmc1', 'u', 'p', 'manual')\")\n"
+            "    per_server_scheduler.SERVER_PIPELINES[1] = None  # 由本进程采集\n"
+            "    FLEET.record(SimpleNamespace(id=1, name='srv1', model='R730'), temperature=47.5, fan_speed=3600)\n"
+            "    await per_server_scheduler.stop_all_loops()\n"
+            "asyncio.run(main())\n"
+        )
+        env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{db_path}",
+                   PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        subprocess.run([sys.executable, "-c", script], cwd=tmp, env=env, check=True, timeout=60)
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute("SELECT server_id, temperature, average_speed_rpm FROM latest_readings").fetchall()
+    assert rows == [(1, 47.5, 3600)]
+
+
+def test_latest_table_shared_between_writer_and_reader():
+    """采集进程写入的读数可被只读映射直接读到；空槽、无效读数和删除都能正确表示"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "latest.bin")
+        assert LatestTable.open_reader(path) is None
+
+        writer = LatestTable(path, capacity=16, writable=True)
+        reader = LatestTable.open_reader(path)
+        assert reader.capacity == 16 and reader.read(3) is None
+
+        now = datetime.datetime(2024, 5, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+        writer.write(3, 47.5, 4200, now)
+        writer.write(5, None, 3100, now)
+        assert reader.read(3) == (47.5, 4200, now)
+        assert reader.read(5) == (None, 3100, now)
+        assert list(reader.items([1, 3, 5, 99])) == [(3, 47.5, 4200, now), (5, None, 3100, now)]
+
+        writer.clear(3)
+        assert reader.read(3) is None
+        try:
+            writer.write(16, 40.0, 3000, now)
+            assert False, "server id beyond capacity must be rejected"
+        except IndexError:
+            pass
+
+        # 重新打开相同容量的表保留已有读数；容量变化时重建文件，旧的读取方能感知到
+        writer.close()
+        writer = LatestTable(path, capacity=16, writable=True)
+        assert not reader.replaced and reader.read(5) == (None, 3100, now)
+        writer.close()
+        writer = LatestTable(path, capacity=32, writable=True)
+        assert reader.replaced
+        reader.close()
+        reader = LatestTable.open_reader(path)
+        assert reader.capacity == 32 and reader.read(5) is None
+        reader.close()
+        writer.close()
+
+
+def test_latest_table_recovers_from_writer_killed_mid_write():
+    """写入方在写入中途退出后，读取方不会无限重试；重启后的写入使序号恢复为偶数，读数恢复"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "latest.bin")
+        now = datetime.datetime(2024, 5, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+        writer = LatestTable(path, capacity=16, writable=True)
+        writer.write(3, 47.5, 4200, now)
+        writer.write(3, 48.0, 4300, now)
+        # 模拟第三次写入只完成了第一步（序号标记为写入中）时进程被终止
+        offset = HEADER_SIZE + 3 * _SLOT.size
+        struct.pack_into("<I", writer._view, offset, 5)
+        writer.close()
+
+        reader = LatestTable.open_reader(path)
+        assert reader.read(3) is None
+
+        writer = LatestTable(path, capacity=16, writable=True)  # 采集进程重启，文件保留
+        writer.write(3, 49.0, 4400, now)
+        assert _SLOT.unpack_from(writer._view, offset)[0] == 6
+        assert reader.read(3) == (49.0, 4400, now)
+        writer.write(3, 50.0, 4500, now)
+        assert reader.read(3) == (50.0, 4500, now)
+
+        # 序号回绕时同样保持偶数
+        struct.pack_into("<I", writer._view, offset, 0xFFFFFFFE)
+        writer.write(3, 51.0, 4600, now)
+        assert _SLOT.unpack_from(writer._view, offset)[0] == 0 and reader.read(3) == (51.0, 4600, now)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+控制器实例注册表测试
+不访问 BMC，可直接运行或通过 pytest 执行
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import models
+from app.controllers import factory
+from app.controllers.factory import UnsupportedModelError, get_controller, remove_controller
+from app.controllers.r4900g3 import R4900G3Controller
+from app.controllers.r730 import R730Controller
+
+
+def _server(**overrides) -> models.Server:
+    fields = dict(id=1, name="srv1", model="R730", ipmi_host="10.0.0.1", ipmi_username="root", ipmi_password="calvin")
+    fields.update(overrides)
+    return models.Server(**fields)
+
+
+def test_controller_is_reused_until_connection_changes():
+    """同一台服务器复用控制器并更新其服务器信息；型号或凭据变化时重建，删除后释放"""
+    closed = []
+    try:
+        first = get_controller(_server())
+        first.close = lambda: closed.append("first")
+        renamed = _server(name="renamed")
+        assert get_controller(renamed) is first and first.server is renamed
+        assert isinstance(first, R730Controller)
+
+        rebuilt = get_controller(_server(ipmi_password="changed"))
+        assert rebuilt is not first and closed == ["first"]
+        rebuilt.close = lambda: closed.append("rebuilt")
+
+        other_model = get_controller(_server(model="R4900G3", ipmi_password="changed"))
+        assert isinstance(other_model, R4900G3Controller) and closed == ["first", "rebuilt"]
+        assert get_controller(_server(id=2)) is not other_model
+
+        remove_controller(1)
+        assert 1 not in factory._REGISTRY
+        remove_controller(1)  # 重复释放不报错
+        assert get_controller(_server(model="R4900G3", ipmi_password="changed")) is not other_model
+
+        try:
+            get_controller(_server(id=3, model="unknown"))
+            assert False, "unsupported model must raise"
+        except UnsupportedModelError:
+            pass
+        assert 3 not in factory._REGISTRY
+    finally:
+        factory._REGISTRY.clear()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
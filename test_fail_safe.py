@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+故障安全模式测试：连续读取温度失败达到次数后进入故障安全模式（两种处理方式），读数恢复后退出，
+进入/退出记录写入 fail_safe_events 表；故障安全模式缩短采样间隔但不缩短 IPMI 时间预算
+不访问 BMC，使用临时 SQLite 数据库，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models  # noqa: F401  注册所有表
+from app.controllers import factory, ipmi
+from app.controllers.base import BaseServerController
+from app.database import Base
+from app.services import per_server_scheduler, sampling
+from app.services.sampling import SamplingPipeline
+
+
+class ScriptedController(BaseServerController):
+    """按脚本返回温度（None 表示读取失败），记录风扇命令和读取温度时剩余的 IPMI 时间预算"""
+    temperatures = []
+    calls = []
+    budgets = []
+
+    async def _get_temperature_from_ipmi(self) -> float:
+        ScriptedController.budgets.append(ipmi._DEADLINE.get() - time.monotonic())
+        temperature = ScriptedController.temperatures.pop(0)
+        return -1.0 if temperature is None else temperature
+
+    async def _get_fan_speed_from_ipmi(self) -> int:
+        return 3600
+
+    async def set_fan_speed(self, speed: int):
+        ScriptedController.calls.append(("set", speed))
+
+    async def take_over_fan_control(self):
+        ScriptedController.calls.append(("take_over",))
+
+    async def return_fan_control_to_system(self) -> bool:
+        ScriptedController.calls.append(("return",))
+        return True
+
+
+def _run(action: str, temperatures: list):
+    """按给定的温度序列逐次采样，返回每次采样后的 (是否处于故障安全模式, 采样间隔)、风扇命令、时间预算和事件记录"""
+    ScriptedController.temperatures = list(temperatures)
+    ScriptedController.calls = []
+    ScriptedController.budgets = []
+    saved = (per_server_scheduler.FAIL_SAFE_ACTION, per_server_scheduler.AsyncSessionLocal, sampling.AsyncSessionLocal)
+    factory.CONTROLLER_MAP["scripted"] = ScriptedController
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "app.db")
+
+            async def main():
+                engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                    await conn.exec_driver_sql(
+                        "INSERT INTO servers (id, name, model, ipmi_host, ipmi_username, ipmi_password, control_mode) "
+                        "VALUES (1, 'srv1', 'scripted', 'bmc1', 'u', 'p', 'auto')")
+                    await conn.exec_driver_sql(
+                        "INSERT INTO fan_curves (server_id, points) "
+                        "VALUES (1, '[{\"temp\": 30, \"speed\": 20}, {\"temp\": 80, \"speed\": 100}]')")
+                session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+                per_server_scheduler.FAIL_SAFE_ACTION = action
+                per_server_scheduler.AsyncSessionLocal = session_factory
+                sampling.AsyncSessionLocal = session_factory
+                states = []
+                try:
+                    async with session_factory() as db:
+                        server = await crud.get_server(db, 1)
+                    pipeline = SamplingPipeline(server, [per_server_scheduler.ControlStage(error_delay=30)], interval=10)
+                    stage = pipeline.stage("control")
+                    for _ in temperatures:
+                        await pipeline.run_once()
+                        states.append((stage.in_fail_safe, pipeline.interval))
+                finally:
+                    await engine.dispose()
+                return states
+
+            states = asyncio.run(main())
+            with sqlite3.connect(db_path) as conn:
+                events = conn.execute(
+                    "SELECT action, failures, exited_at IS NOT NULL FROM fail_safe_events ORDER BY id").fetchall()
+    finally:
+        per_server_scheduler.FAIL_SAFE_ACTION, per_server_scheduler.AsyncSessionLocal, sampling.AsyncSessionLocal = saved
+        per_server_scheduler._FAN_CONTROL_TAKEN.pop(1, None)
+        factory.remove_controller(1)
+        del factory.CONTROLLER_MAP["scripted"]
+    return states, ScriptedController.calls, ScriptedController.budgets, events
+
+
+def test_safe_speed_after_consecutive_failures_and_recovery():
+    """第 N 次连续失败时设为安全转速并缩短采样间隔，期间每次失败都重设安全转速；读数恢复后退出并按曲线控制"""
+    failures = per_server_scheduler.FAIL_SAFE_READ_FAILURES
+    speed = per_server_scheduler.FAIL_SAFE_FAN_SPEED
+    recheck = per_server_scheduler.FAIL_SAFE_RECHECK_INTERVAL
+    states, calls, budgets, events = _run("safe_speed", [55.0] + [None] * (failures + 1) + [55.0])
+
+    assert states[:failures] == [(False, 10)] * failures
+    assert states[failures:failures + 2] == [(True, recheck)] * 2
+    assert states[-1] == (False, 10)
+    assert calls == [("take_over",), ("set", 60), ("set", speed), ("set", speed), ("set", 60)]
+    assert events == [("safe_speed", failures, 1)]
+    # 故障安全模式下采样间隔缩短为 3 秒，但读取温度的时间预算仍按正常间隔计算（10 秒的 80%）
+    assert min(budgets) > 7
+
+
+def test_return_to_bmc_after_consecutive_failures_and_recovery():
+    """return_to_bmc 时交还 BMC 控制且期间不再写风扇；读数恢复后重新接管"""
+    failures = per_server_scheduler.FAIL_SAFE_READ_FAILURES
+    states, calls, _, events = _run("return_to_bmc", [55.0] + [None] * (failures + 1) + [55.0])
+
+    assert [state[0] for state in states] == [False] * failures + [True, True, False]
+    assert calls == [("take_over",), ("set", 60), ("return",), ("take_over",), ("set", 60)]
+    assert events == [("return_to_bmc", failures, 1)]
+
+
+def test_intermittent_failures_reset_the_count():
+    """失败次数只计连续失败，中间一次成功读数即清零"""
+    failures = per_server_scheduler.FAIL_SAFE_READ_FAILURES
+    temperatures = ([None] * (failures - 1) + [55.0]) * 2
+    states, _, _, events = _run("safe_speed", temperatures)
+    assert not any(in_fail_safe for in_fail_safe, _ in states)
+    assert events == []
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+BMC 优先级命令队列测试
+不依赖数据库和 IPMI，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.controllers import ipmi
+from app.controllers.ipmi import BMCQueue, CircuitBreaker, PRIORITY_API, PRIORITY_CONTROL, PRIORITY_METRICS
+
+
+async def _command(queue: BMCQueue, priority: int, label: str, order: list, hold: float = 0.01):
+    await queue.acquire(priority)
+    try:
+        order.append(label)
+        await asyncio.sleep(hold)
+    finally:
+        queue.release()
+
+
+def test_control_runs_before_queued_reads():
+    """同一 BMC 上排队的命令按 control > metrics > api 的顺序执行，并遵守并发上限"""
+    async def main():
+        queue = BMCQueue("bmc", max_in_flight=1)
+        order = []
+        first = asyncio.create_task(_command(queue, PRIORITY_API, "busy", order, hold=0.05))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(_command(queue, PRIORITY_API, f"api{i}", order)) for i in range(3)]
+        tasks.append(asyncio.create_task(_command(queue, PRIORITY_METRICS, "metrics", order)))
+        tasks.append(asyncio.create_task(_command(queue, PRIORITY_CONTROL, "control", order)))
+        await asyncio.sleep(0)
+        assert queue.in_flight == 1 and queue.queued == 5
+        await asyncio.gather(first, *tasks)
+        return order, queue
+
+    order, queue = asyncio.run(main())
+    assert order == ["busy", "control", "metrics", "api0", "api1", "api2"]
+    assert queue.in_flight == 0 and queue.queued == 0
+
+
+def test_aging_prevents_starvation():
+    """等待足够久的低优先级命令会排到新到的高优先级命令之前"""
+    async def main():
+        ipmi.AGING_SECONDS = 0.05
+        queue = BMCQueue("bmc", max_in_flight=1)
+        order = []
+        first = asyncio.create_task(_command(queue, PRIORITY_CONTROL, "busy", order, hold=0.15))
+        await asyncio.sleep(0)
+        api = asyncio.create_task(_command(queue, PRIORITY_API, "api", order))
+        await asyncio.sleep(0.14)
+        control = asyncio.create_task(_command(queue, PRIORITY_CONTROL, "control", order))
+        await asyncio.gather(first, api, control)
+        return order
+
+    aging = ipmi.AGING_SECONDS
+    try:
+        order = asyncio.run(main())
+    finally:
+        ipmi.AGING_SECONDS = aging
+    assert order == ["busy", "api", "control"]
+
+
+def test_cancelled_waiter_releases_its_place():
+    """排队中被取消的命令不占用名额，后续命令照常执行"""
+    async def main():
+        queue = BMCQueue("bmc", max_in_flight=1)
+        order = []
+        first = asyncio.create_task(_command(queue, PRIORITY_METRICS, "busy", order, hold=0.03))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(_command(queue, PRIORITY_CONTROL, "cancelled", order))
+        waiting = asyncio.create_task(_command(queue, PRIORITY_API, "api", order))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(first, waiting)
+        return order, queue
+
+    order, queue = asyncio.run(main())
+    assert order == ["busy", "api"]
+    assert queue.in_flight == 0 and queue.queued == 0
+
+
+def test_bmc_limit_adapts_aimd():
+    """有排队时上限逐步放大，变慢或出错时减半，且不超出 [BMC_MIN_LIMIT, BMC_MAX_LIMIT]"""
+    async def main():
+        queue = BMCQueue("bmc")
+        order = []
+        await queue.acquire(PRIORITY_METRICS)
+        waiting = [asyncio.create_task(_command(queue, PRIORITY_METRICS, f"m{i}", order, hold=0.05)) for i in range(6)]
+        await asyncio.sleep(0)
+
+        queue.record(0.1, "ok")
+        assert queue.limit == 2
+        await asyncio.sleep(0)
+        assert queue.in_flight == 2  # 放大后立即放行一条排队命令
+        for _ in range(20):
+            queue.record(0.1, "ok")
+        assert queue.limit == ipmi.BMC_MAX_LIMIT
+
+        queue.record(ipmi.LATENCY_TARGET * 20, "ok")
+        assert queue.limit == ipmi.BMC_MAX_LIMIT // 2
+        queue.record(ipmi.LATENCY_TARGET * 20, "failed")
+        assert queue.limit == ipmi.BMC_MAX_LIMIT // 2  # 冷却期内不会连续减半
+
+        queue.release()
+        await asyncio.gather(*waiting)
+        for _ in range(20):
+            queue.record(0.1, "ok")  # 空闲时不放大
+        return queue
+
+    queue = asyncio.run(main())
+    assert queue.limit == ipmi.BMC_MAX_LIMIT // 2
+    assert queue.in_flight == 0
+
+
+def test_circuit_breaker_opens_probes_and_recovers():
+    """连续失败后熔断并拒绝命令，退避结束只放行一条探测命令，探测失败时退避时间加倍"""
+    breaker = CircuitBreaker()
+    for _ in range(ipmi.CIRCUIT_FAILURE_THRESHOLD - 1):
+        assert breaker.allow()
+        assert breaker.record(False) is None
+    assert breaker.allow()
+    assert breaker.record(False) == CircuitBreaker.OPEN
+    first_backoff = breaker.retry_at - time.monotonic()
+    assert not breaker.allow() and breaker.rejected == 1
+
+    breaker.retry_at = 0.0
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # 探测命令执行期间拒绝其他命令
+    assert breaker.record(False) == CircuitBreaker.OPEN
+    assert breaker.retry_at - time.monotonic() > first_backoff * (1 - ipmi.CIRCUIT_JITTER) / (1 + ipmi.CIRCUIT_JITTER) * 2 - 0.1
+
+    breaker.retry_at = 0.0
+    assert breaker.allow()
+    breaker.abandon()  # 探测命令被取消后可以重新探测
+    assert breaker.allow()
+    assert breaker.record(True) == CircuitBreaker.CLOSED
+    assert breaker.failures == 0 and breaker.opens == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_deadline_kills_hung_command():
+    """超过截止时间的命令被终止并回收，计为超时而不是失败"""
+    async def main(bin_dir):
+        server = SimpleNamespace(name="hung", ipmi_host="hung-bmc", ipmi_username="u", ipmi_password="p")
+        pid_file = os.path.join(bin_dir, "pid")
+        began = time.monotonic()
+        with ipmi.ipmi_deadline(0.3):
+            result = await ipmi.run_ipmi_command(server, pid_file)
+        elapsed = time.monotonic() - began
+        with open(pid_file) as f:
+            pid = int(f.read())
+        return result, elapsed, pid, ipmi.get_queue("hung-bmc").outcomes
+
+    with tempfile.TemporaryDirectory() as bin_dir:
+        script = os.path.join(bin_dir, "ipmitool")
+        with open(script, "w") as f:
+            f.write('#!/bin/sh\nfor last; do :; done\necho $$ > "$last"\nexec sleep 30\n')
+        os.chmod(script, 0o755)
+        path = os.environ["PATH"]
+        os.environ["PATH"] = bin_dir + os.pathsep + path
+        try:
+            result, elapsed, pid, outcomes = asyncio.run(main(bin_dir))
+        finally:
+            os.environ["PATH"] = path
+
+    assert result is None
+    assert elapsed < 1.0
+    assert outcomes == {"ok": 0, "failed": 0, "timeout": 1}
+    try:
+        os.kill(pid, 0)
+        alive = True
+    except ProcessLookupError:
+        alive = False
+    assert not alive
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
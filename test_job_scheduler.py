@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+集中式周期任务调度器测试
+不依赖数据库和 IPMI，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.job_scheduler import PeriodicScheduler
+
+
+def test_many_jobs_share_bounded_workers():
+    """数千个任务由固定数量的工作协程执行，不为每个任务创建常驻协程"""
+    async def main():
+        scheduler = PeriodicScheduler(workers=8)
+        runs = {}
+
+        def make_job(i):
+            async def job():
+                runs[i] = runs.get(i, 0) + 1
+                await asyncio.sleep(0)
+            return job
+
+        scheduler.start()
+        for i in range(2000):
+            scheduler.add(("job", i), make_job(i), interval=0.2)
+        tasks_before = len(asyncio.all_tasks())
+        await asyncio.sleep(0.7)
+        snapshot = scheduler.snapshot()
+        scheduler.stop()
+        return runs, snapshot, tasks_before
+
+    runs, snapshot, tasks_before = asyncio.run(main())
+    assert len(runs) == 2000
+    assert min(runs.values()) >= 2
+    assert snapshot["jobs"] == 2000
+    assert tasks_before <= 8 + 1 + 1  # 工作协程 + 调度协程 + 主协程
+
+
+def test_period_does_not_drift_with_run_time():
+    """截止时间按周期推进，执行耗时不累积为周期漂移"""
+    async def main():
+        scheduler = PeriodicScheduler(workers=2)
+        started = []
+
+        async def job():
+            started.append(time.monotonic())
+            await asyncio.sleep(0.05)
+
+        scheduler.start()
+        scheduler.add("job", job, interval=0.1, delay=0)
+        await asyncio.sleep(0.55)
+        scheduler.stop()
+        return started
+
+    started = asyncio.run(main())
+    periods = [b - a for a, b in zip(started, started[1:])]
+    assert len(started) >= 5
+    assert all(abs(period - 0.1) < 0.03 for period in periods), periods
+
+
+def test_returned_delay_and_error_delay():
+    async def main():
+        scheduler = PeriodicScheduler(workers=2)
+        calls = []
+
+        async def failing():
+            calls.append("fail")
+            raise RuntimeError("boom")
+
+        async def delayed():
+            calls.append("delay")
+            return 10
+
+        scheduler.start()
+        scheduler.add("fail", failing, interval=0.05, error_delay=10, delay=0)
+        scheduler.add("delay", delayed, interval=0.05, delay=0)
+        await asyncio.sleep(0.3)
+        scheduler.stop()
+        return calls
+
+    calls = asyncio.run(main())
+    assert calls.count("fail") == 1
+    assert calls.count("delay") == 1
+
+
+def test_cancel_stops_running_job():
+    async def main():
+        scheduler = PeriodicScheduler(workers=2)
+        state = {"cancelled": False}
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        scheduler.start()
+        scheduler.add("slow", slow, interval=1, delay=0)
+        await asyncio.sleep(0.05)
+        job = await scheduler.cancel("slow")
+        snapshot = scheduler.snapshot()
+        scheduler.stop()
+        return job, state, snapshot
+
+    job, state, snapshot = asyncio.run(main())
+    assert job is not None and job.cancelled
+    assert state["cancelled"]
+    assert snapshot["jobs"] == 0
+
+
+def test_overrun_skips_ticks_and_records_histograms():
+    """执行超出周期时跳过错过的周期，并记录迟到与耗时分布"""
+    async def main():
+        scheduler = PeriodicScheduler(workers=1)
+        started = []
+
+        async def slow():
+            started.append(time.monotonic())
+            await asyncio.sleep(0.25 if len(started) == 1 else 0)
+
+        scheduler.start()
+        job = scheduler.add("slow", slow, interval=0.1, delay=0)
+        await asyncio.sleep(0.45)
+        stats = job.stats()
+        scheduler.stop()
+        return started, stats
+
+    started, stats = asyncio.run(main())
+    # 第一次执行耗时 0.25 秒，跨过了 0.1 和 0.2 两个截止时间，下一次在 0.3 执行
+    assert stats["skipped_ticks"] == 2
+    assert abs(started[1] - started[0] - 0.3) < 0.03
+    assert stats["duration"]["count"] == stats["runs"] >= 2
+    assert stats["duration"]["max"] >= 0.25
+    assert stats["lateness"]["count"] == stats["runs"]
+
+
+def test_shutdown_waits_for_running_jobs_within_grace():
+    """关闭时进行中的执行在宽限期内正常完成，超出宽限期的被取消，且不再开始新的执行"""
+    async def main():
+        scheduler = PeriodicScheduler(workers=4)
+        finished, cancelled = [], []
+
+        def make_job(name, duration):
+            async def job():
+                try:
+                    await asyncio.sleep(duration)
+                    finished.append(name)
+                except asyncio.CancelledError:
+                    cancelled.append(name)
+                    raise
+            return job
+
+        scheduler.start()
+        scheduler.add("short", make_job("short", 0.1), interval=0.05, delay=0)
+        scheduler.add("long", make_job("long", 5), interval=0.05, delay=0)
+        await asyncio.sleep(0.02)
+        began = time.monotonic()
+        await scheduler.shutdown(grace=0.3)
+        elapsed = time.monotonic() - began
+        await asyncio.sleep(0.2)
+        return finished, cancelled, elapsed, scheduler
+
+    finished, cancelled, elapsed, scheduler = asyncio.run(main())
+    assert finished == ["short"]
+    assert cancelled == ["long"]
+    assert 0.25 < elapsed < 1.0
+    assert not scheduler.started and scheduler.snapshot()["jobs"] == 0
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
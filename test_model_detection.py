@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+型号自动识别测试：解析录制的 mc info / fru 输出并匹配型号配置，批量识别时的并发上限与探测结果缓存，
+批量添加时单台失败不影响其他服务器
+不访问 BMC，使用临时 SQLite 数据库，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models  # noqa: F401  注册所有表
+from app.controllers import detect
+from app.controllers.profile import ModelProfile, ProfileError
+from app.database import Base
+from app.services import model_detection
+
+FIXTURES = os.path.join(ROOT, "fixtures", "ipmitool")
+
+
+def _fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def _identity(model: str) -> detect.DeviceIdentity:
+    manufacturer_id, product_id = detect.parse_mc_info(_fixture(f"{model}_mc_info.txt"))
+    return detect.DeviceIdentity(manufacturer_id, product_id, detect.parse_fru_product(_fixture(f"{model}_fru.txt")))
+
+
+def test_recorded_bmcs_match_their_profiles():
+    """录制的 mc info / fru 输出各自只匹配对应型号；未知厂商或产品名称不匹配任何型号"""
+    assert _identity("r730") == detect.DeviceIdentity(674, 256, "PowerEdge R730")
+    assert _identity("r4900g3") == detect.DeviceIdentity(25506, 1, "UniServer R4900 G3")
+    assert detect.match_models(_identity("r730")) == ["R730"]
+    assert detect.match_models(_identity("r4900g3")) == ["R4900G3"]
+    assert detect.match_models(detect.DeviceIdentity(674, 256, "PowerEdge R640")) == []
+    assert detect.match_models(detect.DeviceIdentity(11, 8192, "ProLiant DL380 Gen9")) == []
+    assert detect.parse_mc_info("Device ID : 32\n") is None
+
+
+def test_invalid_detect_rule_is_rejected():
+    spec = {
+        "model": "X", "temperature": {"sensors": ["T"], "aggregate": "max"},
+        "fans": {"sensors": ["F"], "aggregate": "mean"},
+        "fan_control": {"encoding": "percent", "set_speed": ["raw", "{speed}"]},
+    }
+    for detect_spec in ({"product_name": "X"}, {"manufacturer_id": 674, "product_ids": []},
+                        {"manufacturer_id": 674, "product_name": "("}, {"manufacturer_id": 674, "vendor": "DELL"}):
+        try:
+            ModelProfile(dict(spec, detect=detect_spec), "x.json")
+        except ProfileError:
+            continue
+        raise AssertionError(f"accepted invalid detect rule {detect_spec}")
+    assert ModelProfile(dict(spec, detect={"manufacturer_id": 674}), "x.json").detect.matches(674, None, "")
+
+
+def test_bulk_detection_is_bounded_and_cached():
+    """批量识别并发探测但不超过上限；同一 BMC 只探测一次，结果缓存后不再探测，refresh 时重新探测"""
+    recorded = {"r730": _identity("r730"), "r4900g3": _identity("r4900g3")}
+    probes = []
+    active = SimpleNamespace(now=0, peak=0)
+
+    async def fake_probe(server):
+        probes.append(server.ipmi_host)
+        active.now += 1
+        active.peak = max(active.peak, active.now)
+        await asyncio.sleep(0.01)
+        active.now -= 1
+        if server.ipmi_host.startswith("down"):
+            return None
+        return recorded[server.ipmi_host.split("-")[0]]
+
+    servers = [SimpleNamespace(name=f"srv{i}", ipmi_host=f"{('r730', 'r4900g3')[i % 2]}-{i}") for i in range(40)]
+    servers.append(SimpleNamespace(name="srv-shared", ipmi_host="r730-0"))
+    servers.append(SimpleNamespace(name="srv-down", ipmi_host="down-1"))
+
+    saved = model_detection.probe_identity, model_detection.PROBE_CONCURRENCY
+    model_detection.probe_identity, model_detection.PROBE_CONCURRENCY = fake_probe, 4
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "app.db")
+
+            async def main():
+                engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+                try:
+                    async with session_factory() as db:
+                        first = await model_detection.detect_models(db, servers)
+                    probed_first = len(probes)
+                    async with session_factory() as db:
+                        second = await model_detection.detect_models(db, servers)
+                    probed_second = len(probes) - probed_first
+                    async with session_factory() as db:
+                        await model_detection.detect_models(db, servers[:3], refresh=True)
+                    return first, second, probed_first, probed_second
+                finally:
+                    await engine.dispose()
+
+            first, second, probed_first, probed_second = asyncio.run(main())
+            with sqlite3.connect(db_path) as conn:
+                assert conn.execute("SELECT COUNT(*) FROM bmc_identities").fetchone() == (40,)
+    finally:
+        model_detection.probe_identity, model_detection.PROBE_CONCURRENCY = saved
+
+    assert probed_first == 41  # 40 台可达的 BMC + 1 台不可达，共享 BMC 的服务器不重复探测
+    assert active.peak == 4
+    assert first[0] == ("R730", None) and first[1] == ("R4900G3", None) and first[40] == ("R730", None)
+    assert first[41][0] is None and "down-1" in first[41][1]
+    assert second == first
+    assert probed_second == 1  # 只有不可达的 BMC 会再次探测
+    assert len(probes) == 41 + 1 + 3
+
+
+def test_bulk_create_reports_name_taken_concurrently():
+    """名称检查之后才被其他请求占用的名称只使该服务器失败，其余服务器照常添加"""
+    from app import crud, schemas
+    from app.api import servers as servers_api
+
+    def server(name: str):
+        return schemas.ServerCreate(name=name, model="R730", ipmi_host=f"bmc-{name}", ipmi_username="u",
+                                    ipmi_password="p")
+
+    async def no_existing_names(db, names):
+        return set()  # 模拟检查时名称尚未被占用
+
+    saved = crud.get_existing_server_names
+    crud.get_existing_server_names = no_existing_names
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "app.db")
+
+            async def main():
+                engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+                try:
+                    async with session_factory() as db:
+                        await crud.create_server(db, server("srv2"))
+                    async with session_factory() as db:
+                        return await servers_api.create_servers([server("srv1"), server("srv2"), server("srv3")],
+                                                                db=db)
+                finally:
+                    await engine.dispose()
+
+            results = asyncio.run(main())
+            with sqlite3.connect(db_path) as conn:
+                names = [row[0] for row in conn.execute("SELECT name FROM servers ORDER BY id")]
+    finally:
+        crud.get_existing_server_names = saved
+
+    assert [(result.name, result.server is not None, result.error) for result in results] == [
+        ("srv1", True, None),
+        ("srv2", False, "Server with this name already registered"),
+        ("srv3", True, None),
+    ]
+    assert names == ["srv2", "srv1", "srv3"]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+型号配置测试：配置校验，以及各型号控制器对录制的 ipmitool 输出的黄金输出 (fixtures/golden/<型号>.json)。
+黄金输出包含执行的全部命令和返回值；行为有意变化时用 UPDATE_GOLDEN=1 重新生成后检查差异。
+不访问 BMC 和数据库，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from app.controllers import sensor_catalog
+from app.controllers.factory import CONTROLLER_MAP
+from app.controllers.profile import PROFILES, ModelProfile, ProfileController, ProfileError, load_profiles
+
+FIXTURES = os.path.join(ROOT, "fixtures", "ipmitool")
+GOLDEN = os.path.join(ROOT, "fixtures", "golden")
+
+# 每个型号的模拟 BMC：命令 -> 录制的输出文件
+RECORDINGS = {
+    "r730": {
+        "sensor": "r730_sensor.txt",
+        "sdr elist full": "r730_sdr_elist.txt",
+        "sdr type Temperature": "r730_sdr_type_temperature.txt",
+        "sensor get Fan1 Fan2 Fan3 Fan4 Fan5 Fan6": "r730_sensor_get_fans.txt",
+    },
+    "r4900g3": {
+        "sensor get CPU1_Temp CPU2_Temp": "r4900g3_sensor_get_temps.txt",
+        "sensor get FAN1_Speed FAN2_Speed FAN3_Speed FAN4_Speed FAN5_Speed FAN6_Speed": "r4900g3_sensor_get_fans.txt",
+    },
+}
+
+
+def _fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def _replay(model: str) -> dict:
+    """对录制的输出依次执行控制器的各个操作，返回执行的命令和结果"""
+    responses = {command: _fixture(name) for command, name in RECORDINGS[model].items()}
+    commands = []
+
+    class Replayed(CONTROLLER_MAP[model]):
+        async def _run_ipmi_command(self, *args):
+            if args[:1] == ("-S",):
+                args = ("-S", "<sdr-cache>") + args[2:]
+            commands.append(" ".join(args))
+            if args[:2] == ("sdr", "dump"):
+                open(args[2], "w").close()
+                return ""
+            if args[:2] == ("-S", "<sdr-cache>"):
+                args = args[2:]
+            return responses.get(" ".join(args), "" if args[0] == "raw" else None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor_catalog.SDR_CACHE_DIR, saved = tmp, sensor_catalog.SDR_CACHE_DIR
+        try:
+            controller = Replayed(SimpleNamespace(id=None, name=model, ipmi_host="10.0.0.7"))
+
+            async def main():
+                results = {"temperature": await controller.get_temperature()}
+                if controller._catalog_task is not None:
+                    await controller._catalog_task  # 首次读数时在后台扫描的传感器目录
+                results["fan_speed"] = await controller.get_fan_speed()
+                results["temperature_again"] = await controller.get_temperature()
+                await controller.take_over_fan_control()
+                await controller.set_fan_speed(37)
+                await controller.set_fan_speed(100)
+                results["returned"] = await controller.return_fan_control_to_system()
+                return results
+
+            results = asyncio.run(main())
+        finally:
+            sensor_catalog.SDR_CACHE_DIR = saved
+    return {"results": results, "commands": [command.replace(tmp, "<sdr-dir>") for command in commands]}
+
+
+def test_models_match_golden_output():
+    """每个型号对录制输出执行的命令和得到的结果与黄金输出一致"""
+    assert set(RECORDINGS) == set(PROFILES)
+    for model in RECORDINGS:
+        actual = _replay(model)
+        path = os.path.join(GOLDEN, f"{model}.json")
+        if os.environ.get("UPDATE_GOLDEN"):
+            os.makedirs(GOLDEN, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(actual, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+        with open(path) as f:
+            assert actual == json.load(f), f"{model} differs from {path}"
+
+
+def _valid_spec() -> dict:
+    return {
+        "model": "X1",
+        "temperature": {"sensors": ["CPU_Temp"], "aggregate": "max"},
+        "fans": {"match": "FAN\\d", "aggregate": "mean"},
+        "fan_control": {"encoding": "byte", "fans": [0, 1], "set_speed": ["raw", "0x01", "{fan}", "{speed}"],
+                        "take_over": [["raw", "0x02"]], "return_to_system": None},
+    }
+
+
+def test_profiles_are_validated_at_load_time():
+    """无效的配置在加载时报错，并指出出错的文件和字段"""
+    profile = ModelProfile(_valid_spec(), "x1.json")
+    assert profile.plan_set_speed(50) == [("raw", "0x01", "0x00", "0x7f"), ("raw", "0x01", "0x01", "0x7f")]
+    assert profile.fans.matches("FAN3") and not profile.fans.matches("FAN10")
+
+    broken = [
+        (lambda spec: spec.pop("model"), "model is required"),
+        (lambda spec: spec.update(vendor="x"), "unknown key(s) ['vendor']"),
+        (lambda spec: spec["temperature"].update(aggregate="median"), "temperature.aggregate"),
+        (lambda spec: spec["fans"].update(match="FAN("), "invalid fans.match"),
+        (lambda spec: spec["temperature"].pop("sensors"), "temperature needs sensors or match"),
+        (lambda spec: spec["temperature"].update(sensors="CPU_Temp"), "temperature.sensors must be a list"),
+        (lambda spec: spec["fans"].update(ignore_zero="false"), "fans.ignore_zero must be true or false"),
+        (lambda spec: spec["fan_control"].update(encoding="hex"), "fan_control.encoding"),
+        (lambda spec: spec["fan_control"].update(set_speed=["raw", "{fan}"]), "must contain {speed}"),
+        (lambda spec: spec["fan_control"].pop("fans"), "unknown placeholder(s) ['fan']"),
+        (lambda spec: spec["fan_control"].update(fans=[256]), "fan_control.fans"),
+        (lambda spec: spec["fan_control"].update(take_over=[["raw", "{speed}"]]), "unknown placeholder(s)"),
+    ]
+    for mutate, message in broken:
+        spec = _valid_spec()
+        mutate(spec)
+        try:
+            ModelProfile(spec, "x1.json")
+            assert False, f"expected ProfileError: {message}"
+        except ProfileError as e:
+            assert str(e).startswith("x1.json") and message in str(e), str(e)
+
+
+def test_new_model_needs_only_a_profile():
+    """目录中的每个配置都能加载为控制器，重复的型号会被拒绝"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "x1.json"), "w") as f:
+            json.dump(_valid_spec(), f)
+        profiles = load_profiles(tmp)
+        assert list(profiles) == ["x1"]
+        with open(os.path.join(tmp, "x1-copy.json"), "w") as f:
+            json.dump(_valid_spec(), f)
+        try:
+            load_profiles(tmp)
+            assert False, "duplicate model must be rejected"
+        except ProfileError as e:
+            assert "duplicate model" in str(e)
+
+    assert all(issubclass(cls, ProfileController) and cls.profile is PROFILES[key]
+               for key, cls in CONTROLLER_MAP.items())
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
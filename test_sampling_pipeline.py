@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+采样管道测试：单个处理阶段的异常（prepare 或 process）不影响同一次采样中的其他阶段，
+采样失败的服务器不阻塞启动就绪，故障安全配置在启动时校验，自适应采样间隔的调整规则
+不访问 BMC，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas  # noqa: F401  注册所有表
+from app.controllers.factory import UnsupportedModelError, remove_controller
+from app.database import Base
+from app.services import per_server_scheduler, sampling
+from app.services.sampling import AdaptivePolling, PipelineStage, SamplingPipeline
+
+
+class RecordingStage(PipelineStage):
+    needs_temperature = False
+
+    def __init__(self, name: str, fail_in: str = "", **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.fail_in = fail_in
+        self.processed = 0
+
+    async def prepare(self, server):
+        if self.fail_in == "prepare":
+            raise RuntimeError("database is locked")
+
+    async def process(self, snapshot, controller):
+        if self.fail_in == "process":
+            raise RuntimeError("BMC went away")
+        self.processed += 1
+
+
+def test_failing_stage_does_not_abort_sample():
+    """prepare 或 process 失败的阶段进入退避，其余阶段照常处理同一次采样"""
+    server = SimpleNamespace(id=None, name="srv1", model="R730", ipmi_host="bmc1", ipmi_username="u",
+                             ipmi_password="p", fan_curves=[])
+    broken_prepare = RecordingStage("control", fail_in="prepare", error_delay=30)
+    broken_process = RecordingStage("fleet", fail_in="process", error_delay=30)
+    history = RecordingStage("history")
+    pipeline = SamplingPipeline(server, [broken_prepare, broken_process, history], interval=10)
+
+    asyncio.run(pipeline._sample(server, 0))
+    assert history.processed == 1
+    assert broken_prepare.processed == 0  # 退避期间不再处理
+    assert not broken_prepare.is_due(server, 1, 10) and not broken_process.is_due(server, 1, 10)
+
+    asyncio.run(pipeline._sample(server, 1))
+    assert history.processed == 2
+
+
+def test_failing_server_does_not_block_readiness():
+    """采样失败（如不支持的型号）的服务器也计入预热进度，并在就绪状态中列出；恢复后从列表中移除"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+
+        async def main():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                for server_id, model in ((1, "R730"), (2, "NoSuchModel")):
+                    await conn.exec_driver_sql(
+                        "INSERT INTO servers (id, name, model, ipmi_host, ipmi_username, ipmi_password, control_mode) "
+                        f"VALUES ({server_id}, 'srv{server_id}', '{model}', 'bmc{server_id}', 'u', 'p', 'manual')")
+            session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+            sampling.AsyncSessionLocal = session_factory
+            try:
+                pipelines = {}
+                for server_id in (1, 2):
+                    server = SimpleNamespace(id=server_id)
+                    pipelines[server_id] = SamplingPipeline(server, [RecordingStage("history")], interval=10)
+                per_server_scheduler.SERVER_PIPELINES.update(pipelines)
+                per_server_scheduler._STARTUP["loaded"] = True
+                assert not per_server_scheduler.get_readiness()["ready"]
+
+                await pipelines[1].run_once()
+                try:
+                    await pipelines[2].run_once()
+                except UnsupportedModelError:
+                    pass
+                else:
+                    raise AssertionError("unsupported model was sampled")
+                readiness = per_server_scheduler.get_readiness()
+                assert readiness["ready"] and readiness["warmed_up"] == 2
+                assert [entry["server_id"] for entry in readiness["failing"]] == [2]
+                assert "NoSuchModel" in readiness["failing"][0]["error"]
+
+                async with session_factory() as db:
+                    await crud.update_server(db, 2, schemas.ServerUpdate(model="R730"))
+                await pipelines[2].run_once()
+                assert per_server_scheduler.get_readiness()["failing"] == []
+            finally:
+                await engine.dispose()
+
+        saved = sampling.AsyncSessionLocal, dict(per_server_scheduler._STARTUP)
+        try:
+            asyncio.run(main())
+        finally:
+            sampling.AsyncSessionLocal = saved[0]
+            per_server_scheduler._STARTUP.update(saved[1])
+            per_server_scheduler.SERVER_PIPELINES.clear()
+            for server_id in (1, 2):
+                remove_controller(server_id)
+
+
+def test_invalid_fail_safe_action_is_rejected_at_import():
+    """FAIL_SAFE_ACTION 拼写错误时启动即失败，而不是静默地按 safe_speed 处理"""
+    env = dict(os.environ, FAIL_SAFE_ACTION="return-to-bmc")
+    result = subprocess.run([sys.executable, "-c", "import app.services.per_server_scheduler"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode != 0 and "FAIL_SAFE_ACTION must be one of" in result.stderr
+
+
+def _poll(readings: list, knees: list, interval: float = 16) -> list:
+    """按 (秒, 温度) 序列依次更新自适应采样，返回每次更新后的采样间隔"""
+    clock = SimpleNamespace(now=0.0)
+    saved = sampling.time
+    sampling.time = SimpleNamespace(monotonic=lambda: clock.now)
+    try:
+        polling = AdaptivePolling(interval, min_interval=2, max_interval=60)
+        intervals = []
+        for clock.now, temperature in readings:
+            intervals.append(polling.update(temperature, knees))
+        return intervals
+    finally:
+        sampling.time = saved
+
+
+def test_adaptive_polling_rules():
+    """快速升温或升向拐点时减半；停留在拐点上或离开拐点时保持；远离拐点且稳定时放大；读数缺失时不变"""
+    steady = [(10 * i, 50.0) for i in range(8)]
+    assert _poll(steady, knees=[50]) == [16] * 8  # 稳定在拐点上不会把间隔压到最小
+    assert _poll(steady, knees=[70]) == [24, 36, 54, 60, 60, 60, 60, 60]
+
+    approaching = [(10 * i, 48.0 + 0.05 * 10 * i) for i in range(4)]  # 0.05 °C/s 升向 50 °C 的拐点
+    assert _poll(approaching, knees=[50]) == [16, 8, 4, 2]
+    assert _poll(approaching, knees=[80]) == [24, 24, 24, 24]  # 离拐点较远的缓慢升温保持不变
+
+    falling = [(10 * i, 51.5 - 0.05 * 10 * i) for i in range(4)]  # 在拐点附近降温
+    assert _poll(falling, knees=[50]) == [16] * 4
+
+    fast = [(i, 30.0 + 0.5 * i) for i in range(4)]
+    assert _poll(fast, knees=[]) == [24, 12, 6, 3]
+
+    assert _poll([(0, None), (10, None)], knees=[50]) == [16, 16]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
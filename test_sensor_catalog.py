@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+BMC 传感器目录测试：解析 ipmitool 输出，首次扫描后只读取需要的传感器，目录与 BMC 不符时重新扫描；
+扫描在后台进行，不继承风扇控制采样的优先级和时间预算
+不访问 BMC 和数据库，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.controllers import ipmi, sensor_catalog
+from app.controllers.r730 import R730Controller
+from app.controllers.sensor_catalog import SensorCatalog
+
+R730_SENSOR = """\
+Fan1             | 3720.000   | RPM        | ok    | na        | 360.000   | 600.000   | na        | na        | na
+Fan2             | 3600.000   | RPM        | ok    | na        | 360.000   | 600.000   | na        | na        | na
+Inlet Temp       | 23.000     | degrees C  | ok    | na        | -7.000    | 3.000     | 42.000    | 47.000    | na
+Exhaust Temp     | 35.000     | degrees C  | ok    | na        | 0.000     | 8.000     | 70.000    | 75.000    | na
+Temp             | 45.000     | degrees C  | ok    | na        | 3.000     | 8.000     | 84.000    | 89.000    | na
+Temp             | 41.000     | degrees C  | ok    | na        | 3.000     | 8.000     | 84.000    | 89.000    | na
+PS Redundancy    | 0x0        | discrete   | 0x0180| na        | na        | na        | na        | na        | na
+"""
+
+R730_ELIST = """\
+Fan1             | 30h | ok  |  7.1 | 3720 RPM
+Fan2             | 31h | ok  |  7.1 | 3600 RPM
+Inlet Temp       | 04h | ok  |  7.1 | 23 degrees C
+Exhaust Temp     | 01h | ok  |  7.1 | 35 degrees C
+Temp             | 0Eh | ok  |  3.1 | 45 degrees C
+Temp             | 0Fh | ok  |  3.2 | 41 degrees C
+PS Redundancy    | 74h | ok  | 19.1 | Fully Redundant
+"""
+
+R730_SDR_TYPE_TEMPERATURE = """\
+Inlet Temp       | 04h | ok  |  7.1 | 23 degrees C
+Exhaust Temp     | 01h | ok  |  7.1 | 35 degrees C
+Temp             | 0Eh | ok  |  3.1 | 52 degrees C
+Temp             | 0Fh | ok  |  3.2 | 48 degrees C
+"""
+
+R730_SENSOR_GET_FANS = """\
+Locating sensor record...
+Sensor ID              : Fan1 (0x30)
+ Entity ID             : 7.1
+ Sensor Type (Threshold)  : Fan
+ Sensor Reading        : 3720 (+/- 120) RPM
+ Status                : ok
+Sensor ID              : Fan2 (0x31)
+ Entity ID             : 7.1
+ Sensor Type (Threshold)  : Fan
+ Sensor Reading        : 3600 (+/- 120) RPM
+ Status                : ok
+"""
+
+
+class ScriptedR730(R730Controller):
+    """按命令返回预设输出的 R730 控制器，记录执行过的命令"""
+
+    def __init__(self, responses: dict):
+        super().__init__(SimpleNamespace(id=None, name="r730", ipmi_host="10.0.0.7"))
+        self.responses = responses
+        self.commands = []
+        self.contexts = {}  # 命令 -> (优先级, 是否有截止时间)
+
+    async def _run_ipmi_command(self, *args):
+        if args[:1] == ("-S",):
+            args = args[2:]
+        self.commands.append(" ".join(args))
+        self.contexts[" ".join(args)] = (ipmi._PRIORITY.get(), ipmi._DEADLINE.get() is not None)
+        if args[:2] == ("sdr", "dump"):
+            open(args[2], "w").close()
+            return ""
+        return self.responses.get(" ".join(args))
+
+
+def test_parse_sensor_listing_and_numbers():
+    """名称、类型、阈值来自 sensor，编号和实体来自 sdr elist；同名传感器按顺序对应"""
+    catalog = SensorCatalog.build("10.0.0.7", R730_SENSOR, R730_ELIST, datetime.datetime(2024, 1, 1))
+    by_type = {sensor["type"] for sensor in catalog.sensors}
+    assert by_type == {"fan", "temperature", "discrete"}
+    temps = catalog.select("temperature", lambda name: name == "Temp")
+    assert [(sensor["number"], sensor["entity"]) for sensor in temps] == [(0x0E, "3.1"), (0x0F, "3.2")]
+    assert temps[0]["thresholds"] == {"lcr": 3.0, "lnc": 8.0, "unc": 84.0, "ucr": 89.0}
+
+
+def test_reads_only_needed_sensors_after_discovery():
+    """
+    首次读数退回完整扫描，同时在后台扫描目录；扫描以指标采集优先级执行且没有截止时间。
+    扫描完成后温度只通过 sdr type 读取、风扇只读取存在的风扇，并使用本地 SDR 缓存
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor_catalog.SDR_CACHE_DIR, saved = tmp, sensor_catalog.SDR_CACHE_DIR
+        try:
+            controller = ScriptedR730({
+                "sensor": R730_SENSOR,
+                "sdr elist full": R730_ELIST,
+                "sdr type Temperature": R730_SDR_TYPE_TEMPERATURE,
+                "sensor get Fan1 Fan2": R730_SENSOR_GET_FANS,
+            })
+
+            async def main():
+                with ipmi.ipmi_priority(ipmi.PRIORITY_CONTROL), ipmi.ipmi_deadline(8):
+                    fallback = await controller.get_temperature()
+                    assert controller._catalog is None  # 读数不等待扫描完成
+                    await controller._catalog_task
+                    temperatures = [await controller.get_temperature() for _ in range(3)]
+                return fallback, temperatures, await controller.get_fan_speed()
+
+            fallback, temperatures, fan_speed = asyncio.run(main())
+            assert fallback == 45.0
+            assert temperatures == [52.0, 52.0, 52.0] and fan_speed == 3660
+            dump = f"sdr dump {sensor_catalog.sdr_cache_path('10.0.0.7')}"
+            assert controller.commands == [
+                "sensor", dump, "sensor", "sdr elist full",
+                "sdr type Temperature", "sdr type Temperature", "sdr type Temperature", "sensor get Fan1 Fan2",
+            ]
+            assert controller.contexts[dump] == controller.contexts["sdr elist full"] == (ipmi.PRIORITY_METRICS, False)
+            assert controller.contexts["sdr type Temperature"] == (ipmi.PRIORITY_CONTROL, True)
+            assert controller._catalog.command_prefix() == ["-S", sensor_catalog.sdr_cache_path("10.0.0.7")]
+        finally:
+            sensor_catalog.SDR_CACHE_DIR = saved
+
+
+def test_mismatch_triggers_rescan_and_failure_falls_back():
+    """读数与目录不符时标记失效并在重试间隔后重新扫描；BMC 不可达时退回完整扫描"""
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor_catalog.SDR_CACHE_DIR, saved = tmp, sensor_catalog.SDR_CACHE_DIR
+        try:
+            responses = {"sensor": R730_SENSOR, "sdr elist full": R730_ELIST,
+                         "sdr type Temperature": "Temp | 0Eh | ok | 3.1 | 50 degrees C\n"}
+            controller = ScriptedR730(responses)
+
+            async def main():
+                await controller.get_temperature()
+                await controller._catalog_task
+                first = await controller.get_temperature()
+                assert controller._catalog.stale
+                controller._catalog_retry_at = 0
+                controller.commands.clear()
+                second = await controller.get_temperature()  # 旧目录仍可使用，重新扫描在后台进行
+                await controller._catalog_task
+                return first, second
+
+            first, second = asyncio.run(main())
+            assert first == 50.0 and second == 50.0
+            assert controller.commands[2:4] == ["sensor", "sdr elist full"]
+            assert not controller._catalog.stale
+
+            unreachable = ScriptedR730({})
+
+            async def unreachable_main():
+                temperature = await unreachable.get_temperature()
+                await unreachable._catalog_task
+                return temperature
+
+            assert asyncio.run(unreachable_main()) == -1.0
+            assert unreachable._catalog is None
+            assert unreachable.commands[0] == "sensor"  # 退回完整扫描
+        finally:
+            sensor_catalog.SDR_CACHE_DIR = saved
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
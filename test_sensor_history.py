@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+逐传感器历史测试：控制器读取所有温度/风扇/功率传感器，读数打包存储（每次采样一行）并按传感器还原为列式历史
+不访问 BMC，使用临时 SQLite 数据库，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models  # noqa: F401  注册所有表
+from app.controllers import sensor_catalog
+from app.controllers.r730 import R730Controller
+from app.database import Base
+from app.services import sensor_history
+
+FIXTURES = os.path.join(ROOT, "fixtures", "ipmitool")
+
+
+def _fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def test_r730_reports_every_temperature_fan_and_power_sensor():
+    """一条 sdr elist 得到全部温度、风扇和功率读数；同名传感器加序号区分，无读数的传感器保留"""
+    elist = _fixture("r730_sdr_elist.txt").replace("Fan3             | 32h | ok  |  7.1 | 3600 RPM",
+                                                   "Fan3             | 32h | ns  |  7.1 | No Reading")
+    responses = {"sensor": _fixture("r730_sensor.txt"), "sdr elist full": elist}
+    commands = []
+
+    class Replayed(R730Controller):
+        async def _run_ipmi_command(self, *args):
+            if args[:1] == ("-S",):
+                args = args[2:]
+            commands.append(" ".join(args))
+            if args[:2] == ("sdr", "dump"):
+                open(args[2], "w").close()
+                return ""
+            return responses.get(" ".join(args))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor_catalog.SDR_CACHE_DIR, saved = tmp, sensor_catalog.SDR_CACHE_DIR
+        try:
+            controller = Replayed(SimpleNamespace(id=None, name="r730", ipmi_host="10.0.0.7"))
+
+            async def main():
+                await controller.get_all_sensors()  # 尚无目录时完整扫描，同时在后台扫描目录
+                await controller._catalog_task
+                return await controller.get_all_sensors()
+
+            sensors = asyncio.run(main())
+        finally:
+            sensor_catalog.SDR_CACHE_DIR = saved
+
+    assert commands[-1] == "sdr elist full"
+    by_name = {sensor["name"]: sensor for sensor in sensors}
+    assert [sensor["name"] for sensor in sensors] == [
+        "Fan1", "Fan2", "Fan3", "Fan4", "Fan5", "Fan6", "Inlet Temp", "Exhaust Temp", "Temp #1", "Temp #2",
+        "Pwr Consumption",
+    ]
+    assert by_name["Fan3"] == {"name": "Fan3", "type": "fan", "value": None, "unit": "RPM", "status": "ns"}
+    assert by_name["Temp #2"]["value"] == 41.0 and by_name["Pwr Consumption"]["type"] == "power"
+
+
+def test_samples_are_packed_one_row_per_sample():
+    """每次采样一行；传感器组成变化时新建传感器列表，历史按传感器对齐，缺失处为 None"""
+    assert sensor_history.unpack_readings(sensor_history.pack_readings([1.5, None, 3600.0])) == [1.5, None, 3600.0]
+
+    def sensors(*fans):
+        return [{"name": "Temp", "type": "temperature", "value": 45.0, "unit": "degrees C", "status": "ok"}] + [
+            {"name": name, "type": "fan", "value": value, "unit": "RPM", "status": "ok"} for name, value in fans]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+
+        async def main():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.exec_driver_sql(
+                    "INSERT INTO servers (id, name, model, ipmi_host, ipmi_username, ipmi_password, control_mode) "
+                    "VALUES (1, 'srv1', 'R730', 'bmc1', 'u', 'p', 'auto')")
+            session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+            start = datetime.datetime(2024, 1, 1, 12, 0, 0)
+            samples = [
+                sensors(("Fan1", 3600.0), ("Fan2", 3720.0)),
+                sensors(("Fan1", 3600.0), ("Fan2", 1200.0)),
+                sensors(("Fan1", 3480.0), ("Fan2", None), ("Fan3", 3600.0)),  # 新装的风扇
+            ]
+            try:
+                for i, sample in enumerate(samples):
+                    async with session_factory() as db:
+                        await sensor_history.record(db, 1, sample, start + datetime.timedelta(minutes=i))
+                sensor_history.forget(1)  # 重新从数据库查找传感器列表
+                async with session_factory() as db:
+                    await sensor_history.record(db, 1, samples[-1], start + datetime.timedelta(minutes=3))
+                    return await sensor_history.get_history(db, 1, start, start + datetime.timedelta(hours=1))
+            finally:
+                await engine.dispose()
+
+        history = asyncio.run(main())
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sensor_samples").fetchone() == (4,)
+            assert conn.execute("SELECT COUNT(*) FROM sensor_dictionaries").fetchone() == (2,)
+
+    assert len(history["timestamps"]) == 4
+    series = {sensor["name"]: sensor["values"] for sensor in history["sensors"]}
+    assert list(series) == ["Temp", "Fan1", "Fan2", "Fan3"]
+    assert series["Fan2"] == [3720.0, 1200.0, None, None]
+    assert series["Fan3"] == [None, None, 3600.0, 3600.0]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+分片采集测试：一致性哈希分配，以及多个本地采集进程对模拟 BMC 的分片、故障接管和交接；
+租约被其他进程获取后，旧负责进程只停止采样，不再发送交还控制权的命令。
+模拟的 ipmitool 将每条命令记录到日志文件，可直接运行或通过 pytest 执行
+"""
+import asyncio
+import collections
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from app.services.sharding import HashRing, ShardCoordinator
+
+SERVERS = 12
+FAN_WRITE = "raw 0x30 0x30 0x02"
+RETURN_TO_BMC = "raw 0x30 0x30 0x01 0x01"
+
+# 参数依次为 -I lanplus -H <host> -U <user> -P <password> <命令...>
+FAKE_IPMITOOL = """#!/bin/sh
+host=$4
+shift 8
+[ "$1" = "-S" ] && shift 2
+echo "$host $PPID $*" >> "$FAKE_BMC_LOG"
+case "$1 $2" in
+  "sensor get") shift 2
+    for name in "$@"; do
+      case "$name" in
+        *Temp) printf 'Sensor ID : %s (0x0e)\\nSensor Reading : 45 (+/- 1) degrees C\\n' "$name";;
+        *) printf 'Sensor ID : %s (0x30)\\nSensor Reading : 3600 (+/- 120) RPM\\n' "$name";;
+      esac
+    done;;
+  "sensor "*) echo "CPU1 Temp | 45.000 | degrees C | ok";;
+esac
+"""
+
+
+def test_hash_ring_balances_and_moves_minimally():
+    """服务器大致均匀地分到各成员；成员退出时只有它负责的服务器换了负责进程"""
+    keys = range(3000)
+    ring = HashRing(["a", "b", "c", "d"])
+    owners = {key: ring.owner(key) for key in keys}
+    counts = collections.Counter(owners.values())
+    assert set(counts) == {"a", "b", "c", "d"}
+    assert min(counts.values()) > len(keys) / 4 * 0.6
+
+    smaller = HashRing(["a", "b", "c"])
+    moved = [key for key in keys if smaller.owner(key) != owners[key]]
+    assert moved and all(owners[key] == "d" for key in moved)
+    assert HashRing([]).owner(1) is None
+
+
+def test_lost_lease_stops_without_ipmi_writes():
+    """续期时发现租约已被其他进程获取：停止本地采样并清除接管标记，不向 BMC 发送交还控制权的命令"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import crud, models  # noqa: F401  注册所有表
+    from app.controllers import factory
+    from app.controllers.base import BaseServerController
+    from app.database import Base
+    from app.services import per_server_scheduler
+
+    commands = []
+
+    class RecordingController(BaseServerController):
+        async def _get_temperature_from_ipmi(self) -> float:
+            return 45.0
+
+        async def _get_fan_speed_from_ipmi(self) -> int:
+            return 3600
+
+        async def set_fan_speed(self, speed: int):
+            commands.append(("set", speed))
+
+        async def take_over_fan_control(self):
+            commands.append(("take_over",))
+
+        async def return_fan_control_to_system(self) -> bool:
+            commands.append(("return",))
+            return True
+
+    async def claimed(server):
+        per_server_scheduler._FAN_CONTROL_TAKEN[server.id] = server  # 模拟采样管道已接管风扇控制
+
+    async def handed_off(server_id):
+        raise AssertionError("lost lease must not be handed off")
+
+    factory.CONTROLLER_MAP["recording"] = RecordingController
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "app.db")
+
+            async def main():
+                engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                    await conn.exec_driver_sql(
+                        "INSERT INTO servers (id, name, model, ipmi_host, ipmi_username, ipmi_password, control_mode) "
+                        "VALUES (1, 'srv1', 'recording', 'bmc1', 'u', 'p', 'auto')")
+                session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+                try:
+                    coordinator = ShardCoordinator("a", session_factory, on_claim=claimed, on_release=handed_off)
+                    await coordinator.rebalance()
+                    await coordinator.rebalance()
+                    assert coordinator.owns(1) and 1 in per_server_scheduler._FAN_CONTROL_TAKEN
+
+                    # 例如本进程长时间停顿，租约过期后已被进程 b 获取
+                    async with engine.begin() as conn:
+                        await conn.exec_driver_sql("UPDATE server_leases SET owner = 'b' WHERE server_id = 1")
+                    await coordinator.rebalance()
+                    assert not coordinator.owns(1)
+                    assert 1 not in per_server_scheduler._FAN_CONTROL_TAKEN
+                finally:
+                    await engine.dispose()
+
+            asyncio.run(main())
+            assert _leases(db_path) == {1: "b"}
+    finally:
+        per_server_scheduler._FAN_CONTROL_TAKEN.pop(1, None)
+        factory.remove_controller(1)
+        del factory.CONTROLLER_MAP["recording"]
+
+    assert commands == []
+
+
+def _seed(db_path: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app import models  # noqa: F401  注册所有表
+    from app.database import Base
+
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(main())
+    with sqlite3.connect(db_path) as conn:
+        for i in range(1, SERVERS + 1):
+            conn.execute(
+                "INSERT INTO servers (id, name, model, ipmi_host, ipmi_username, ipmi_password, control_mode) "
+                "VALUES (?, ?, 'R730', ?, 'u', 'p', 'auto')", (i, f"srv{i}", f"bmc{i}"))
+            conn.execute("INSERT INTO fan_curves (server_id, points) VALUES (?, ?)",
+                         (i, '[{"temp": 30, "speed": 20}, {"temp": 80, "speed": 100}]'))
+            conn.execute("INSERT INTO server_polling (server_id, adaptive, min_interval, max_interval) "
+                         "VALUES (?, 1, 0.5, 0.5)", (i,))
+
+
+def _leases(db_path: str) -> dict:
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT server_id, owner FROM server_leases").fetchall())
+
+
+def _wait_for(condition, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.2)
+    raise AssertionError(f"timed out waiting for {what}")
+
+
+def _read_log(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [line.rstrip("\n").split(" ", 2) for line in f if line.strip()]
+
+
+def test_collectors_shard_fleet_and_hand_off_cleanly():
+    """
+    三个采集进程分担服务器；一个被强制终止后其服务器在租约过期后被接管；新进程加入时旧负责进程先交还控制权；
+    任何时刻每台服务器的风扇只由一个进程写入，全部退出后每台服务器的控制权都已交还 BMC。
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "data"))
+        db_path = os.path.join(tmp, "data", "app.db")
+        log_path = os.path.join(tmp, "bmc.log")
+        script = os.path.join(tmp, "ipmitool")
+        with open(script, "w") as f:
+            f.write(FAKE_IPMITOOL)
+        os.chmod(script, 0o755)
+        _seed(db_path)
+
+        env = dict(os.environ, COLLECTOR_MODE="sharded", SHARD_HEARTBEAT_INTERVAL="0.3", SHARD_LEASE_TTL="2",
+                   FAKE_BMC_LOG=log_path, PATH=tmp + os.pathsep + os.environ["PATH"],
+                   PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        env.pop("DATABASE_URL", None)
+        collectors = {}
+
+        def spawn(member_id: str):
+            output = open(os.path.join(tmp, f"{member_id}.log"), "w")
+            collectors[member_id] = subprocess.Popen(
+                [sys.executable, "-m", "app.collector"], cwd=tmp, env=dict(env, COLLECTOR_ID=member_id),
+                stdout=output, stderr=subprocess.STDOUT)
+            output.close()
+
+        def written_by(pid: int) -> set:
+            return {host for host, writer, command in _read_log(log_path)
+                    if int(writer) == pid and command.startswith(FAN_WRITE)}
+
+        try:
+            for member_id in ("c0", "c1", "c2"):
+                spawn(member_id)
+            _wait_for(lambda: len(_leases(db_path)) == SERVERS and len(set(_leases(db_path).values())) == 3,
+                      30, "three collectors to share all servers")
+            pids = {member_id: process.pid for member_id, process in collectors.items()}
+            _wait_for(lambda: len(set().union(*(written_by(pid) for pid in pids.values()))) == SERVERS,
+                      15, "fan writes to every BMC")
+
+            # 强制终止：租约过期后由其余进程接管
+            victim_hosts = {f"bmc{server_id}" for server_id, owner in _leases(db_path).items() if owner == "c0"}
+            collectors.pop("c0").kill()
+            _wait_for(lambda: set(_leases(db_path).values()) == {"c1", "c2"} and len(_leases(db_path)) == SERVERS,
+                      15, "surviving collectors to take over")
+            _wait_for(lambda: victim_hosts <= written_by(pids["c1"]) | written_by(pids["c2"]),
+                      15, "fan writes from the new owners")
+
+            # 新进程加入：旧负责进程交还控制权并删除租约后，新进程才获得租约
+            spawn("c3")
+            _wait_for(lambda: "c3" in _leases(db_path).values(), 15, "the new collector to claim servers")
+            pids["c3"] = collectors["c3"].pid
+            _wait_for(lambda: written_by(pids["c3"]), 15, "fan writes from the new collector")
+        finally:
+            for process in collectors.values():
+                process.send_signal(signal.SIGTERM)
+            for process in collectors.values():
+                try:
+                    process.wait(timeout=20)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+        assert all(process.returncode == 0 for process in collectors.values())
+        assert _leases(db_path) == {}
+
+        history = collections.defaultdict(list)
+        for host, writer, command in _read_log(log_path):
+            history[host].append((int(writer), command))
+        assert len(history) == SERVERS
+        for host, commands in history.items():
+            # 每次更换负责进程前，旧负责进程的最后一条命令都是交还控制权（即交接期间没有两个进程同时控制）；
+            # 被强制终止的进程除外，但它之后不会再出现
+            for i in range(1, len(commands)):
+                previous, current = commands[i - 1], commands[i]
+                if current[0] == previous[0]:
+                    continue
+                if previous[0] == pids["c0"]:
+                    assert pids["c0"] not in [pid for pid, _ in commands[i:]], f"{host}: c0 wrote after handoff"
+                else:
+                    assert previous[1] == RETURN_TO_BMC, f"{host} was controlled concurrently: {previous} -> {current}"
+            assert commands[-1][1] == RETURN_TO_BMC, f"{host}: {commands[-1]}"
+        assert any(pids["c0"] == commands[0][0] for commands in history.values())
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")